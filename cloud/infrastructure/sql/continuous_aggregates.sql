@@ -0,0 +1,85 @@
+-- VineGuard telemetry rollups
+-- Runs after init_timescaledb.sql.  Hourly and daily per-device aggregates of
+-- telemetry_readings, kept current by TimescaleDB refresh policies.  Analytics
+-- (canopy lux, GDD) and the API dashboard read these instead of raw readings;
+-- on plain PostgreSQL the blocks below are skipped and both services compute
+-- the same columns from telemetry_readings at query time.
+--
+-- Averages are stored as sum + count so any range of buckets can be combined.
+-- Real-time aggregation is on (materialized_only = false): buckets newer than
+-- the last refresh are filled from raw readings when queried.
+
+DO $$
+BEGIN
+    CREATE MATERIALIZED VIEW IF NOT EXISTS telemetry_hourly
+    WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+    SELECT
+        device_id,
+        time_bucket(INTERVAL '1 hour', recorded_at) AS bucket,
+        count(*)                AS readings,
+        max(recorded_at)        AS last_reading_at,
+        sum(soil_moisture)      AS soil_moisture_sum,
+        count(soil_moisture)    AS soil_moisture_n,
+        sum(ambient_temp_c)     AS ambient_temp_c_sum,
+        count(ambient_temp_c)   AS ambient_temp_c_n,
+        min(ambient_temp_c)     AS ambient_temp_c_min,
+        max(ambient_temp_c)     AS ambient_temp_c_max,
+        max(light_lux)          AS light_lux_max
+    FROM telemetry_readings
+    GROUP BY device_id, bucket
+    WITH NO DATA;
+
+    -- Late readings up to three days old are folded in on the next refresh.
+    PERFORM add_continuous_aggregate_policy('telemetry_hourly',
+        start_offset      => INTERVAL '3 days',
+        end_offset        => INTERVAL '1 hour',
+        schedule_interval => INTERVAL '15 minutes',
+        if_not_exists     => TRUE);
+EXCEPTION
+    WHEN OTHERS THEN
+        RAISE NOTICE 'telemetry_hourly skipped: %', SQLERRM;
+END$$;
+
+DO $$
+BEGIN
+    CREATE MATERIALIZED VIEW IF NOT EXISTS telemetry_daily
+    WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+    SELECT
+        device_id,
+        time_bucket(INTERVAL '1 day', recorded_at) AS bucket,
+        count(*)                AS readings,
+        max(recorded_at)        AS last_reading_at,
+        sum(soil_moisture)      AS soil_moisture_sum,
+        count(soil_moisture)    AS soil_moisture_n,
+        sum(ambient_temp_c)     AS ambient_temp_c_sum,
+        count(ambient_temp_c)   AS ambient_temp_c_n,
+        min(ambient_temp_c)     AS ambient_temp_c_min,
+        max(ambient_temp_c)     AS ambient_temp_c_max,
+        max(light_lux)          AS light_lux_max
+    FROM telemetry_readings
+    GROUP BY device_id, bucket
+    WITH NO DATA;
+
+    PERFORM add_continuous_aggregate_policy('telemetry_daily',
+        start_offset      => INTERVAL '7 days',
+        end_offset        => INTERVAL '1 hour',
+        schedule_interval => INTERVAL '1 hour',
+        if_not_exists     => TRUE);
+EXCEPTION
+    WHEN OTHERS THEN
+        RAISE NOTICE 'telemetry_daily skipped: %', SQLERRM;
+END$$;
+
+-- ──────────────────────────────────────────────
+-- Grants
+-- ──────────────────────────────────────────────
+
+DO $$
+BEGIN
+    IF to_regclass('telemetry_hourly') IS NOT NULL THEN
+        GRANT SELECT ON telemetry_hourly TO vineguard_api, vineguard_analytics;
+    END IF;
+    IF to_regclass('telemetry_daily') IS NOT NULL THEN
+        GRANT SELECT ON telemetry_daily TO vineguard_api, vineguard_analytics;
+    END IF;
+END$$;
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from .models import alerts
+
+logger = structlog.get_logger()
+
+_SCOPE_KEYS = ("node_id", "block_id", "vineyard_id")
+
+_RETRY_SECONDS = 5.0
+
+
+def alert_scope(node_id: str | None, block_id: str | None, vineyard_id: str | None) -> str | None:
+    """What an alert is about: its node, else its block, else its vineyard."""
+    return node_id or block_id or vineyard_id
+
+
+class ActiveAlertIndex:
+    """In-memory copy of the active alerts, keyed by (rule_key, scope).
+
+    Answers cooldown checks without reading ``alerts``.  This process keeps
+    it current as it creates and resolves alerts; manual resolves arrive as
+    ``alert_resolved`` messages from the API (``listen_for_alert_events``).  The whole index
+    is reloaded when it is older than ``max_age_seconds`` or marked stale
+    (a failed write, an unreadable message), so any drift is bounded.
+    """
+
+    def __init__(self, *, max_age_seconds: float = 3600.0) -> None:
+        self._max_age = max_age_seconds
+        self._loaded_at: float | None = None
+        # (rule_key, scope) -> {alert_id: cooldown_until}
+        self._by_key: dict[tuple[str, str | None], dict[str, datetime | None]] = {}
+        self._key_of: dict[str, tuple[str, str | None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._key_of)
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self._max_age
+
+    def mark_stale(self) -> None:
+        self._loaded_at = None
+
+    async def load(self, conn: Any) -> None:
+        rows = (await conn.execute(
+            select(
+                alerts.c.id, alerts.c.rule_key, alerts.c.node_id, alerts.c.block_id,
+                alerts.c.vineyard_id, alerts.c.cooldown_until,
+            ).where(alerts.c.is_active.is_(True))
+        )).mappings().all()
+        self._by_key.clear()
+        self._key_of.clear()
+        for row in rows:
+            scope = alert_scope(*(None if row[k] is None else str(row[k]) for k in _SCOPE_KEYS))
+            self.add(str(row["id"]), row["rule_key"], scope, row["cooldown_until"])
+        self._loaded_at = time.monotonic()
+        logger.info("alert_index_loaded", active_alerts=len(rows))
+
+    async def refresh(self, conn: Any) -> None:
+        if self.stale:
+            await self.load(conn)
+
+    def add(self, alert_id: str, rule_key: str, scope: str | None, cooldown_until: datetime | None) -> None:
+        if cooldown_until is not None and cooldown_until.tzinfo is None:
+            # Make tz-aware if it came back naive from the DB driver
+            cooldown_until = cooldown_until.replace(tzinfo=timezone.utc)
+        self._by_key.setdefault((rule_key, scope), {})[alert_id] = cooldown_until
+        self._key_of[alert_id] = (rule_key, scope)
+
+    def discard(self, alert_id: str) -> None:
+        key = self._key_of.pop(alert_id, None)
+        if key is not None:
+            self._by_key[key].pop(alert_id, None)
+            if not self._by_key[key]:
+                del self._by_key[key]
+
+    def has(self, rule_key: str, scope: str | None) -> bool:
+        return (rule_key, scope) in self._by_key
+
+    def cooling(self, rule_key: str, scope: str | None, now: datetime) -> str | None:
+        """Id of an active alert for this rule and scope still inside its cooldown, if any."""
+        for alert_id, cooldown_until in self._by_key.get((rule_key, scope), {}).items():
+            if cooldown_until is not None and cooldown_until > now:
+                return alert_id
+        return None
+
+
+async def listen_for_alert_events(
+    index: ActiveAlertIndex, redis: Redis, channel: str, *, retry_seconds: float = _RETRY_SECONDS
+) -> None:
+    """Drop alerts from ``index`` as the API announces manual resolves.
+
+    Messages are JSON objects carrying an ``alert_id``; anything else marks
+    the whole index stale so it is reloaded before the next rule tick.
+    Resubscribes after Redis errors and then marks the index stale, since
+    resolves published while disconnected were missed.
+    """
+    subscribed_before = False
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            if subscribed_before:
+                index.mark_stale()
+                logger.info("alert_index_invalidated", alert=None)
+            subscribed_before = True
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    alert_id = str(json.loads(message["data"])["alert_id"])
+                except (ValueError, KeyError, TypeError):
+                    index.mark_stale()
+                    logger.info("alert_index_invalidated", alert=None)
+                    continue
+                index.discard(alert_id)
+                logger.info("alert_index_invalidated", alert=alert_id)
+        except RedisError as exc:
+            logger.warning("alert_events_redis_error", error=str(exc), retry_in=retry_seconds)
+            await asyncio.sleep(retry_seconds)
+        finally:
+            await pubsub.aclose()
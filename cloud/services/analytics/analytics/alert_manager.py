@@ -3,10 +3,14 @@ from __future__ import annotations
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
+import structlog
 from sqlalchemy import and_, select, update
 
+from .alert_index import ActiveAlertIndex, alert_scope
 from .models import alerts, recommendations
 
+logger = structlog.get_logger()
+
 
 async def get_active_alert(
     conn: Any,
@@ -50,17 +54,26 @@ async def create_alert(
     title: str,
     message: str,
     cooldown_hours: int = 4,
+    index: ActiveAlertIndex | None = None,
 ) -> str:
     """Create a new alert and set cooldown_until = now() + cooldown_hours.
 
     Returns the UUID of the newly created alert as a string.
     Skips creation if an active alert already exists within its cooldown window.
+    With an ``index`` the cooldown check is answered from memory.
     """
     now = datetime.now(tz=timezone.utc)
     cooldown_until = now + timedelta(hours=cooldown_hours)
+    scope = alert_scope(node_id, block_id, vineyard_id)
 
     # Check for an existing active alert still within cooldown.
-    existing = await get_active_alert(conn, rule_key, node_id, block_id)
+    if index is not None:
+        existing = None
+        cooling_id = index.cooling(rule_key, scope, now)
+        if cooling_id is not None:
+            return cooling_id
+    else:
+        existing = await get_active_alert(conn, rule_key, node_id, block_id)
     if existing is not None:
         cu = existing.get("cooldown_until")
         if cu is not None:
@@ -87,17 +100,99 @@ async def create_alert(
         ).returning(alerts.c.id)
     )
     row = result.first()
+    if index is not None:
+        index.add(str(row[0]), rule_key, scope, cooldown_until)
     return str(row[0])
 
 
+async def create_alerts(
+    conn: Any, candidates: list[dict[str, Any]], index: ActiveAlertIndex | None = None
+) -> list[str]:
+    """Bulk ``create_alert`` for node-scoped ``node_alert`` dicts.
+
+    Same cooldown rule as ``create_alert``: a (rule_key, node_id) pair with
+    an active alert still inside its cooldown keeps that alert; every other
+    candidate gets a new one.  Existing alerts are loaded with one SELECT
+    (or looked up in ``index``) and new ones written with one multi-row
+    INSERT.  Returns the alert ids in candidate order.
+    """
+    now = datetime.now(tz=timezone.utc)
+    cooling: dict[tuple[str, str], str] = {}
+    if index is not None:
+        for c in candidates:
+            cooling_id = index.cooling(c["rule_key"], c["node_id"], now)
+            if cooling_id is not None:
+                cooling[(c["rule_key"], c["node_id"])] = cooling_id
+        existing_rows = []
+    else:
+        existing = await conn.execute(
+            select(alerts.c.id, alerts.c.rule_key, alerts.c.node_id, alerts.c.cooldown_until).where(
+                alerts.c.is_active.is_(True),
+                alerts.c.rule_key.in_(sorted({c["rule_key"] for c in candidates})),
+                alerts.c.node_id.in_(sorted({c["node_id"] for c in candidates})),
+            )
+        )
+        existing_rows = existing.mappings().all()
+    for row in existing_rows:
+        cu = row["cooldown_until"]
+        if cu is None:
+            continue
+        # Make tz-aware if it came back naive from the DB driver
+        if cu.tzinfo is None:
+            cu = cu.replace(tzinfo=timezone.utc)
+        if cu > now:
+            cooling[(row["rule_key"], str(row["node_id"]))] = str(row["id"])
+
+    ids: list[str | None] = [cooling.get((c["rule_key"], c["node_id"])) for c in candidates]
+    fresh: dict[tuple[str, str], list[int]] = {}
+    for i, candidate in enumerate(candidates):
+        if ids[i] is None:
+            fresh.setdefault((candidate["rule_key"], candidate["node_id"]), []).append(i)
+    if fresh:
+        firsts = [candidates[same[0]] for same in fresh.values()]
+        result = await conn.execute(
+            alerts.insert().returning(alerts.c.id, sort_by_parameter_order=True),
+            [
+                {
+                    "node_id": c["node_id"],
+                    "block_id": c["block_id"],
+                    "vineyard_id": c["vineyard_id"],
+                    "rule_key": c["rule_key"],
+                    "severity": c["severity"],
+                    "title": c["title"],
+                    "message": c["message"],
+                    "is_active": True,
+                    "triggered_at": now,
+                    "resolved_at": None,
+                    "cooldown_until": now + timedelta(hours=c["cooldown_hours"]),
+                }
+                for c in firsts
+            ],
+        )
+        for same, first, row in zip(fresh.values(), firsts, result.all()):
+            for i in same:
+                ids[i] = str(row[0])
+            if index is not None:
+                index.add(
+                    str(row[0]), first["rule_key"], first["node_id"],
+                    now + timedelta(hours=first["cooldown_hours"]),
+                )
+    return ids  # type: ignore[return-value]
+
+
 async def resolve_alerts_for_rule(
     conn: Any,
     rule_key: str,
     still_triggering_node_ids: list[str],
+    only_node_ids: list[str] | None = None,
+    index: ActiveAlertIndex | None = None,
 ) -> None:
     """Resolve active alerts for rule_key where node_id is NOT in still_triggering_node_ids.
 
-    Sets is_active=False and resolved_at=now() for matching rows.
+    Sets is_active=False and resolved_at=now() for matching rows.  With
+    ``only_node_ids``, alerts of any other node are left alone (the streaming
+    evaluator only knows about the node that just reported).  Resolved
+    alerts are dropped from ``index``.
     """
     now = datetime.now(tz=timezone.utc)
 
@@ -108,13 +203,20 @@ async def resolve_alerts_for_rule(
 
     if still_triggering_node_ids:
         conditions.append(alerts.c.node_id.notin_(still_triggering_node_ids))
+    if only_node_ids is not None:
+        conditions.append(alerts.c.node_id.in_(only_node_ids))
 
     stmt = (
         update(alerts)
         .where(and_(*conditions))
         .values(is_active=False, resolved_at=now)
     )
-    await conn.execute(stmt)
+    if index is None:
+        await conn.execute(stmt)
+        return
+    result = await conn.execute(stmt.returning(alerts.c.id))
+    for row in result.all():
+        index.discard(str(row[0]))
 
 
 async def create_recommendation(
@@ -145,3 +247,80 @@ async def create_recommendation(
     )
     row = result.first()
     return str(row[0])
+
+
+async def create_recommendations(conn: Any, rows: list[dict[str, Any]]) -> None:
+    """Insert many recommendations (``create_recommendation`` keywords) in one statement."""
+    if rows:
+        await conn.execute(
+            recommendations.insert(),
+            [{**row, "due_by": row.get("due_by"), "is_acknowledged": False, "acknowledged_at": None} for row in rows],
+        )
+
+
+def node_alert(
+    node: dict[str, Any],
+    *,
+    rule_key: str,
+    severity: str,
+    title: str,
+    message: str,
+    cooldown_hours: int,
+    action_text: str,
+    priority: int,
+    **details: Any,
+) -> dict[str, Any]:
+    """Describe an alert (and its recommendation) for ``node`` without touching the DB.
+
+    Rules return these from ``evaluate``; ``apply_alerts`` persists them.
+    ``details`` only go to the log line.
+    """
+    return {
+        "node_id": node["node_id"],
+        "block_id": node["block_id"],
+        "vineyard_id": node["vineyard_id"],
+        "block_name": node["block_name"],
+        "rule_key": rule_key,
+        "severity": severity,
+        "title": title,
+        "message": message,
+        "cooldown_hours": cooldown_hours,
+        "action_text": action_text,
+        "priority": priority,
+        "details": details,
+    }
+
+
+async def apply_alerts(
+    conn: Any,
+    rule_keys: tuple[str, ...],
+    triggered: list[dict[str, Any]],
+    only_node_ids: list[str] | None = None,
+    index: ActiveAlertIndex | None = None,
+) -> None:
+    """Create the ``triggered`` alerts with their recommendations, then resolve
+    every other active alert of ``rule_keys`` whose node no longer triggers
+    (limited to ``only_node_ids`` when given).  ``index``, when given, answers
+    the cooldown checks and is kept in step with the writes.
+    """
+    still_triggering: dict[str, list[str]] = {rule_key: [] for rule_key in rule_keys}
+    for alert in triggered:
+        still_triggering.setdefault(alert["rule_key"], []).append(alert["node_id"])
+
+    if triggered:
+        alert_ids = await create_alerts(conn, triggered, index)
+        await create_recommendations(conn, [
+            {
+                "alert_id": alert_id,
+                "block_id": alert["block_id"],
+                "vineyard_id": alert["vineyard_id"],
+                "action_text": alert["action_text"],
+                "priority": alert["priority"],
+            }
+            for alert, alert_id in zip(triggered, alert_ids)
+        ])
+        for alert in triggered:
+            logger.info(f"{alert['rule_key']}_alert", block=alert["block_name"], **alert["details"])
+
+    for rule_key, node_ids in still_triggering.items():
+        await resolve_alerts_for_rule(conn, rule_key, node_ids, only_node_ids, index)
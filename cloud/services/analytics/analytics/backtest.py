@@ -0,0 +1,337 @@
+"""Replay the alert rules over historical telemetry, without touching the DB's alerts.
+
+Usage::
+
+    vineguard-analytics-backtest --since 2025-04-01 --until 2025-11-01
+        [--readings export.csv|.parquet --nodes nodes.csv] [--rule moisture ...]
+        [--set moisture._THRESHOLD_DRY=12,14,16 ...] [--workers 4] [--out alerts.jsonl]
+
+Readings come from ``telemetry_readings`` (streamed in chunks) or from an
+export with ``node_id``, ``recorded_at`` and the sensor columns, plus a
+nodes file with the node/block/vineyard columns of ``NODE_QUERY``.  Each
+rule's ``evaluate`` runs every ``INTERVAL`` of simulated time over the
+readings of its ``WINDOW`` up to that instant, and alerts are raised, kept
+during cooldown and resolved as the engine would.  Without ``--set`` the
+alerts are written as JSON lines; with it, every combination of the given
+values is replayed in a process pool and one summary line is written per
+combination.
+
+GDD (which keeps its own table) and canopy lux (hourly rollups) are not
+replayed.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import sys
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+import numpy as np
+import structlog
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from .config import get_settings
+from .engine import RULES
+from .frame import NODE_QUERY, SENSOR_COLUMNS, TelemetryFrame
+from .models import nodes, telemetry_readings
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pq = None  # type: ignore[assignment]
+
+logger = structlog.get_logger()
+
+# Rules that are pure functions of raw readings; the others need the DB or rollups.
+BACKTEST_RULES: dict[str, ModuleType] = {
+    name: rule for name, rule in RULES.items()
+    if not hasattr(rule, "apply") and getattr(rule, "SOURCE", "raw") in ("raw", "latest")
+}
+
+_CHUNK_ROWS = 50_000
+
+# Per worker process: the frame and time range every sweep task replays.
+_worker: dict[str, Any] = {}
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+def replay(
+    frame: TelemetryFrame,
+    since: datetime,
+    until: datetime,
+    rules: dict[str, ModuleType] | None = None,
+) -> list[dict[str, Any]]:
+    """The alerts ``rules`` would have raised between ``since`` and ``until``, oldest first.
+
+    Each alert carries ``triggered_at`` and ``resolved_at`` (None if still
+    active at ``until``).  ``frame`` should start one rule ``WINDOW`` before
+    ``since`` so the first evaluations see a full window.
+    """
+    rules = BACKTEST_RULES if rules is None else rules
+    # In time order every step's window is one slice (a view, not a copy).
+    # Each node's readings stay in time order, which is all ``last`` needs.
+    timeline = frame.rows(np.argsort(frame.recorded_at, kind="stable"))
+    alerts: list[dict[str, Any]] = []
+    for rule in rules.values():
+        alerts.extend(_replay_rule(timeline, rule, since, until))
+    alerts.sort(key=lambda alert: alert["triggered_at"])
+    return alerts
+
+
+def _replay_rule(timeline: TelemetryFrame, rule: ModuleType, since: datetime, until: datetime) -> list[dict[str, Any]]:
+    window = rule.WINDOW.total_seconds()
+    steps = np.arange(since.timestamp(), until.timestamp() + 1e-6, rule.INTERVAL.total_seconds())
+    # The rows each step sees: [now - WINDOW, now].
+    starts = np.searchsorted(timeline.recorded_at, steps - window, side="left")
+    ends = np.searchsorted(timeline.recorded_at, steps, side="right")
+
+    raised: list[dict[str, Any]] = []
+    # (rule_key, node_id) -> (cooldown end, alerts still open for it)
+    active: dict[tuple[str, str], tuple[float, list[dict[str, Any]]]] = {}
+    for ts, lo, hi in zip(steps, starts, ends):
+        now = datetime.fromtimestamp(ts, tz=timezone.utc)
+        triggered = rule.evaluate(timeline.rows(slice(lo, hi)), now) if hi > lo else []
+        still = set()
+        for alert in triggered:
+            key = (alert["rule_key"], alert["node_id"])
+            still.add(key)
+            cooldown_until, open_alerts = active.get(key, (0.0, []))
+            if cooldown_until > ts:
+                continue
+            # Like create_alerts: past its cooldown a still-triggering rule raises again.
+            record = {**alert, "triggered_at": now, "resolved_at": None}
+            raised.append(record)
+            active[key] = (ts + alert["cooldown_hours"] * 3600, [*open_alerts, record])
+        for key in [key for key in active if key not in still]:
+            for record in active.pop(key)[1]:
+                record["resolved_at"] = now
+    return raised
+
+
+def summarize(alerts: list[dict[str, Any]], until: datetime) -> dict[str, dict[str, Any]]:
+    """Per rule key: alerts raised, distinct nodes and hours spent active (up to ``until``)."""
+    summary: dict[str, dict[str, Any]] = {}
+    nodes_by_key: dict[str, set[str]] = {}
+    for alert in alerts:
+        entry = summary.setdefault(alert["rule_key"], {"alerts": 0, "nodes": 0, "active_hours": 0.0})
+        entry["alerts"] += 1
+        nodes_by_key.setdefault(alert["rule_key"], set()).add(alert["node_id"])
+        ended = alert["resolved_at"] or until
+        entry["active_hours"] += (ended - alert["triggered_at"]).total_seconds() / 3600
+    for rule_key, entry in summary.items():
+        entry["nodes"] = len(nodes_by_key[rule_key])
+        entry["active_hours"] = round(entry["active_hours"], 1)
+    return summary
+
+
+# ---------------------------------------------------------------------------
+# Threshold sweeps
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def overridden(overrides: dict[str, Any]) -> Iterator[None]:
+    """Temporarily set rule constants, e.g. ``{"moisture._THRESHOLD_DRY": 12.0}``."""
+    saved: list[tuple[ModuleType, str, Any]] = []
+    try:
+        for target, value in overrides.items():
+            rule_name, _, constant = target.partition(".")
+            rule = RULES.get(rule_name)
+            if rule is None or not hasattr(rule, constant):
+                raise ValueError(f"unknown rule constant: {target}")
+            saved.append((rule, constant, getattr(rule, constant)))
+            setattr(rule, constant, value)
+        yield
+    finally:
+        for rule, constant, value in reversed(saved):
+            setattr(rule, constant, value)
+
+
+def sweep(
+    frame: TelemetryFrame,
+    since: datetime,
+    until: datetime,
+    grid: list[dict[str, Any]],
+    rules: dict[str, ModuleType] | None = None,
+    workers: int | None = None,
+) -> list[tuple[dict[str, Any], dict[str, dict[str, Any]]]]:
+    """Replay once per overrides dict in ``grid`` across a process pool; returns (overrides, summary) pairs.
+
+    The frame is sent to each worker once, not once per combination.
+    """
+    names = list(BACKTEST_RULES if rules is None else rules)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(frame, since, until, names)
+    ) as pool:
+        return list(zip(grid, pool.map(_replay_overrides, grid)))
+
+
+def _init_worker(frame: TelemetryFrame, since: datetime, until: datetime, names: list[str]) -> None:
+    _worker.update(frame=frame, since=since, until=until, rules={name: RULES[name] for name in names})
+
+
+def _replay_overrides(overrides: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    with overridden(overrides):
+        alerts = replay(_worker["frame"], _worker["since"], _worker["until"], _worker["rules"])
+    return summarize(alerts, _worker["until"])
+
+
+def parse_grid(assignments: list[str]) -> list[dict[str, Any]]:
+    """``["moisture._THRESHOLD_DRY=12,14", "frost._TEMP_WARNING=2,3"]`` -> every combination."""
+    axes: list[tuple[str, list[float]]] = []
+    for assignment in assignments:
+        target, _, values = assignment.partition("=")
+        if not values:
+            raise ValueError(f"expected RULE.CONSTANT=V1,V2,...: {assignment}")
+        axes.append((target, [float(value) for value in values.split(",")]))
+    return [dict(zip([t for t, _ in axes], combo)) for combo in itertools.product(*(v for _, v in axes))]
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+async def load_range(conn: Any, since: datetime, until: datetime) -> TelemetryFrame:
+    """Stream every node's readings recorded between ``since`` and ``until`` into one frame."""
+    node_rows = (await conn.execute(NODE_QUERY)).mappings().all()
+    query = (
+        select(
+            nodes.c.id.label("node_id"),
+            telemetry_readings.c.recorded_at,
+            *(telemetry_readings.c[name] for name in SENSOR_COLUMNS),
+        )
+        .select_from(telemetry_readings.join(nodes, nodes.c.device_id == telemetry_readings.c.device_id))
+        .where(telemetry_readings.c.recorded_at >= since, telemetry_readings.c.recorded_at <= until)
+    )
+    node_ids: list[str] = []
+    stamps: list[float] = []
+    values: dict[str, list[float]] = {name: [] for name in SENSOR_COLUMNS}
+    result = await conn.stream(query)
+    async for chunk in result.mappings().partitions(_CHUNK_ROWS):
+        for row in chunk:
+            node_ids.append(str(row["node_id"]))
+            stamps.append(row["recorded_at"].timestamp())
+            for name in SENSOR_COLUMNS:
+                values[name].append(np.nan if row[name] is None else row[name])
+    return TelemetryFrame.from_columns(node_rows, node_ids, np.array(stamps), values)
+
+
+def load_files(readings_path: Path, nodes_path: Path) -> TelemetryFrame:
+    """Build a frame from a CSV or Parquet readings export and a CSV of nodes."""
+    with nodes_path.open(newline="", encoding="utf-8") as fh:
+        node_rows = [
+            {**row, "reference_lux_peak": float(row["reference_lux_peak"]) if row.get("reference_lux_peak") else None}
+            for row in csv.DictReader(fh)
+        ]
+
+    if readings_path.suffix == ".parquet":
+        if pq is None:
+            raise RuntimeError("reading Parquet exports needs pyarrow installed")
+        table = pq.read_table(readings_path, columns=["node_id", "recorded_at", *SENSOR_COLUMNS])
+        stamps = table.column("recorded_at").cast("timestamp[us, tz=UTC]").cast("int64").to_numpy() / 1e6
+        return TelemetryFrame.from_columns(
+            node_rows,
+            table.column("node_id").to_pylist(),
+            stamps,
+            {name: table.column(name).to_numpy(zero_copy_only=False) for name in SENSOR_COLUMNS},
+        )
+
+    node_ids: list[str] = []
+    stamps_list: list[float] = []
+    values: dict[str, list[float]] = {name: [] for name in SENSOR_COLUMNS}
+    with readings_path.open(newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            node_ids.append(row["node_id"])
+            stamps_list.append(_parse_time(row["recorded_at"]).timestamp())
+            for name in SENSOR_COLUMNS:
+                values[name].append(float(row[name]) if row.get(name) else np.nan)
+    return TelemetryFrame.from_columns(node_rows, node_ids, np.array(stamps_list), values)
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------------
+
+async def _load(args: argparse.Namespace, since: datetime, until: datetime) -> TelemetryFrame:
+    if args.readings:
+        return load_files(Path(args.readings), Path(args.nodes))
+    engine = create_async_engine(get_settings().database.dsn)
+    try:
+        async with engine.connect() as conn:
+            return await load_range(conn, since, until)
+    finally:
+        await engine.dispose()
+
+
+def _write(out: Any, payload: dict[str, Any]) -> None:
+    out.write(json.dumps(payload, default=str) + "\n")
+
+
+def backtest(args: argparse.Namespace) -> None:
+    since, until = _parse_time(args.since), _parse_time(args.until)
+    rules = {name: BACKTEST_RULES[name] for name in args.rule} if args.rule else BACKTEST_RULES
+    grid = parse_grid(args.set) if args.set else []
+
+    t0 = time.monotonic()
+    lead = max(rule.WINDOW for rule in rules.values())
+    frame = asyncio.run(_load(args, since - lead, until))
+    logger.info("backtest_loaded", nodes=frame.node_count, readings=len(frame), elapsed_s=round(time.monotonic() - t0, 3))
+
+    t0 = time.monotonic()
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        if grid:
+            for overrides, summary in sweep(frame, since, until, grid, rules, args.workers):
+                _write(out, {"overrides": overrides, "summary": summary})
+        else:
+            alerts = replay(frame, since, until, rules)
+            for alert in alerts:
+                _write(out, alert)
+            logger.info("backtest_summary", summary=summarize(alerts, until))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    logger.info("backtest_complete", combinations=len(grid) or 1, elapsed_s=round(time.monotonic() - t0, 3))
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(prog="vineguard-analytics-backtest", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--since", required=True, help="start of the replay (ISO 8601; UTC if no offset)")
+    parser.add_argument("--until", required=True, help="end of the replay (ISO 8601; UTC if no offset)")
+    parser.add_argument("--readings", help="CSV or Parquet export to replay instead of the database")
+    parser.add_argument("--nodes", help="CSV of nodes (required with --readings)")
+    parser.add_argument("--rule", action="append", choices=sorted(BACKTEST_RULES), help="only these rules")
+    parser.add_argument(
+        "--set", action="append", default=[], metavar="RULE.CONSTANT=V1,V2",
+        help="sweep a rule constant over these values (repeat for a grid)",
+    )
+    parser.add_argument("--workers", type=int, help="sweep processes (default: CPU count)")
+    parser.add_argument("--out", help="write JSON lines here instead of stdout")
+    args = parser.parse_args()
+    if args.readings and not args.nodes:
+        parser.error("--readings needs --nodes")
+    # Alerts and summaries go to stdout; keep the log lines out of them.
+    structlog.configure(logger_factory=structlog.PrintLoggerFactory(sys.stderr))
+    backtest(args)
+
+
+if __name__ == "__main__":
+    run()
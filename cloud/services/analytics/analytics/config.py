@@ -13,6 +13,48 @@ class DatabaseSettings(BaseModel):
 class RedisSettings(BaseModel):
     url: str = "redis://redis:6379/0"
     telemetry_channel: str = "telemetry-stream"
+    # The API publishes manual resolves here so the active-alert index drops them.
+    alert_events_channel: str = "alert-events"
+
+
+class StreamingSettings(BaseModel):
+    """Evaluate frost, moisture and mildew per reading from the telemetry channel.
+
+    The periodic rule engine then only reconciles, every
+    ``reconcile_interval_seconds`` instead of ``polling_interval_seconds``.
+    """
+
+    enabled: bool = True
+    reconcile_interval_seconds: int = 900
+
+
+class CoordinationSettings(BaseModel):
+    """Share the work between analytics replicas through Redis.
+
+    Vineyards are split across live replicas and the stale-node check runs
+    on one elected leader; a replica silent for ``ttl_seconds`` is dropped
+    and its vineyards move to the others.  Leave off for a single replica.
+    """
+
+    enabled: bool = False
+    replica_id: str = ""  # hostname-pid when empty
+    key_prefix: str = "vineguard:analytics"
+    ttl_seconds: int = 15
+
+
+class ProfilingSettings(BaseModel):
+    """Record timings of every rule engine frame load and (rule, vineyard) run.
+
+    The last ``history`` runs are served as JSON on ``port`` (``/rules``,
+    ``/runs``).  Runs taking ``explain_slow_seconds`` or longer also get
+    ``EXPLAIN (ANALYZE, BUFFERS)`` of their slowest SELECT; 0 turns that off.
+    """
+
+    enabled: bool = False
+    host: str = "0.0.0.0"
+    port: int = 9109
+    history: int = 500
+    explain_slow_seconds: float = 0.0
 
 
 class AnalyticsSettings(BaseSettings):
@@ -21,6 +63,13 @@ class AnalyticsSettings(BaseSettings):
     database: DatabaseSettings
     redis: RedisSettings = RedisSettings()
     polling_interval_seconds: int = 300
+    # (rule, vineyard) transactions run at once; also the DB pool size.
+    rule_concurrency: int = 8
+    # Full reload of the in-memory active-alert index, bounding any drift.
+    alert_index_reload_seconds: int = 3600
+    streaming: StreamingSettings = StreamingSettings()
+    coordination: CoordinationSettings = CoordinationSettings()
+    profiling: ProfilingSettings = ProfilingSettings()
 
 
 @lru_cache
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import zlib
+from collections.abc import Callable
+
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = structlog.get_logger()
+
+# Take the leader key if it is free, or extend it if we already hold it.
+_CLAIM_LEADER = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then return 1 end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Drop the leader key only if we still hold it.
+_RELEASE_LEADER = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+def owner_of(vineyard_id: str, members: tuple[str, ...]) -> str:
+    """Rendezvous hashing: the member with the highest crc32(member:vineyard).
+
+    Every replica computes the same answer from the same member list, and
+    when a member joins or leaves only the vineyards it wins or held move.
+    """
+    return max(members, key=lambda member: zlib.crc32(f"{member}:{vineyard_id}".encode("utf-8")))
+
+
+class Coordinator:
+    """Membership, leadership and vineyard ownership shared between analytics replicas.
+
+    Each replica heartbeats into a Redis sorted set (member -> last beat);
+    members silent for ``ttl_seconds`` are dropped, so a dead replica's
+    vineyards move to the survivors within one TTL.  Vineyards are split
+    with ``owner_of``; singleton jobs run on the holder of a leader key
+    that expires after the same TTL.  ``on_change`` callbacks run whenever
+    the member list changes.
+    """
+
+    def __init__(self, redis: Redis, *, replica_id: str, key_prefix: str, ttl_seconds: float) -> None:
+        self._redis = redis
+        self.replica_id = replica_id
+        self._members_key = f"{key_prefix}:members"
+        self._leader_key = f"{key_prefix}:leader"
+        self._ttl = ttl_seconds
+        self.members: tuple[str, ...] = (replica_id,)
+        self.is_leader = False
+        self._callbacks: list[Callable[[], None]] = []
+        self._stopping = asyncio.Event()
+
+    def on_change(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+
+    def owns(self, vineyard_id: str) -> bool:
+        return owner_of(vineyard_id, self.members) == self.replica_id
+
+    async def heartbeat(self) -> None:
+        """Refresh our membership and leadership, and read the live member list."""
+        now = time.time()
+        await self._redis.zadd(self._members_key, {self.replica_id: now})
+        await self._redis.zremrangebyscore(self._members_key, "-inf", now - self._ttl)
+        live = await self._redis.zrange(self._members_key, 0, -1)
+        members = tuple(sorted(m.decode() if isinstance(m, bytes) else m for m in live)) or (self.replica_id,)
+        leader = bool(await self._redis.eval(
+            _CLAIM_LEADER, 1, self._leader_key, self.replica_id, int(self._ttl * 1000)
+        ))
+
+        if leader != self.is_leader:
+            logger.info("analytics_leadership", replica=self.replica_id, leader=leader)
+        self.is_leader = leader
+        if members != self.members:
+            logger.info("analytics_members_changed", replica=self.replica_id, members=list(members))
+            self.members = members
+            for callback in self._callbacks:
+                callback()
+
+    async def run(self) -> None:
+        """Heartbeat three times per TTL until ``leave``.
+
+        On Redis errors leadership is given up (another replica may take
+        it) but the last member list is kept, so vineyards stay assigned.
+        """
+        while not self._stopping.is_set():
+            try:
+                await self.heartbeat()
+            except RedisError as exc:
+                self.is_leader = False
+                logger.warning("analytics_heartbeat_failed", replica=self.replica_id, error=str(exc))
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self._ttl / 3)
+            except asyncio.TimeoutError:
+                pass
+
+    async def leave(self) -> None:
+        """Stop heartbeating and hand our vineyards and leadership over now rather than after the TTL."""
+        self._stopping.set()
+        self.is_leader = False
+        try:
+            await self._redis.zrem(self._members_key, self.replica_id)
+            await self._redis.eval(_RELEASE_LEADER, 1, self._leader_key, self.replica_id)
+        except RedisError as exc:
+            logger.warning("analytics_leave_failed", replica=self.replica_id, error=str(exc))
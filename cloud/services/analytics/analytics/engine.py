@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import AbstractContextManager, nullcontext
+from datetime import datetime, timedelta, timezone
+from collections.abc import Callable
+from typing import Any
+from types import ModuleType
+
+import structlog
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .alert_index import ActiveAlertIndex
+from .alert_manager import apply_alerts
+from .frame import TelemetryFrame, load_frame, load_latest_frame, load_rollup_frame, rollups_available
+from .profiling import RuleProfiler
+from .rules import canopy_lux, frost, gdd, mildew_mpi, moisture
+
+logger = structlog.get_logger()
+
+# Every rule module declares RULE_KEYS, WINDOW (how far back it reads) and
+# INTERVAL (how often it runs).  Rules with a pure ``evaluate(frame, now)``
+# return alerts that the engine persists; a rule with ``apply(conn, frame,
+# now, index)`` instead does its own writes (GDD keeps a running table).
+# A rule with ``SOURCE = "hourly"`` or ``"daily"`` is handed a frame of
+# rollup buckets (``ROLLUP_COLUMNS``) instead of raw readings, and one with
+# ``SOURCE = "latest"`` only each node's newest reading in its WINDOW.  A
+# rule that carries per-vineyard state between runs exposes
+# ``forget(vineyard_id)``, called when this replica takes a vineyard over
+# from another one and when the vineyard's transaction fails (the state
+# would describe rows that were rolled back).
+RULES: dict[str, ModuleType] = {
+    "moisture": moisture,
+    "frost": frost,
+    "mildew_mpi": mildew_mpi,
+    "canopy_lux": canopy_lux,
+    "gdd": gdd,
+}
+
+# Ticks never land exactly one interval apart; a rule a little short of its
+# interval is still due, rather than skipped until the following tick.
+_DUE_SLACK = timedelta(seconds=30)
+
+
+class RuleEngine:
+    """Evaluate every due rule against one shared telemetry frame per tick.
+
+    A tick loads the widest window any due rule needs with a single query
+    per source (raw readings, hourly or daily rollups) and splits it by
+    vineyard.  Every (rule, vineyard) pair is evaluated and written in a
+    short transaction of its own, at most ``concurrency`` at a time, so one
+    large or failing vineyard does not hold back the rest.  With ``owns``
+    (see ``coordination``), only this replica's vineyards are run.
+    With an ``index``, cooldown checks are answered from memory; a failed
+    rule marks it stale, since its rolled-back writes were already applied.
+    With a ``profiler``, every frame load and partition is recorded there.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        rules: dict[str, ModuleType] | None = None,
+        index: ActiveAlertIndex | None = None,
+        concurrency: int = 8,
+        owns: Callable[[str], bool] | None = None,
+        profiler: RuleProfiler | None = None,
+    ) -> None:
+        self._engine = engine
+        self._rules = RULES if rules is None else rules
+        self._index = index
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._owns = owns
+        self._owned: set[str] = set()
+        self._profiler = profiler
+        self._last_run: dict[str, datetime] = {}
+        self._rollup_views: bool | None = None  # checked on first use
+
+    def due(self, now: datetime) -> list[str]:
+        return [
+            name for name, rule in self._rules.items()
+            if name not in self._last_run or now - self._last_run[name] >= rule.INTERVAL - _DUE_SLACK
+        ]
+
+    async def tick(self, now: datetime | None = None) -> list[str]:
+        """Run the rules that are due; returns their names."""
+        now = now or datetime.now(tz=timezone.utc)
+        names = self.due(now)
+        if not names:
+            return []
+
+        by_source: dict[str, list[str]] = {}
+        for name in names:
+            by_source.setdefault(getattr(self._rules[name], "SOURCE", "raw"), []).append(name)
+
+        frames: dict[str, TelemetryFrame] = {}
+        loads: list[dict[str, Any]] = []
+        async with self._engine.connect() as conn:
+            if self._index is not None:
+                await self._index.refresh(conn)
+            for source, members in by_source.items():
+                t0 = time.monotonic()
+                since = now - max(self._rules[name].WINDOW for name in members)
+                with self._profile("load", source=source, rules=members) as run:
+                    if source == "raw":
+                        frames[source] = await load_frame(conn, since)
+                    elif source == "latest":
+                        frames[source] = await load_latest_frame(conn, since)
+                    else:
+                        if self._rollup_views is None:
+                            self._rollup_views = await rollups_available(conn)
+                            logger.info("rollup_source", continuous_aggregates=self._rollup_views)
+                        frames[source] = await load_rollup_frame(conn, source, since, views=self._rollup_views)
+                    run["nodes"] = frames[source].node_count
+                    run["rows"] = len(frames[source])
+                loads.append(run)
+                logger.info(
+                    "frame_loaded",
+                    source=source,
+                    rules=members,
+                    nodes=frames[source].node_count,
+                    rows=len(frames[source]),
+                    elapsed_s=round(time.monotonic() - t0, 3),
+                )
+        for run in loads:
+            await self._explain(run)
+
+        parts = {source: self._owned_parts(frame) for source, frame in frames.items()}
+        # Rules queue in RULES order, so frost partitions start before canopy/GDD ones.
+        await asyncio.gather(*(
+            self._run_rule(name, parts[source], now)
+            for source, members in by_source.items()
+            for name in members
+        ))
+        for name in names:
+            self._last_run[name] = now
+        return names
+
+    def _owned_parts(self, frame: TelemetryFrame) -> dict[str, TelemetryFrame]:
+        parts = frame.partition("vineyard_id")
+        if self._owns is None:
+            return parts
+        owned = {vineyard_id for vineyard_id in parts if self._owns(vineyard_id)}
+        for vineyard_id in owned - self._owned:
+            for rule in self._rules.values():
+                if hasattr(rule, "forget"):
+                    rule.forget(vineyard_id)
+        self._owned = (self._owned - parts.keys()) | owned
+        return {vineyard_id: parts[vineyard_id] for vineyard_id in owned}
+
+    async def _run_rule(self, name: str, parts: dict[str, TelemetryFrame], now: datetime) -> None:
+        t0 = time.monotonic()
+        results = await asyncio.gather(*(
+            self._run_partition(name, vineyard_id, part, now) for vineyard_id, part in parts.items()
+        ))
+        logger.info(
+            "rule_complete",
+            rule=name,
+            vineyards=len(parts),
+            failed=results.count(False),
+            elapsed_s=round(time.monotonic() - t0, 3),
+        )
+
+    async def _run_partition(self, name: str, vineyard_id: str, frame: TelemetryFrame, now: datetime) -> bool:
+        """Evaluate and persist one rule for one vineyard; returns False if it failed."""
+        rule = self._rules[name]
+        run: dict[str, Any] = {}
+        async with self._slots:
+            try:
+                with self._profile(
+                    "rule", rule=name, vineyard_id=vineyard_id, nodes=frame.node_count, readings=len(frame)
+                ) as run:
+                    triggered = None
+                    if not hasattr(rule, "apply"):
+                        t0 = time.perf_counter()
+                        triggered = rule.evaluate(frame, now)
+                        run["evaluate_s"] = time.perf_counter() - t0
+                        run["alerts"] = len(triggered)
+                    t0 = time.perf_counter()
+                    async with self._engine.begin() as conn:
+                        if triggered is None:
+                            await rule.apply(conn, frame, now, index=self._index)
+                        else:
+                            await apply_alerts(
+                                conn,
+                                rule.RULE_KEYS,
+                                triggered,
+                                only_node_ids=[node["node_id"] for node in frame.nodes],
+                                index=self._index,
+                            )
+                    run["transaction_s"] = time.perf_counter() - t0
+                ok = True
+            except Exception:
+                if self._index is not None:
+                    self._index.mark_stale()
+                if hasattr(rule, "forget"):
+                    rule.forget(vineyard_id)
+                logger.exception("rule_failed", rule=name, vineyard=vineyard_id)
+                ok = False
+        await self._explain(run)
+        return ok
+
+    def _profile(self, kind: str, **fields: Any) -> AbstractContextManager[dict[str, Any]]:
+        if self._profiler is None:
+            return nullcontext({})
+        return self._profiler.run(kind, **fields)
+
+    async def _explain(self, run: dict[str, Any]) -> None:
+        if self._profiler is not None:
+            await self._profiler.explain_slow(self._engine, run)
@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable, Mapping
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import numpy as np
+from sqlalchemy import func, literal_column, select, true
+
+from .models import blocks, nodes, telemetry_daily, telemetry_hourly, telemetry_readings, vineyards
+
+# Sensor columns carried in the frame; None becomes NaN.
+SENSOR_COLUMNS = ("soil_moisture", "ambient_temp_c", "ambient_humidity", "light_lux", "leaf_wetness_pct")
+
+# Columns of the hourly/daily rollups (continuous_aggregates.sql) carried in a
+# rollup frame; averages are kept as sum + count so buckets can be combined.
+ROLLUP_COLUMNS = (
+    "readings",
+    "soil_moisture_sum",
+    "soil_moisture_n",
+    "ambient_temp_c_sum",
+    "ambient_temp_c_n",
+    "ambient_temp_c_min",
+    "ambient_temp_c_max",
+    "light_lux_max",
+)
+
+# Rollup source -> (continuous aggregate, bucket width, date_trunc unit).
+ROLLUPS = {
+    "hourly": (telemetry_hourly, timedelta(hours=1), "hour"),
+    "daily": (telemetry_daily, timedelta(days=1), "day"),
+}
+
+_ID_KEYS = ("node_id", "block_id", "vineyard_id")
+
+NODE_QUERY = select(
+    nodes.c.id.label("node_id"),
+    nodes.c.device_id,
+    nodes.c.tier,
+    blocks.c.id.label("block_id"),
+    blocks.c.name.label("block_name"),
+    blocks.c.reference_lux_peak,
+    vineyards.c.id.label("vineyard_id"),
+    vineyards.c.name.label("vineyard_name"),
+).select_from(
+    nodes
+    .join(blocks, blocks.c.id == nodes.c.block_id)
+    .join(vineyards, vineyards.c.id == blocks.c.vineyard_id)
+)
+
+
+class TelemetryFrame:
+    """One window of telemetry held column by column, grouped by node.
+
+    ``nodes`` lists every registered node with its block and vineyard; reading
+    ``i`` belongs to ``nodes[node_index[i]]``.  Readings are sorted by node,
+    then by time, and sensor values are float arrays with NaN for missing
+    values, so rules can evaluate every node at once with the reductions
+    below instead of querying per rule.
+    """
+
+    def __init__(
+        self,
+        nodes: list[dict[str, Any]],
+        node_index: np.ndarray,
+        recorded_at: np.ndarray,
+        columns: Mapping[str, np.ndarray],
+    ) -> None:
+        self.nodes = nodes
+        self.node_index = node_index
+        self.recorded_at = recorded_at
+        self.columns = dict(columns)
+        self._node_masks: dict[tuple, np.ndarray] = {}
+
+    @classmethod
+    def from_rows(
+        cls,
+        node_rows: Iterable[Mapping[str, Any]],
+        reading_rows: Iterable[Mapping[str, Any]],
+        columns: tuple[str, ...] = SENSOR_COLUMNS,
+    ) -> "TelemetryFrame":
+        """Build a frame from node metadata rows and ``(node_id, recorded_at, *columns)`` rows.
+
+        Rollup frames pass ``ROLLUP_COLUMNS``; ``recorded_at`` is then the bucket start.
+        """
+        node_list = _node_list(node_rows)
+        position = {node["node_id"]: i for i, node in enumerate(node_list)}
+        readings = sorted(
+            (
+                (position[str(row["node_id"])], row["recorded_at"].timestamp(), row)
+                for row in reading_rows
+                if str(row["node_id"]) in position
+            ),
+            key=lambda item: (item[0], item[1]),
+        )
+        return cls(
+            node_list,
+            np.array([i for i, _, _ in readings], dtype=np.intp),
+            np.array([ts for _, ts, _ in readings], dtype=np.float64),
+            {
+                name: np.array(
+                    [np.nan if row[name] is None else row[name] for _, _, row in readings], dtype=np.float64
+                )
+                for name in columns
+            },
+        )
+
+    @classmethod
+    def from_columns(
+        cls,
+        node_rows: Iterable[Mapping[str, Any]],
+        node_ids: Iterable[Any],
+        recorded_at: np.ndarray,
+        columns: Mapping[str, np.ndarray],
+    ) -> "TelemetryFrame":
+        """Build a frame from per-reading arrays (``recorded_at`` in epoch seconds).
+
+        The vectorised ``from_rows`` for large exports: readings of unknown
+        nodes are dropped and the rest sorted by node, then time, with one
+        ``lexsort``.
+        """
+        node_list = _node_list(node_rows)
+        position = {node["node_id"]: i for i, node in enumerate(node_list)}
+        index = np.array([position.get(str(node_id), -1) for node_id in node_ids], dtype=np.intp)
+        recorded_at = np.asarray(recorded_at, dtype=np.float64)
+        known = np.flatnonzero(index >= 0)
+        rows = known[np.lexsort((recorded_at[known], index[known]))]
+        return cls(
+            node_list,
+            index[rows],
+            recorded_at[rows],
+            {name: np.asarray(column, dtype=np.float64)[rows] for name, column in columns.items()},
+        )
+
+    def __len__(self) -> int:
+        return len(self.recorded_at)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.nodes)
+
+    def node_column(self, name: str) -> np.ndarray:
+        """Per-node metadata as a float array (NaN where missing)."""
+        return np.array([np.nan if n[name] is None else n[name] for n in self.nodes], dtype=np.float64)
+
+    def node_mask(self, **equals: Any) -> np.ndarray:
+        """Per-node boolean mask of nodes whose metadata matches ``equals`` (cached; treat as read-only)."""
+        key = tuple(sorted(equals.items()))
+        if key not in self._node_masks:
+            self._node_masks[key] = np.array(
+                [all(n[name] == value for name, value in equals.items()) for n in self.nodes], dtype=bool
+            )
+        return self._node_masks[key]
+
+    def window(self, since: datetime, *required: str) -> np.ndarray:
+        """Row mask: readings at or after ``since`` with every ``required`` column present."""
+        mask = self.recorded_at >= since.timestamp()
+        for name in required:
+            mask &= ~np.isnan(self.columns[name])
+        return mask
+
+    def count(self, mask: np.ndarray) -> np.ndarray:
+        return np.bincount(self.node_index[mask], minlength=self.node_count)
+
+    def mean(self, name: str, mask: np.ndarray) -> np.ndarray:
+        """Per-node mean of ``name`` over ``mask``; NaN for nodes with no rows."""
+        counts = self.count(mask)
+        sums = np.bincount(self.node_index[mask], weights=self.columns[name][mask], minlength=self.node_count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    def max(self, name: str, mask: np.ndarray) -> np.ndarray:
+        return group_reduce(np.fmax, self.node_index[mask], self.columns[name][mask], self.node_count)
+
+    def min(self, name: str, mask: np.ndarray) -> np.ndarray:
+        return group_reduce(np.fmin, self.node_index[mask], self.columns[name][mask], self.node_count)
+
+    def last(self, mask: np.ndarray) -> np.ndarray:
+        """Per-node row index of the newest reading in ``mask``; -1 for nodes with none."""
+        rows = np.full(self.node_count, -1, dtype=np.intp)
+        np.maximum.at(rows, self.node_index[mask], np.flatnonzero(mask))
+        return rows
+
+    def rows(self, rows: np.ndarray | slice) -> "TelemetryFrame":
+        """Frame of the given rows (a slice gives views), keeping every node and its masks."""
+        frame = TelemetryFrame(
+            self.nodes,
+            self.node_index[rows],
+            self.recorded_at[rows],
+            {name: column[rows] for name, column in self.columns.items()},
+        )
+        frame._node_masks = self._node_masks
+        return frame
+
+    def partition(self, key: str) -> dict[str, "TelemetryFrame"]:
+        """Split into one frame per distinct node ``key`` (e.g. ``vineyard_id``).
+
+        Rows are already grouped by node, so each part is a slice list, not a scan.
+        """
+        starts = np.searchsorted(self.node_index, np.arange(self.node_count + 1))
+        members: dict[str, list[int]] = {}
+        for i, node in enumerate(self.nodes):
+            members.setdefault(node[key], []).append(i)
+        parts: dict[str, TelemetryFrame] = {}
+        for value, idx in members.items():
+            rows = np.concatenate([np.arange(starts[i], starts[i + 1], dtype=np.intp) for i in idx])
+            renumber = np.zeros(self.node_count, dtype=np.intp)
+            renumber[idx] = np.arange(len(idx))
+            parts[value] = TelemetryFrame(
+                [self.nodes[i] for i in idx],
+                renumber[self.node_index[rows]],
+                self.recorded_at[rows],
+                {name: column[rows] for name, column in self.columns.items()},
+            )
+        return parts
+
+    def take(self, name: str, rows: np.ndarray) -> np.ndarray:
+        """Values of ``name`` at per-node ``rows`` (from ``last``); NaN where a row is -1."""
+        out = np.full(len(rows), np.nan)
+        found = rows >= 0
+        out[found] = self.columns[name][rows[found]]
+        return out
+
+
+class RunningWindow:
+    """One node's readings inside a trailing window, with running sums of ``columns``.
+
+    Only readings with every column present are kept, as with
+    ``TelemetryFrame.window``.  ``add`` and ``expire`` are O(1) per reading,
+    so the streaming evaluator never rebuilds a frame per reading; rules read
+    ``count``, ``mean``, ``positive`` and ``latest`` in ``evaluate_window``.
+    """
+
+    def __init__(self, span: timedelta, columns: tuple[str, ...]) -> None:
+        self.span = span
+        self._columns = columns
+        self._readings: deque[Mapping[str, Any]] = deque()
+        self._sums = dict.fromkeys(columns, 0.0)
+        self._positive = dict.fromkeys(columns, 0)
+        self.latest: Mapping[str, Any] | None = None
+
+    def __len__(self) -> int:
+        return len(self._readings)
+
+    @property
+    def count(self) -> int:
+        return len(self._readings)
+
+    def add(self, reading: Mapping[str, Any]) -> None:
+        if any(reading[name] is None for name in self._columns):
+            return
+        self._readings.append(reading)
+        for name in self._columns:
+            self._sums[name] += reading[name]
+            self._positive[name] += reading[name] > 0
+        if self.latest is None or reading["recorded_at"] >= self.latest["recorded_at"]:
+            self.latest = reading
+
+    def expire(self, now: datetime) -> None:
+        """Drop readings older than ``now - span``, assuming they arrive roughly in order."""
+        since = now - self.span
+        while self._readings and self._readings[0]["recorded_at"] < since:
+            reading = self._readings.popleft()
+            for name in self._columns:
+                self._sums[name] -= reading[name]
+                self._positive[name] -= reading[name] > 0
+        if not self._readings:
+            self._sums = dict.fromkeys(self._columns, 0.0)  # no rounding left over from the subtractions
+            self.latest = None
+        elif self.latest is not None and self.latest["recorded_at"] < since:
+            self.latest = None
+
+    def mean(self, name: str) -> float:
+        """Mean of ``name`` over the window; NaN when it is empty."""
+        return self._sums[name] / len(self._readings) if self._readings else math.nan
+
+    def positive(self, name: str) -> int:
+        """How many readings in the window have ``name > 0``."""
+        return self._positive[name]
+
+
+def _node_list(node_rows: Iterable[Mapping[str, Any]]) -> list[dict[str, Any]]:
+    node_list = []
+    for row in node_rows:
+        node = dict(row)
+        for key in _ID_KEYS:
+            node[key] = str(node[key])
+        node_list.append(node)
+    return node_list
+
+
+def group_reduce(ufunc: np.ufunc, groups: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """``np.fmax``/``np.fmin`` of ``values`` per group id in ``[0, size)``; NaN for empty groups."""
+    out = np.full(size, np.nan)
+    ufunc.at(out, groups, values)  # fmax/fmin ignore the NaN starting value
+    return out
+
+
+async def load_frame(conn: Any, since: datetime) -> TelemetryFrame:
+    """Fetch every node and all readings recorded at or after ``since`` (two queries)."""
+    node_rows = (await conn.execute(NODE_QUERY)).mappings().all()
+    reading_query = (
+        select(
+            nodes.c.id.label("node_id"),
+            telemetry_readings.c.recorded_at,
+            *(telemetry_readings.c[name] for name in SENSOR_COLUMNS),
+        )
+        .select_from(telemetry_readings.join(nodes, nodes.c.device_id == telemetry_readings.c.device_id))
+        .where(telemetry_readings.c.recorded_at >= since)
+    )
+    reading_rows = (await conn.execute(reading_query)).mappings().all()
+    return TelemetryFrame.from_rows(node_rows, reading_rows)
+
+
+async def load_latest_frame(conn: Any, since: datetime) -> TelemetryFrame:
+    """Fetch every node and its newest reading recorded at or after ``since``.
+
+    A LATERAL ``ORDER BY recorded_at DESC LIMIT 1`` per node is one probe of
+    ``idx_telemetry_device`` each, so only one row per node is read however
+    long the window; nodes without a reading in it get no row.
+    """
+    node_rows = (await conn.execute(NODE_QUERY)).mappings().all()
+    latest = (
+        select(telemetry_readings.c.recorded_at, *(telemetry_readings.c[name] for name in SENSOR_COLUMNS))
+        .where(
+            telemetry_readings.c.device_id == nodes.c.device_id,
+            telemetry_readings.c.recorded_at >= since,
+        )
+        .order_by(telemetry_readings.c.recorded_at.desc())
+        .limit(1)
+        .lateral("latest")
+    )
+    query = select(
+        nodes.c.id.label("node_id"),
+        latest.c.recorded_at,
+        *(latest.c[name] for name in SENSOR_COLUMNS),
+    ).select_from(nodes.join(latest, true()))
+    reading_rows = (await conn.execute(query)).mappings().all()
+    return TelemetryFrame.from_rows(node_rows, reading_rows)
+
+
+async def rollups_available(conn: Any) -> bool:
+    """Whether the hourly and daily continuous aggregates exist (TimescaleDB)."""
+    row = (await conn.execute(
+        select(func.to_regclass(telemetry_hourly.name), func.to_regclass(telemetry_daily.name))
+    )).first()
+    return row is not None and all(value is not None for value in row)
+
+
+def bucket_start(since: datetime, width: timedelta) -> datetime:
+    """Start of the bucket containing ``since`` (buckets are aligned to the epoch, UTC)."""
+    step = width.total_seconds()
+    return datetime.fromtimestamp(math.floor(since.timestamp() / step) * step, tz=timezone.utc)
+
+
+async def load_rollup_frame(conn: Any, source: str, since: datetime, *, views: bool) -> TelemetryFrame:
+    """Fetch every node and its ``source`` ("hourly"/"daily") buckets from the one containing ``since``.
+
+    Reads the continuous aggregate when ``views`` is set; otherwise (plain
+    PostgreSQL) the same columns are grouped from ``telemetry_readings`` in
+    the query, so only buckets cross the wire either way.
+    """
+    view, width, unit = ROLLUPS[source]
+    start = bucket_start(since, width)
+    node_rows = (await conn.execute(NODE_QUERY)).mappings().all()
+    if views:
+        query = (
+            select(
+                nodes.c.id.label("node_id"),
+                view.c.bucket.label("recorded_at"),
+                *(view.c[name] for name in ROLLUP_COLUMNS),
+            )
+            .select_from(view.join(nodes, nodes.c.device_id == view.c.device_id))
+            .where(view.c.bucket >= start)
+        )
+    else:
+        raw = telemetry_readings.c
+        # Literal arguments so the GROUP BY repeats the select expression exactly.
+        bucket = func.date_trunc(literal_column(f"'{unit}'"), raw.recorded_at, literal_column("'UTC'"))
+        query = (
+            select(
+                nodes.c.id.label("node_id"),
+                bucket.label("recorded_at"),
+                func.count().label("readings"),
+                func.sum(raw.soil_moisture).label("soil_moisture_sum"),
+                func.count(raw.soil_moisture).label("soil_moisture_n"),
+                func.sum(raw.ambient_temp_c).label("ambient_temp_c_sum"),
+                func.count(raw.ambient_temp_c).label("ambient_temp_c_n"),
+                func.min(raw.ambient_temp_c).label("ambient_temp_c_min"),
+                func.max(raw.ambient_temp_c).label("ambient_temp_c_max"),
+                func.max(raw.light_lux).label("light_lux_max"),
+            )
+            .select_from(telemetry_readings.join(nodes, nodes.c.device_id == raw.device_id))
+            .where(raw.recorded_at >= start)
+            .group_by(nodes.c.id, bucket)
+        )
+    bucket_rows = (await conn.execute(query)).mappings().all()
+    return TelemetryFrame.from_rows(node_rows, bucket_rows, ROLLUP_COLUMNS)
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
 import asyncio
-import time
+import os
+import socket
 from datetime import datetime, timedelta, timezone
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from redis.asyncio import Redis
 from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 import structlog
 
+from .alert_index import ActiveAlertIndex, listen_for_alert_events
 from .config import AnalyticsSettings, get_settings
+from .coordination import Coordinator
+from .engine import RuleEngine
 from .models import nodes
-from .rules import canopy_lux, frost, gdd, mildew_mpi, moisture
+from .profiling import RuleProfiler, serve as serve_profiler
+from .streaming import StreamingEvaluator
 
 logger = structlog.get_logger()
 
@@ -20,12 +26,16 @@ logger = structlog.get_logger()
 # Node stale detection
 # ---------------------------------------------------------------------------
 
-async def check_stale_nodes(engine: AsyncEngine) -> None:
+async def check_stale_nodes(engine: AsyncEngine, coordinator: Coordinator | None = None) -> None:
     """Update node status based on last_seen_at.
 
     - > 30 min without a heartbeat → 'stale'
     - > 2 hours without a heartbeat → 'inactive'
+
+    With several replicas only the leader runs it.
     """
+    if coordinator is not None and not coordinator.is_leader:
+        return
     now = datetime.now(tz=timezone.utc)
     stale_cutoff = now - timedelta(minutes=30)
     inactive_cutoff = now - timedelta(hours=2)
@@ -56,28 +66,6 @@ async def check_stale_nodes(engine: AsyncEngine) -> None:
         logger.exception("stale_node_check_failed")
 
 
-# ---------------------------------------------------------------------------
-# Generic job wrapper
-# ---------------------------------------------------------------------------
-
-def _make_job(rule_name: str, rule_module):
-    """Return an async callable that runs a rule module's run() and logs timing/errors."""
-
-    async def _job(engine: AsyncEngine) -> None:
-        t0 = time.monotonic()
-        try:
-            await rule_module.run(engine)
-            elapsed = time.monotonic() - t0
-            logger.info("rule_complete", rule=rule_name, elapsed_s=round(elapsed, 3))
-        except Exception:
-            elapsed = time.monotonic() - t0
-            logger.exception("rule_failed", rule=rule_name, elapsed_s=round(elapsed, 3))
-
-    # Give the wrapper a meaningful name for APScheduler's job list
-    _job.__name__ = f"run_{rule_name}"
-    return _job
-
-
 # ---------------------------------------------------------------------------
 # Scheduler setup
 # ---------------------------------------------------------------------------
@@ -91,65 +79,76 @@ async def run_periodic_jobs(settings: AnalyticsSettings) -> None:
         ]
     )
 
-    engine = create_async_engine(settings.database.dsn)
+    # One pooled connection per concurrent rule partition; the overflow covers
+    # streaming writes and the stale-node check.
+    engine = create_async_engine(settings.database.dsn, pool_size=settings.rule_concurrency)
     scheduler = AsyncIOScheduler()
 
-    # Moisture — every 5 minutes
-    scheduler.add_job(
-        _make_job("moisture", moisture),
-        "interval",
-        minutes=5,
-        args=[engine],
-        id="moisture",
-        name="Soil Moisture Rule",
+    # Active alerts and their cooldowns, held in memory; manual resolves in
+    # the API arrive over Redis.
+    redis = Redis.from_url(settings.redis.url)
+    alert_index = ActiveAlertIndex(max_age_seconds=settings.alert_index_reload_seconds)
+    async with engine.connect() as conn:
+        await alert_index.load(conn)
+    tasks = [asyncio.create_task(listen_for_alert_events(alert_index, redis, settings.redis.alert_events_channel))]
+
+    # Coordination — vineyards split across replicas, one leader for singletons.
+    # A member change means alerts may have been written by another replica.
+    coordinator = None
+    owns = None
+    if settings.coordination.enabled:
+        coordinator = Coordinator(
+            redis,
+            replica_id=settings.coordination.replica_id or f"{socket.gethostname()}-{os.getpid()}",
+            key_prefix=settings.coordination.key_prefix,
+            ttl_seconds=settings.coordination.ttl_seconds,
+        )
+        coordinator.on_change(alert_index.mark_stale)
+        await coordinator.heartbeat()
+        tasks.append(asyncio.create_task(coordinator.run()))
+        owns = coordinator.owns
+
+    # Streaming — frost/moisture/mildew evaluated as each reading is published
+    if settings.streaming.enabled:
+        streaming = StreamingEvaluator(engine, index=alert_index, owns=owns)
+        await streaming.warm()
+        tasks.append(asyncio.create_task(streaming.run(redis, settings.redis.telemetry_channel)))
+
+    # Profiling — per-run query/transaction timings served over HTTP
+    profiler = None
+    profiling_server = None
+    if settings.profiling.enabled:
+        profiler = RuleProfiler(
+            history=settings.profiling.history,
+            explain_slow_seconds=settings.profiling.explain_slow_seconds,
+        )
+        profiler.instrument(engine)
+        profiling_server = await serve_profiler(profiler, settings.profiling.host, settings.profiling.port)
+
+    # Rules — one shared telemetry frame per tick; each rule runs on its own
+    # interval (moisture/frost 5 min, mildew 10 min, canopy/GDD 60 min).
+    # With streaming on, the ticks only reconcile, so they can be sparser.
+    rule_engine = RuleEngine(
+        engine, index=alert_index, concurrency=settings.rule_concurrency, owns=owns, profiler=profiler
     )
-
-    # Frost — every 5 minutes (time-sensitive)
-    scheduler.add_job(
-        _make_job("frost", frost),
-        "interval",
-        minutes=5,
-        args=[engine],
-        id="frost",
-        name="Frost Rule",
-    )
-
-    # Mildew MPI — every 10 minutes
-    scheduler.add_job(
-        _make_job("mildew_mpi", mildew_mpi),
-        "interval",
-        minutes=10,
-        args=[engine],
-        id="mildew_mpi",
-        name="Mildew MPI Rule",
-    )
-
-    # Canopy Lux — every 60 minutes
-    scheduler.add_job(
-        _make_job("canopy_lux", canopy_lux),
-        "interval",
-        minutes=60,
-        args=[engine],
-        id="canopy_lux",
-        name="Canopy Lux Rule",
-    )
-
-    # GDD — every 60 minutes (daily totals, polling is fine)
     scheduler.add_job(
-        _make_job("gdd", gdd),
+        rule_engine.tick,
         "interval",
-        minutes=60,
-        args=[engine],
-        id="gdd",
-        name="GDD Accumulation Rule",
+        seconds=(
+            settings.streaming.reconcile_interval_seconds
+            if settings.streaming.enabled
+            else settings.polling_interval_seconds
+        ),
+        id="rules",
+        name="Rule Engine",
     )
 
-    # Node stale detection — every 5 minutes
+    # Node stale detection — every 5 minutes, on the leader only
     scheduler.add_job(
         check_stale_nodes,
         "interval",
         minutes=5,
-        args=[engine],
+        args=[engine, coordinator],
         id="stale_nodes",
         name="Node Stale Detection",
     )
@@ -164,6 +163,14 @@ async def run_periodic_jobs(settings: AnalyticsSettings) -> None:
         while True:
             await asyncio.sleep(60)
     finally:
+        if coordinator is not None:
+            await coordinator.leave()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if profiling_server is not None:
+            profiling_server.close()
+        await redis.aclose()
         await engine.dispose()
         scheduler.shutdown()
         logger.info("scheduler_stopped")
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     Date,
@@ -78,6 +79,29 @@ telemetry_readings = Table(
     Column("recorded_at", DateTime(timezone=True), nullable=False),
 )
 
+
+def _rollup(name: str) -> Table:
+    """Per-device telemetry rollup (``continuous_aggregates.sql``); a view, never created here."""
+    return Table(
+        name,
+        metadata,
+        Column("device_id", String(64), nullable=False),
+        Column("bucket", DateTime(timezone=True), nullable=False),
+        Column("readings", BigInteger, nullable=False),
+        Column("last_reading_at", DateTime(timezone=True), nullable=False),
+        Column("soil_moisture_sum", Float, nullable=True),
+        Column("soil_moisture_n", BigInteger, nullable=False),
+        Column("ambient_temp_c_sum", Float, nullable=True),
+        Column("ambient_temp_c_n", BigInteger, nullable=False),
+        Column("ambient_temp_c_min", Float, nullable=True),
+        Column("ambient_temp_c_max", Float, nullable=True),
+        Column("light_lux_max", Float, nullable=True),
+    )
+
+
+telemetry_hourly = _rollup("telemetry_hourly")
+telemetry_daily = _rollup("telemetry_daily")
+
 alerts = Table(
     "alerts",
     metadata,
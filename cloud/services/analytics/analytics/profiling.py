@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = structlog.get_logger()
+
+# The run (frame load or rule partition) whose statements are being counted;
+# asyncio tasks and SQLAlchemy's greenlets both carry it along.
+_current: ContextVar[dict[str, Any] | None] = ContextVar("rule_profile_run", default=None)
+
+_EXPLAIN = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+
+
+class RuleProfiler:
+    """Per-run timings of the rule engine, kept in a ring buffer of ``history`` runs.
+
+    A run is one frame load or one (rule, vineyard) partition.  ``instrument``
+    hooks the engine's cursor events, so every statement executed inside
+    ``run()`` adds to that run's ``queries``, ``query_s`` and, for writes,
+    ``rows_written``; the engine fills in the rest (rows loaded, evaluate
+    time, alerts, transaction time).  With ``explain_slow_seconds`` set, a
+    run at least that slow gets ``EXPLAIN (ANALYZE, BUFFERS)`` of its
+    slowest SELECT, which runs the query a second time.
+    """
+
+    def __init__(self, history: int = 500, explain_slow_seconds: float = 0.0) -> None:
+        self._runs: deque[dict[str, Any]] = deque(maxlen=history)
+        self._explain_slow = explain_slow_seconds
+
+    def instrument(self, engine: AsyncEngine) -> None:
+        event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+    @contextmanager
+    def run(self, kind: str, **fields: Any) -> Iterator[dict[str, Any]]:
+        """Profile the statements executed in the block; yields the record to annotate."""
+        record: dict[str, Any] = {
+            "kind": kind,
+            **fields,
+            "started_at": datetime.now(tz=timezone.utc).isoformat(),
+            "ok": False,
+            "queries": 0,
+            "query_s": 0.0,
+            "rows_written": 0,
+        }
+        token = _current.set(record)
+        t0 = time.perf_counter()
+        try:
+            yield record
+            record["ok"] = True
+        finally:
+            _current.reset(token)
+            record["elapsed_s"] = time.perf_counter() - t0
+            if not self._explain_slow or record["elapsed_s"] < self._explain_slow:
+                record.pop("_slowest", None)
+            for key, value in record.items():
+                if key.endswith("_s"):
+                    record[key] = round(value, 4)
+            self._runs.append(record)
+
+    async def explain_slow(self, engine: AsyncEngine, record: dict[str, Any]) -> None:
+        """Attach the plan of the run's slowest SELECT when the run was slow enough."""
+        slowest = record.pop("_slowest", None)
+        if slowest is None:
+            return
+        _elapsed, statement, parameters = slowest
+        try:
+            async with engine.connect() as conn:
+                result = await conn.exec_driver_sql(_EXPLAIN + statement, parameters)
+                plan = result.scalar()
+            record["plan"] = json.loads(plan) if isinstance(plan, str) else plan
+        except Exception as exc:
+            logger.warning("explain_failed", kind=record["kind"], error=str(exc))
+
+    def runs(self, rule: str | None = None, limit: int | None = None) -> list[dict[str, Any]]:
+        """Recorded runs, newest first, optionally only those of ``rule``."""
+        runs = [
+            {key: value for key, value in run.items() if not key.startswith("_")}
+            for run in reversed(self._runs)
+            if rule is None or run.get("rule") == rule or rule in run.get("rules", ())
+        ]
+        return runs[:limit] if limit is not None else runs
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        """Per rule: partition runs, failures and mean/max of the timings held in the buffer."""
+        by_rule: dict[str, list[dict[str, Any]]] = {}
+        for run in self._runs:
+            if run["kind"] == "rule":
+                by_rule.setdefault(run["rule"], []).append(run)
+        summary: dict[str, dict[str, Any]] = {}
+        for rule, runs in by_rule.items():
+            entry: dict[str, Any] = {
+                "runs": len(runs),
+                "failed": sum(not run["ok"] for run in runs),
+                "last_at": runs[-1]["started_at"],
+                "max_rows_written": max(run["rows_written"] for run in runs),
+            }
+            for key in ("elapsed_s", "query_s", "transaction_s"):
+                values = [run.get(key, 0.0) for run in runs]
+                entry[f"mean_{key}"] = round(sum(values) / len(values), 4)
+                entry[f"max_{key}"] = max(values)
+            summary[rule] = entry
+        return summary
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _current.get() is not None:
+        conn.info.setdefault("profile_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    record = _current.get()
+    if record is None or not conn.info.get("profile_t0"):
+        return
+    elapsed = time.perf_counter() - conn.info["profile_t0"].pop()
+    record["queries"] += 1
+    record["query_s"] += elapsed
+    if statement.lstrip().upper().startswith("SELECT"):
+        if elapsed > record.get("_slowest", (0.0,))[0]:
+            record["_slowest"] = (elapsed, statement, parameters)
+    elif cursor.rowcount > 0:
+        record["rows_written"] += cursor.rowcount
+
+
+async def serve(profiler: RuleProfiler, host: str, port: int) -> asyncio.AbstractServer:
+    """Serve the profiler as JSON: ``GET /rules`` (summary) and ``GET /runs?rule=&limit=``."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()).strip():  # headers; nothing in them is used
+                pass
+            status, body = _route(profiler, request_line)
+            payload = json.dumps(body).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info("profiling_listening", host=host, port=port)
+    return server
+
+
+def _route(profiler: RuleProfiler, request_line: list[str]) -> tuple[str, Any]:
+    if len(request_line) < 2 or request_line[0] != "GET":
+        return "405 Method Not Allowed", {"detail": "GET only"}
+    url = urlsplit(request_line[1])
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    if url.path == "/rules":
+        return "200 OK", profiler.summary()
+    if url.path == "/runs":
+        try:
+            limit = int(query["limit"]) if "limit" in query else 100
+        except ValueError:
+            return "400 Bad Request", {"detail": "limit must be an integer"}
+        return "200 OK", profiler.runs(query.get("rule"), limit)
+    return "404 Not Found", {"detail": "use /rules or /runs"}
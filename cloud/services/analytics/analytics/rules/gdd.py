@@ -1,20 +1,29 @@
 from __future__ import annotations
 
-from datetime import date, datetime, timezone
+import math
+from datetime import date, datetime, time, timedelta, timezone
 from typing import Any
 
+import numpy as np
 import structlog
-from sqlalchemy import and_, func, select
+from sqlalchemy import and_, func, select, tuple_
 from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy.ext.asyncio import AsyncEngine
 
+from ..alert_index import ActiveAlertIndex
 from ..alert_manager import create_alert, create_recommendation
-from ..models import alerts, gdd_accumulation, telemetry_readings, nodes, blocks, vineyards
+from ..frame import TelemetryFrame, group_reduce
+from ..models import alerts, gdd_accumulation
 
 logger = structlog.get_logger()
 
 _BASE_TEMP_C = 10.0   # standard grapevine base temperature
 
+RULE_KEYS: tuple[str, ...] = ()  # milestone alerts are never auto-resolved
+# Yesterday's and today's daily buckets (UTC).
+WINDOW = timedelta(hours=48)
+INTERVAL = timedelta(minutes=60)
+SOURCE = "daily"
+
 # Milestone definitions: (gdd_threshold, rule_name_suffix, severity, title, recommendation_text)
 _MILESTONES: list[tuple[float, str, str, str, str]] = [
     (
@@ -79,9 +88,11 @@ async def _get_previous_season_total(
 
 
 async def _milestone_already_alerted(
-    conn: Any, vineyard_id: str, rule_key: str
+    conn: Any, vineyard_id: str, rule_key: str, index: ActiveAlertIndex | None = None
 ) -> bool:
     """Return True if an active (or recently resolved) milestone alert exists within cooldown."""
+    if index is not None and index.has(rule_key, vineyard_id):
+        return True  # active alerts are in memory; resolved ones still need the query
     stmt = select(alerts).where(
         and_(
             alerts.c.vineyard_id == vineyard_id,
@@ -92,69 +103,297 @@ async def _milestone_already_alerted(
     return row is not None
 
 
-async def run(engine: AsyncEngine) -> None:
-    """Compute daily GDD for each vineyard and check phenological milestones.
+def daily_extremes(frame: TelemetryFrame, today: date) -> list[dict[str, Any]]:
+    """Today's (UTC) ambient temperature max/min per vineyard that reported any, from daily buckets."""
+    midnight = datetime.combine(today, time.min, tzinfo=timezone.utc)
+    mask = frame.window(midnight, "ambient_temp_c_max") & (frame.recorded_at < (midnight + timedelta(days=1)).timestamp())
 
-    GDD formula: max(0, (daily_max + daily_min) / 2 - BASE_TEMP_C)
-    Season total: sum of gdd_daily from March 1 to today.
-    Milestones fire once per 7-day cooldown window (stored as an active alert).
+    vineyard_ids = sorted({node["vineyard_id"] for node in frame.nodes})
+    position = {vineyard_id: i for i, vineyard_id in enumerate(vineyard_ids)}
+    names = {node["vineyard_id"]: node["vineyard_name"] for node in frame.nodes}
+    vineyard_of_node = np.array([position[node["vineyard_id"]] for node in frame.nodes], dtype=np.intp)
+    groups = vineyard_of_node[frame.node_index[mask]]
+    daily_max = group_reduce(np.fmax, groups, frame.columns["ambient_temp_c_max"][mask], len(vineyard_ids))
+    daily_min = group_reduce(np.fmin, groups, frame.columns["ambient_temp_c_min"][mask], len(vineyard_ids))
+
+    return [
+        {
+            "vineyard_id": vineyard_id,
+            "vineyard_name": names[vineyard_id],
+            "daily_max": float(daily_max[i]),
+            "daily_min": float(daily_min[i]),
+        }
+        for i, vineyard_id in enumerate(vineyard_ids)
+        if not np.isnan(daily_max[i])
+    ]
+
+
+class SeasonTracker:
+    """GDD state carried between runs, per vineyard.
+
+    Holds the last two days written for each vineyard, each with the
+    season total before that day and the day's ambient max/min so far.  The
+    next run carries the total forward instead of re-summing
+    ``gdd_accumulation``.  Keeping the day before as well means a reading
+    for yesterday that moves its extremes (late data) is detected on every
+    run of today, not only the first, and yesterday is recomputed from the
+    table.  Emptied on any failure; the next run rebuilds it from the table,
+    checking yesterday against its stored ``gdd_daily``.
     """
-    today = datetime.now(tz=timezone.utc).date()
-
-    # Aggregate today's temperature extremes per vineyard
-    query = (
-        select(
-            vineyards.c.id.label("vineyard_id"),
-            vineyards.c.name.label("vineyard_name"),
-            func.max(telemetry_readings.c.ambient_temp_c).label("daily_max"),
-            func.min(telemetry_readings.c.ambient_temp_c).label("daily_min"),
+
+    def __init__(self) -> None:
+        self._days: dict[str, dict[date, dict[str, Any]]] = {}
+
+    def get(self, vineyard_id: str) -> dict[str, Any] | None:
+        """State of the newest day written for the vineyard."""
+        days = self._days.get(vineyard_id)
+        return days[max(days)] if days else None
+
+    def day(self, vineyard_id: str, day: date) -> dict[str, Any] | None:
+        return self._days.get(vineyard_id, {}).get(day)
+
+    def carry(self, vineyard_id: str, day: date, base: float, daily_max: float, daily_min: float) -> None:
+        days = self._days.setdefault(vineyard_id, {})
+        days[day] = {"date": day, "base": base, "max": daily_max, "min": daily_min}
+        for old in sorted(days)[:-2]:
+            del days[old]
+
+    def forget(self, vineyard_id: str) -> None:
+        self._days.pop(vineyard_id, None)
+
+    def clear(self) -> None:
+        self._days.clear()
+
+
+TRACKER = SeasonTracker()
+
+
+def forget(vineyard_id: str) -> None:
+    """Drop carried state for a vineyard another replica may have written meanwhile."""
+    TRACKER.forget(vineyard_id)
+
+
+def _gdd(daily_max: float, daily_min: float) -> float:
+    return max(0.0, (daily_max + daily_min) / 2.0 - _BASE_TEMP_C)
+
+
+def _season_start(day: date) -> date:
+    return date(day.year, 3, 1)
+
+
+async def _season_totals_before(
+    conn: Any, tracker: SeasonTracker, vineyard_ids: list[str], today: date
+) -> dict[str, float]:
+    """Season total up to yesterday per vineyard, carried forward where the tracker knows it.
+
+    Vineyards the tracker has not seen take the newest ``gdd_season_total``
+    before today, one indexed row each (days without readings add nothing,
+    so it equals the sum of ``gdd_daily``).
+    """
+    season_start = _season_start(today)
+    totals: dict[str, float] = {}
+    missing: list[str] = []
+    for vineyard_id in vineyard_ids:
+        state = tracker.get(vineyard_id)
+        if state is None:
+            missing.append(vineyard_id)
+        elif state["date"] == today:
+            totals[vineyard_id] = state["base"]
+        elif state["date"] >= season_start:
+            totals[vineyard_id] = state["base"] + _gdd(state["max"], state["min"])
+        else:
+            totals[vineyard_id] = 0.0  # last written day belongs to the previous season
+    if missing:
+        newest = (
+            select(gdd_accumulation.c.vineyard_id, func.max(gdd_accumulation.c.date))
+            .where(
+                gdd_accumulation.c.vineyard_id.in_(missing),
+                gdd_accumulation.c.date >= season_start,
+                gdd_accumulation.c.date < today,
+            )
+            .group_by(gdd_accumulation.c.vineyard_id)
         )
-        .select_from(
-            telemetry_readings
-            .join(nodes, nodes.c.device_id == telemetry_readings.c.device_id)
-            .join(blocks, blocks.c.id == nodes.c.block_id)
-            .join(vineyards, vineyards.c.id == blocks.c.vineyard_id)
+        stmt = select(gdd_accumulation.c.vineyard_id, gdd_accumulation.c.gdd_season_total).where(
+            tuple_(gdd_accumulation.c.vineyard_id, gdd_accumulation.c.date).in_(newest)
         )
-        .where(
-            func.date(telemetry_readings.c.recorded_at) == today,
-            telemetry_readings.c.ambient_temp_c.isnot(None),
+        found = {
+            str(row["vineyard_id"]): float(row["gdd_season_total"])
+            for row in (await conn.execute(stmt)).mappings().all()
+        }
+        for vineyard_id in missing:
+            totals[vineyard_id] = found.get(vineyard_id, 0.0)
+    return totals
+
+
+async def _upsert_day(conn: Any, vineyard_id: str, day: date, gdd_daily: float, season_total: float) -> None:
+    """Upsert into gdd_accumulation (conflict on vineyard_id + date)."""
+    stmt = (
+        pg_insert(gdd_accumulation)
+        .values(
+            vineyard_id=vineyard_id,
+            date=day,
+            gdd_daily=gdd_daily,
+            gdd_season_total=season_total,
+        )
+        .on_conflict_do_update(
+            index_elements=["vineyard_id", "date"],
+            set_={
+                "gdd_daily": gdd_daily,
+                "gdd_season_total": season_total,
+            },
         )
-        .group_by(vineyards.c.id, vineyards.c.name)
     )
+    await conn.execute(stmt)
+
 
-    async with engine.begin() as conn:
-        rows = (await conn.execute(query)).mappings().all()
+async def _stored_days(conn: Any, vineyard_ids: list[str], day: date) -> dict[str, tuple[float, float]]:
+    """``(gdd_daily, gdd_season_total)`` written for ``day``, per vineyard that has a row."""
+    stmt = select(
+        gdd_accumulation.c.vineyard_id, gdd_accumulation.c.gdd_daily, gdd_accumulation.c.gdd_season_total
+    ).where(gdd_accumulation.c.vineyard_id.in_(vineyard_ids), gdd_accumulation.c.date == day)
+    return {
+        str(row["vineyard_id"]): (float(row["gdd_daily"]), float(row["gdd_season_total"]))
+        for row in (await conn.execute(stmt)).mappings().all()
+    }
+
+
+async def _recompute_late_day(
+    conn: Any, tracker: SeasonTracker, frame: TelemetryFrame, day: date, index: ActiveAlertIndex | None
+) -> None:
+    """Rewrite ``day`` for vineyards whose extremes moved after the day was last written.
+
+    Vineyards the tracker holds no state for (after a restart or a
+    failure) are checked once against the ``gdd_daily`` stored for the
+    day, which is also written if it is missing.
+    """
+    rows = daily_extremes(frame, day)
+    unknown = [row["vineyard_id"] for row in rows if tracker.day(row["vineyard_id"], day) is None]
+    stored = await _stored_days(conn, unknown, day) if unknown else {}
+    for row in rows:
+        vineyard_id = row["vineyard_id"]
+        state = tracker.day(vineyard_id, day)
+        if state is not None:
+            daily_max = max(state["max"], row["daily_max"])
+            daily_min = min(state["min"], row["daily_min"])
+            if (daily_max, daily_min) == (state["max"], state["min"]):
+                continue
+        else:
+            daily_max, daily_min = row["daily_max"], row["daily_min"]
+            if vineyard_id in stored:
+                stored_daily, stored_total = stored[vineyard_id]
+                if math.isclose(stored_daily, _gdd(daily_max, daily_min), abs_tol=1e-9):
+                    tracker.carry(vineyard_id, day, stored_total - stored_daily, daily_max, daily_min)
+                    continue
+
+        previous_total = await _get_previous_season_total(conn, vineyard_id, day)
+        gdd_daily = _gdd(daily_max, daily_min)
+        await _upsert_day(conn, vineyard_id, day, gdd_daily, previous_total + gdd_daily)
+        tracker.carry(vineyard_id, day, previous_total, daily_max, daily_min)
+        following = tracker.day(vineyard_id, day + timedelta(days=1))
+        if following is not None:
+            # Today was already written on top of the old total; carry the new one.
+            tracker.carry(
+                vineyard_id, following["date"], previous_total + gdd_daily, following["max"], following["min"]
+            )
+        logger.info(
+            "gdd_late_readings",
+            vineyard=row["vineyard_name"],
+            date=day.isoformat(),
+            gdd_daily=round(gdd_daily, 2),
+        )
+        await _check_milestones(
+            conn, vineyard_id, row["vineyard_name"], previous_total, previous_total + gdd_daily, index
+        )
+
+
+async def _check_milestones(
+    conn: Any,
+    vineyard_id: str,
+    vineyard_name: str,
+    previous_total: float,
+    season_total: float,
+    index: ActiveAlertIndex | None,
+) -> None:
+    """Fire an alert for each milestone crossed between the two totals (7-day cooldown)."""
+    for threshold, name_suffix, severity, milestone_title, rec_text in _MILESTONES:
+        # Only fire when we have crossed the milestone this season
+        if season_total < threshold:
+            continue
+        if previous_total >= threshold:
+            # Already crossed before today — no new crossing
+            continue
+
+        rule_key = f"gdd_milestone_{name_suffix}"
+        already = await _milestone_already_alerted(conn, vineyard_id, rule_key, index)
+        if already:
+            continue
+
+        alert_id = await create_alert(
+            conn,
+            node_id=None,
+            block_id=None,
+            vineyard_id=vineyard_id,
+            rule_key=rule_key,
+            severity=severity,
+            title=f"GDD Milestone: {milestone_title} — {vineyard_name}",
+            message=(
+                f"Season GDD reached {season_total:.0f} "
+                f"(milestone: {threshold} GDD — {milestone_title})."
+            ),
+            cooldown_hours=7 * 24,  # 7 days
+            index=index,
+        )
+        await create_recommendation(
+            conn,
+            alert_id=alert_id,
+            block_id=None,
+            vineyard_id=vineyard_id,
+            action_text=rec_text,
+            priority=2,
+        )
+        logger.info(
+            "gdd_milestone_alert",
+            vineyard=vineyard_name,
+            milestone=milestone_title,
+            season_total=round(season_total, 2),
+        )
+
+
+async def apply(
+    conn: Any,
+    frame: TelemetryFrame,
+    now: datetime,
+    index: ActiveAlertIndex | None = None,
+    tracker: SeasonTracker | None = None,
+) -> None:
+    """Compute daily GDD for each vineyard and check phenological milestones.
+
+    GDD formula: max(0, (daily_max + daily_min) / 2 - BASE_TEMP_C)
+    Season total: sum of gdd_daily from March 1 to today, carried forward
+    between runs by ``tracker`` (module-wide ``TRACKER`` by default).
+    Milestones fire once per 7-day cooldown window (stored as an active alert).
+    Late readings are picked up for yesterday only (the frame's 48 h of
+    daily buckets): a day's row is not corrected once it is two days old.
+    """
+    tracker = TRACKER if tracker is None else tracker
+    today = now.date()
+    try:
+        await _recompute_late_day(conn, tracker, frame, today - timedelta(days=1), index)
+        rows = daily_extremes(frame, today)
+        previous_totals = await _season_totals_before(conn, tracker, [r["vineyard_id"] for r in rows], today)
 
         for row in rows:
-            vineyard_id = str(row["vineyard_id"])
+            vineyard_id = row["vineyard_id"]
             vineyard_name = row["vineyard_name"]
             daily_max = row["daily_max"]
             daily_min = row["daily_min"]
 
-            gdd_daily = max(0.0, (daily_max + daily_min) / 2.0 - _BASE_TEMP_C)
-
-            # Pull the running season total up to yesterday, then add today
-            previous_total = await _get_previous_season_total(conn, vineyard_id, today)
+            gdd_daily = _gdd(daily_max, daily_min)
+            previous_total = previous_totals[vineyard_id]
             season_total = previous_total + gdd_daily
 
-            # Upsert into gdd_accumulation (conflict on vineyard_id + date)
-            stmt = (
-                pg_insert(gdd_accumulation)
-                .values(
-                    vineyard_id=vineyard_id,
-                    date=today,
-                    gdd_daily=gdd_daily,
-                    gdd_season_total=season_total,
-                )
-                .on_conflict_do_update(
-                    index_elements=["vineyard_id", "date"],
-                    set_={
-                        "gdd_daily": gdd_daily,
-                        "gdd_season_total": season_total,
-                    },
-                )
-            )
-            await conn.execute(stmt)
+            await _upsert_day(conn, vineyard_id, today, gdd_daily, season_total)
+            tracker.carry(vineyard_id, today, previous_total, daily_max, daily_min)
 
             logger.info(
                 "gdd_computed",
@@ -163,48 +402,9 @@ async def run(engine: AsyncEngine) -> None:
                 season_total=round(season_total, 2),
             )
 
-            # Check milestones — fire alert if season total crossed the threshold
-            # and no existing alert for that milestone exists (7-day cooldown).
-            for threshold, name_suffix, severity, milestone_title, rec_text in _MILESTONES:
-                # Only fire when we have crossed the milestone this season
-                if season_total < threshold:
-                    continue
-                if previous_total >= threshold:
-                    # Already crossed before today — no new crossing
-                    continue
-
-                rule_key = f"gdd_milestone_{name_suffix}"
-                already = await _milestone_already_alerted(conn, vineyard_id, rule_key)
-                if already:
-                    continue
-
-                alert_id = await create_alert(
-                    conn,
-                    node_id=None,
-                    block_id=None,
-                    vineyard_id=vineyard_id,
-                    rule_key=rule_key,
-                    severity=severity,
-                    title=f"GDD Milestone: {milestone_title} — {vineyard_name}",
-                    message=(
-                        f"Season GDD reached {season_total:.0f} "
-                        f"(milestone: {threshold} GDD — {milestone_title})."
-                    ),
-                    cooldown_hours=7 * 24,  # 7 days
-                )
-                await create_recommendation(
-                    conn,
-                    alert_id=alert_id,
-                    block_id=None,
-                    vineyard_id=vineyard_id,
-                    action_text=rec_text,
-                    priority=2,
-                )
-                logger.info(
-                    "gdd_milestone_alert",
-                    vineyard=vineyard_name,
-                    milestone=milestone_title,
-                    season_total=round(season_total, 2),
-                )
+            await _check_milestones(conn, vineyard_id, vineyard_name, previous_total, season_total, index)
+    except Exception:
+        tracker.clear()
+        raise
 
     logger.info("gdd_rule_complete", vineyards_evaluated=len(rows))
@@ -1,15 +1,12 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
+from typing import Any
 
-import structlog
-from sqlalchemy import and_, func, select
-from sqlalchemy.ext.asyncio import AsyncEngine
+import numpy as np
 
-from ..alert_manager import create_alert, create_recommendation, resolve_alerts_for_rule
-from ..models import blocks, nodes, telemetry_readings, vineyards
-
-logger = structlog.get_logger()
+from ..alert_manager import node_alert
+from ..frame import RunningWindow, TelemetryFrame
 
 _RULE_HIGH = "mildew_high"
 _RULE_MODERATE = "mildew_moderate"
@@ -27,8 +24,14 @@ _WET_HOURS_MODERATE = 1  # hours for moderate MPI
 # wet_hours = count(readings where leaf_wetness_pct > 0) * 0.5
 _READING_INTERVAL_H = 0.5
 
+RULE_KEYS = (_RULE_HIGH, _RULE_MODERATE)
+WINDOW = timedelta(hours=6)
+INTERVAL = timedelta(minutes=10)
+# Columns the streaming evaluator's running window requires (evaluate_window).
+STREAM_COLUMNS = ("leaf_wetness_pct", "ambient_temp_c", "ambient_humidity")
+
 
-async def run(engine: AsyncEngine) -> None:
+def evaluate(frame: TelemetryFrame, now: datetime) -> list[dict[str, Any]]:
     """Evaluate Mildew Pressure Index (MPI) for precision_plus nodes only.
 
     Uses the last 6 hours of leaf wetness, temperature, and humidity data.
@@ -36,161 +39,82 @@ async def run(engine: AsyncEngine) -> None:
     - High:     wet_hours >= 2, 15 <= avg_temp <= 27, avg_RH >= 78  → critical
     - Moderate: wet_hours >= 1, 15 <= avg_temp <= 27, avg_RH >= 70  → warning
     """
-    window = datetime.now(tz=timezone.utc) - timedelta(hours=6)
-
-    query = (
-        select(
-            nodes.c.id.label("node_id"),
-            nodes.c.device_id,
-            nodes.c.tier,
-            blocks.c.id.label("block_id"),
-            blocks.c.name.label("block_name"),
-            vineyards.c.id.label("vineyard_id"),
-            # Count readings where leaf wetness > 0 (proxy for wet hours at 30-min intervals)
-            func.count(
-                telemetry_readings.c.id
-            ).filter(
-                telemetry_readings.c.leaf_wetness_pct > 0
-            ).label("wet_reading_count"),
-            func.avg(telemetry_readings.c.ambient_temp_c).label("avg_temp"),
-            func.avg(telemetry_readings.c.ambient_humidity).label("avg_humidity"),
-            func.count(telemetry_readings.c.id).label("total_readings"),
-        )
-        .select_from(
-            telemetry_readings
-            .join(nodes, nodes.c.device_id == telemetry_readings.c.device_id)
-            .join(blocks, blocks.c.id == nodes.c.block_id)
-            .join(vineyards, vineyards.c.id == blocks.c.vineyard_id)
-        )
-        .where(
-            and_(
-                telemetry_readings.c.recorded_at >= window,
-                # Only precision_plus nodes have leaf wetness sensors
-                nodes.c.tier == "precision_plus",
-                telemetry_readings.c.leaf_wetness_pct.isnot(None),
-                telemetry_readings.c.ambient_temp_c.isnot(None),
-                telemetry_readings.c.ambient_humidity.isnot(None),
-            )
-        )
-        .group_by(
-            nodes.c.id,
-            nodes.c.device_id,
-            nodes.c.tier,
-            blocks.c.id,
-            blocks.c.name,
-            vineyards.c.id,
-        )
+    mask = frame.window(now - WINDOW, "leaf_wetness_pct", "ambient_temp_c", "ambient_humidity")
+    # Only precision_plus nodes have leaf wetness sensors
+    mask &= frame.node_mask(tier="precision_plus")[frame.node_index]
+
+    # Convert wet reading count to hours using 30-min interval proxy
+    wet_hours = frame.count(mask & (frame.columns["leaf_wetness_pct"] > 0)) * _READING_INTERVAL_H
+    return _alerts(frame.nodes, wet_hours, frame.mean("ambient_temp_c", mask), frame.mean("ambient_humidity", mask))
+
+
+def evaluate_window(node: dict[str, Any], window: RunningWindow) -> list[dict[str, Any]]:
+    """``evaluate`` for one node from its running window of the last 6 hours."""
+    if node["tier"] != "precision_plus":
+        return []
+    return _alerts(
+        [node],
+        np.array([window.positive("leaf_wetness_pct") * _READING_INTERVAL_H]),
+        np.array([window.mean("ambient_temp_c")]),
+        np.array([window.mean("ambient_humidity")]),
+    )
+
+
+def _alerts(
+    nodes: list[dict[str, Any]], wet_hours: np.ndarray, avg_temp: np.ndarray, avg_humidity: np.ndarray
+) -> list[dict[str, Any]]:
+    temp_in_range = (avg_temp >= _TEMP_MIN) & (avg_temp <= _TEMP_MAX)
+    is_high_mpi = (wet_hours >= _WET_HOURS_HIGH) & temp_in_range & (avg_humidity >= _RH_HIGH)
+    is_moderate_mpi = (
+        ~is_high_mpi
+        & (wet_hours >= _WET_HOURS_MODERATE)
+        & temp_in_range
+        & (avg_humidity >= _RH_MODERATE)
     )
 
-    async with engine.begin() as conn:
-        rows = (await conn.execute(query)).mappings().all()
-
-        high_node_ids: list[str] = []
-        moderate_node_ids: list[str] = []
-
-        for row in rows:
-            # This filter is already in the query but double-check for safety
-            if row["tier"] != "precision_plus":
-                continue
-
-            node_id = str(row["node_id"])
-            block_id = str(row["block_id"])
-            vineyard_id = str(row["vineyard_id"])
-            block_name = row["block_name"]
-            avg_temp = row["avg_temp"]
-            avg_humidity = row["avg_humidity"]
-
-            # Convert wet reading count to hours using 30-min interval proxy
-            wet_hours = (row["wet_reading_count"] or 0) * _READING_INTERVAL_H
-
-            if avg_temp is None or avg_humidity is None:
-                continue
-
-            temp_in_range = _TEMP_MIN <= avg_temp <= _TEMP_MAX
-
-            is_high_mpi = (
-                wet_hours >= _WET_HOURS_HIGH
-                and temp_in_range
-                and avg_humidity >= _RH_HIGH
-            )
-            is_moderate_mpi = (
-                not is_high_mpi
-                and wet_hours >= _WET_HOURS_MODERATE
-                and temp_in_range
-                and avg_humidity >= _RH_MODERATE
-            )
-
-            if is_high_mpi:
-                high_node_ids.append(node_id)
-                alert_id = await create_alert(
-                    conn,
-                    node_id=node_id,
-                    block_id=block_id,
-                    vineyard_id=vineyard_id,
-                    rule_key=_RULE_HIGH,
-                    severity="critical",
-                    title=f"High Mildew Pressure — {block_name}",
-                    message=(
-                        f"Leaf wetness {wet_hours:.1f}h+, temp {avg_temp:.1f}°C, "
-                        f"RH {avg_humidity:.0f}% — high downy/powdery mildew risk."
-                    ),
-                    cooldown_hours=_COOLDOWN_HOURS,
-                )
-                await create_recommendation(
-                    conn,
-                    alert_id=alert_id,
-                    block_id=block_id,
-                    vineyard_id=vineyard_id,
-                    action_text=(
-                        f"Apply preventative mildew treatment in {block_name} within "
-                        "48 hours. Scout for early infection signs."
-                    ),
-                    priority=1,
-                )
-                logger.info(
-                    "mildew_high_alert",
-                    block=block_name,
-                    wet_hours=wet_hours,
-                    avg_temp=round(avg_temp, 1),
-                    avg_humidity=round(avg_humidity, 0),
-                )
-
-            elif is_moderate_mpi:
-                moderate_node_ids.append(node_id)
-                alert_id = await create_alert(
-                    conn,
-                    node_id=node_id,
-                    block_id=block_id,
-                    vineyard_id=vineyard_id,
-                    rule_key=_RULE_MODERATE,
-                    severity="warning",
-                    title=f"Moderate Mildew Risk — {block_name}",
-                    message=(
-                        f"Leaf wetness {wet_hours:.1f}h, temp {avg_temp:.1f}°C, "
-                        f"RH {avg_humidity:.0f}% — moderate mildew pressure."
-                    ),
-                    cooldown_hours=_COOLDOWN_HOURS,
-                )
-                await create_recommendation(
-                    conn,
-                    alert_id=alert_id,
-                    block_id=block_id,
-                    vineyard_id=vineyard_id,
-                    action_text=(
-                        f"Increased mildew pressure in {block_name}. "
-                        "Inspect canopy and schedule protective spray."
-                    ),
-                    priority=2,
-                )
-                logger.info(
-                    "mildew_moderate_alert",
-                    block=block_name,
-                    wet_hours=wet_hours,
-                    avg_temp=round(avg_temp, 1),
-                    avg_humidity=round(avg_humidity, 0),
-                )
-
-        await resolve_alerts_for_rule(conn, _RULE_HIGH, high_node_ids)
-        await resolve_alerts_for_rule(conn, _RULE_MODERATE, moderate_node_ids)
-
-    logger.info("mildew_mpi_rule_complete", rows_evaluated=len(rows))
+    triggered: list[dict[str, Any]] = []
+    for i in np.flatnonzero(is_high_mpi):
+        node, hours, temp, rh = nodes[i], float(wet_hours[i]), float(avg_temp[i]), float(avg_humidity[i])
+        triggered.append(node_alert(
+            node,
+            rule_key=_RULE_HIGH,
+            severity="critical",
+            title=f"High Mildew Pressure — {node['block_name']}",
+            message=(
+                f"Leaf wetness {hours:.1f}h+, temp {temp:.1f}°C, "
+                f"RH {rh:.0f}% — high downy/powdery mildew risk."
+            ),
+            cooldown_hours=_COOLDOWN_HOURS,
+            action_text=(
+                f"Apply preventative mildew treatment in {node['block_name']} within "
+                "48 hours. Scout for early infection signs."
+            ),
+            priority=1,
+            wet_hours=hours,
+            avg_temp=round(temp, 1),
+            avg_humidity=round(rh, 0),
+        ))
+
+    for i in np.flatnonzero(is_moderate_mpi):
+        node, hours, temp, rh = nodes[i], float(wet_hours[i]), float(avg_temp[i]), float(avg_humidity[i])
+        triggered.append(node_alert(
+            node,
+            rule_key=_RULE_MODERATE,
+            severity="warning",
+            title=f"Moderate Mildew Risk — {node['block_name']}",
+            message=(
+                f"Leaf wetness {hours:.1f}h, temp {temp:.1f}°C, "
+                f"RH {rh:.0f}% — moderate mildew pressure."
+            ),
+            cooldown_hours=_COOLDOWN_HOURS,
+            action_text=(
+                f"Increased mildew pressure in {node['block_name']}. "
+                "Inspect canopy and schedule protective spray."
+            ),
+            priority=2,
+            wet_hours=hours,
+            avg_temp=round(temp, 1),
+            avg_humidity=round(rh, 0),
+        ))
+
+    return triggered
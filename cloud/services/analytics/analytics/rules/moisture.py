@@ -1,15 +1,12 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
+from typing import Any
 
-import structlog
-from sqlalchemy import func, select
-from sqlalchemy.ext.asyncio import AsyncEngine
+import numpy as np
 
-from ..alert_manager import create_alert, create_recommendation, resolve_alerts_for_rule
-from ..models import blocks, nodes, telemetry_readings, vineyards
-
-logger = structlog.get_logger()
+from ..alert_manager import node_alert
+from ..frame import RunningWindow, TelemetryFrame
 
 _RULE_DRY = "moisture_dry"
 _RULE_WET = "moisture_wet"
@@ -17,121 +14,61 @@ _THRESHOLD_DRY = 15.0   # percent
 _THRESHOLD_WET = 75.0   # percent
 _COOLDOWN_HOURS = 4
 
+RULE_KEYS = (_RULE_DRY, _RULE_WET)
+WINDOW = timedelta(hours=3)
+INTERVAL = timedelta(minutes=5)
+# Columns the streaming evaluator's running window requires (evaluate_window).
+STREAM_COLUMNS = ("soil_moisture",)
+
 
-async def run(engine: AsyncEngine) -> None:
+def evaluate(frame: TelemetryFrame, now: datetime) -> list[dict[str, Any]]:
     """Evaluate soil moisture thresholds for each node over the last 3 hours.
 
     Raises a critical alert for dry conditions (<15%) and a warning for waterlogging
-    (>75%). Resolves alerts for nodes that are back within the normal range.
+    (>75%). Nodes back within the normal range are resolved by the caller.
     """
-    window = datetime.now(tz=timezone.utc) - timedelta(hours=3)
-
-    query = (
-        select(
-            nodes.c.id.label("node_id"),
-            nodes.c.device_id,
-            blocks.c.id.label("block_id"),
-            blocks.c.name.label("block_name"),
-            vineyards.c.id.label("vineyard_id"),
-            func.avg(telemetry_readings.c.soil_moisture).label("avg_moisture"),
-        )
-        .select_from(
-            telemetry_readings
-            .join(nodes, nodes.c.device_id == telemetry_readings.c.device_id)
-            .join(blocks, blocks.c.id == nodes.c.block_id)
-            .join(vineyards, vineyards.c.id == blocks.c.vineyard_id)
-        )
-        .where(
-            telemetry_readings.c.recorded_at >= window,
-            telemetry_readings.c.soil_moisture.isnot(None),
-        )
-        .group_by(
-            nodes.c.id,
-            nodes.c.device_id,
-            blocks.c.id,
-            blocks.c.name,
-            vineyards.c.id,
-        )
-    )
-
-    async with engine.begin() as conn:
-        rows = (await conn.execute(query)).mappings().all()
-
-        dry_node_ids: list[str] = []
-        wet_node_ids: list[str] = []
-
-        for row in rows:
-            node_id = str(row["node_id"])
-            block_id = str(row["block_id"])
-            vineyard_id = str(row["vineyard_id"])
-            block_name = row["block_name"]
-            avg = row["avg_moisture"]
-
-            if avg < _THRESHOLD_DRY:
-                dry_node_ids.append(node_id)
-                alert_id = await create_alert(
-                    conn,
-                    node_id=node_id,
-                    block_id=block_id,
-                    vineyard_id=vineyard_id,
-                    rule_key=_RULE_DRY,
-                    severity="critical",
-                    title=f"Low Soil Moisture — {block_name}",
-                    message=(
-                        f"Average soil moisture {avg:.1f}% over 3h "
-                        f"(threshold: {_THRESHOLD_DRY:.0f}%)"
-                    ),
-                    cooldown_hours=_COOLDOWN_HOURS,
-                )
-                await create_recommendation(
-                    conn,
-                    alert_id=alert_id,
-                    block_id=block_id,
-                    vineyard_id=vineyard_id,
-                    action_text=(
-                        f"Irrigate {block_name} within the next 24 hours. "
-                        "Target 25–35% volumetric water content."
-                    ),
-                    priority=1,
-                )
-                logger.info(
-                    "moisture_dry_alert",
-                    block=block_name,
-                    avg_moisture=round(avg, 1),
-                )
-
-            elif avg > _THRESHOLD_WET:
-                wet_node_ids.append(node_id)
-                alert_id = await create_alert(
-                    conn,
-                    node_id=node_id,
-                    block_id=block_id,
-                    vineyard_id=vineyard_id,
-                    rule_key=_RULE_WET,
-                    severity="warning",
-                    title=f"Excess Soil Moisture — {block_name}",
-                    message=(
-                        f"Average soil moisture {avg:.1f}% over 3h — waterlogging risk"
-                    ),
-                    cooldown_hours=_COOLDOWN_HOURS,
-                )
-                await create_recommendation(
-                    conn,
-                    alert_id=alert_id,
-                    block_id=block_id,
-                    vineyard_id=vineyard_id,
-                    action_text=f"Check drainage in {block_name}. Delay irrigation.",
-                    priority=2,
-                )
-                logger.info(
-                    "moisture_wet_alert",
-                    block=block_name,
-                    avg_moisture=round(avg, 1),
-                )
-
-        # Resolve dry alerts for nodes no longer below threshold
-        await resolve_alerts_for_rule(conn, _RULE_DRY, dry_node_ids)
-        # Resolve wet alerts for nodes no longer above threshold
-        await resolve_alerts_for_rule(conn, _RULE_WET, wet_node_ids)
-
-    logger.info("moisture_rule_complete", rows_evaluated=len(rows))
+    return _alerts(frame.nodes, frame.mean("soil_moisture", frame.window(now - WINDOW, "soil_moisture")))
+
+
+def evaluate_window(node: dict[str, Any], window: RunningWindow) -> list[dict[str, Any]]:
+    """``evaluate`` for one node from its running window of the last 3 hours."""
+    return _alerts([node], np.array([window.mean("soil_moisture")]))
+
+
+def _alerts(nodes: list[dict[str, Any]], avg_moisture: np.ndarray) -> list[dict[str, Any]]:
+    triggered: list[dict[str, Any]] = []
+    for i in np.flatnonzero(avg_moisture < _THRESHOLD_DRY):
+        node, avg = nodes[i], float(avg_moisture[i])
+        triggered.append(node_alert(
+            node,
+            rule_key=_RULE_DRY,
+            severity="critical",
+            title=f"Low Soil Moisture — {node['block_name']}",
+            message=(
+                f"Average soil moisture {avg:.1f}% over 3h "
+                f"(threshold: {_THRESHOLD_DRY:.0f}%)"
+            ),
+            cooldown_hours=_COOLDOWN_HOURS,
+            action_text=(
+                f"Irrigate {node['block_name']} within the next 24 hours. "
+                "Target 25–35% volumetric water content."
+            ),
+            priority=1,
+            avg_moisture=round(avg, 1),
+        ))
+
+    for i in np.flatnonzero(avg_moisture > _THRESHOLD_WET):
+        node, avg = nodes[i], float(avg_moisture[i])
+        triggered.append(node_alert(
+            node,
+            rule_key=_RULE_WET,
+            severity="warning",
+            title=f"Excess Soil Moisture — {node['block_name']}",
+            message=f"Average soil moisture {avg:.1f}% over 3h — waterlogging risk",
+            cooldown_hours=_COOLDOWN_HOURS,
+            action_text=f"Check drainage in {node['block_name']}. Delay irrigation.",
+            priority=2,
+            avg_moisture=round(avg, 1),
+        ))
+
+    return triggered
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Callable
+from datetime import datetime, timezone
+from types import ModuleType
+from typing import Any
+
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .alert_index import ActiveAlertIndex
+from .alert_manager import apply_alerts
+from .frame import NODE_QUERY, SENSOR_COLUMNS, RunningWindow, TelemetryFrame, load_frame
+from .models import nodes
+from .rules import frost, mildew_mpi, moisture
+
+logger = structlog.get_logger()
+
+# Rules that can be evaluated for one node from a running window
+# (``STREAM_COLUMNS`` and ``evaluate_window``).  Canopy lux and GDD look at
+# whole days and stay on the periodic engine only.
+STREAMED_RULES: dict[str, ModuleType] = {
+    "frost": frost,
+    "moisture": moisture,
+    "mildew_mpi": mildew_mpi,
+}
+
+_RETRY_SECONDS = 5.0
+
+
+def reading_from_message(data: str | bytes) -> dict[str, Any] | None:
+    """The frame row for one ingestor telemetry message; None when it has no node."""
+    message = json.loads(data)
+    if not message.get("node_id"):
+        return None  # unregistered device — no block or vineyard to alert on
+    row = {name: message.get(name) for name in SENSOR_COLUMNS}
+    row["node_id"] = message["node_id"]
+    row["recorded_at"] = datetime.fromisoformat(message["recorded_at"])
+    return row
+
+
+class StreamingEvaluator:
+    """Evaluate frost, moisture and mildew for a node as each of its readings arrives.
+
+    Keeps, per node and rule, a ``RunningWindow`` over the rule's window
+    (running sums and counts, expired as readings age out).  Every reading
+    updates those windows and calls each rule's ``evaluate_window``, which
+    shares its thresholds and alert building with ``evaluate``, so a
+    reading costs O(1) however many readings the windows hold.  Only state
+    changes touch the database: a newly triggered rule creates its alert, a
+    cleared one resolves that node's alert.  Which rules are already
+    alerting comes from the ``index`` when given, so resolves made by the
+    periodic engine (the reconciler for silent nodes) or an operator count
+    at once.  With ``owns`` (see ``coordination``), every replica buffers every
+    node's readings but only evaluates nodes of the vineyards it owns,
+    so a vineyard taken over from another replica has its full window.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        rules: dict[str, ModuleType] | None = None,
+        index: ActiveAlertIndex | None = None,
+        owns: Callable[[str], bool] | None = None,
+    ) -> None:
+        self._engine = engine
+        self._rules = STREAMED_RULES if rules is None else rules
+        self._index = index
+        self._owns = owns
+        self._window = max(rule.WINDOW for rule in self._rules.values())
+        self._nodes: dict[str, dict[str, Any] | None] = {}
+        self._windows: dict[str, dict[str, RunningWindow]] = {}
+        self._active: dict[str, set[str]] = {}
+
+    async def warm(self, now: datetime | None = None) -> None:
+        """Load the last window of readings and the currently triggered rules."""
+        now = now or datetime.now(tz=timezone.utc)
+        async with self._engine.connect() as conn:
+            frame = await load_frame(conn, now - self._window)
+        self.seed(frame, now)
+        logger.info("streaming_warmed", nodes=frame.node_count, readings=len(frame))
+
+    def seed(self, frame: TelemetryFrame, now: datetime) -> None:
+        for node in frame.nodes:
+            self._nodes[node["node_id"]] = node
+        for row in range(len(frame)):
+            node_id = frame.nodes[frame.node_index[row]]["node_id"]
+            reading = {name: _value(frame.columns[name][row]) for name in SENSOR_COLUMNS}
+            reading["node_id"] = node_id
+            reading["recorded_at"] = datetime.fromtimestamp(frame.recorded_at[row], tz=timezone.utc)
+            self._add(node_id, reading, now)
+        for rule in self._rules.values():
+            for alert in rule.evaluate(frame, now):
+                self._active.setdefault(alert["node_id"], set()).add(alert["rule_key"])
+
+    async def handle(self, reading: dict[str, Any], now: datetime | None = None) -> None:
+        now = now or datetime.now(tz=timezone.utc)
+        node_id = reading["node_id"]
+        node = await self._node(node_id)
+        if node is None:
+            return
+
+        windows = self._add(node_id, reading, now)
+        if self._owns is not None and not self._owns(node["vineyard_id"]):
+            return
+
+        active = await self._active_keys(node_id)
+        raised: list[dict[str, Any]] = []
+        cleared: list[str] = []
+        still: set[str] = set()
+        for name, rule in self._rules.items():
+            triggered = rule.evaluate_window(node, windows[name])
+            keys = {alert["rule_key"] for alert in triggered}
+            still |= keys
+            raised.extend(alert for alert in triggered if alert["rule_key"] not in active)
+            cleared.extend(key for key in rule.RULE_KEYS if key in active and key not in keys)
+        if not raised and not cleared:
+            return
+
+        try:
+            async with self._engine.begin() as conn:
+                if self._index is not None:
+                    await self._index.refresh(conn)
+                await apply_alerts(conn, tuple(cleared), raised, only_node_ids=[node_id], index=self._index)
+        except Exception:
+            if self._index is not None:
+                self._index.mark_stale()
+            raise
+        self._active[node_id] = still
+        logger.info(
+            "streaming_alerts_changed",
+            node=node_id,
+            raised=[alert["rule_key"] for alert in raised],
+            cleared=cleared,
+        )
+
+    async def run(self, redis: Redis, channel: str) -> None:
+        """Consume ``channel`` forever, resubscribing after Redis errors."""
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        reading = reading_from_message(message["data"])
+                        if reading is not None:
+                            await self.handle(reading)
+                    except Exception:  # noqa: BLE001
+                        logger.exception("streaming_reading_failed")
+            except RedisError as exc:
+                logger.warning("streaming_redis_error", error=str(exc), retry_in=_RETRY_SECONDS)
+                await asyncio.sleep(_RETRY_SECONDS)
+            finally:
+                await pubsub.aclose()
+
+    def _add(self, node_id: str, reading: dict[str, Any], now: datetime) -> dict[str, RunningWindow]:
+        windows = self._windows.get(node_id)
+        if windows is None:
+            windows = self._windows[node_id] = {
+                name: RunningWindow(rule.WINDOW, rule.STREAM_COLUMNS) for name, rule in self._rules.items()
+            }
+        for window in windows.values():
+            window.add(reading)
+            window.expire(now)
+        return windows
+
+    async def _active_keys(self, node_id: str) -> set[str]:
+        """Rule keys with an active alert for the node.
+
+        Read from the alert index when there is one, so alerts resolved by
+        the reconcile tick, another replica or an operator are raised again
+        on the next triggering reading; otherwise what this evaluator last
+        wrote itself.
+        """
+        if self._index is None:
+            return self._active.get(node_id, set())
+        if self._index.stale:
+            async with self._engine.connect() as conn:
+                await self._index.refresh(conn)
+        return {key for rule in self._rules.values() for key in rule.RULE_KEYS if self._index.has(key, node_id)}
+
+    async def _node(self, node_id: str) -> dict[str, Any] | None:
+        if node_id not in self._nodes:
+            # Provisioned after warm-up: one lookup, remembered either way.
+            async with self._engine.connect() as conn:
+                row = (await conn.execute(NODE_QUERY.where(nodes.c.id == node_id))).mappings().first()
+            self._nodes[node_id] = TelemetryFrame.from_rows([row], []).nodes[0] if row else None
+        return self._nodes[node_id]
+
+
+def _value(value: float) -> float | None:
+    return None if value != value else float(value)  # NaN back to None
@@ -0,0 +1,158 @@
+"""Tests for the in-memory index of active alerts."""
+from __future__ import annotations
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from redis.exceptions import RedisError
+
+from analytics.alert_index import ActiveAlertIndex, listen_for_alert_events
+from analytics.alert_manager import create_alerts, node_alert, resolve_alerts_for_rule
+
+NOW = datetime.now(tz=timezone.utc)
+
+NODE = dict(
+    node_id=str(uuid.uuid4()),
+    block_id=str(uuid.uuid4()),
+    block_name="Block A",
+    vineyard_id=str(uuid.uuid4()),
+)
+
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+
+def _alert(**overrides) -> dict:
+    row = dict(
+        id=uuid.uuid4(),
+        rule_key="frost_warning",
+        node_id=uuid.UUID(NODE["node_id"]),
+        block_id=uuid.UUID(NODE["block_id"]),
+        vineyard_id=uuid.UUID(NODE["vineyard_id"]),
+        cooldown_until=(NOW + timedelta(hours=1)).replace(tzinfo=None),
+    )
+    row.update(overrides)
+    return row
+
+
+def _candidate(rule_key: str) -> dict:
+    return node_alert(
+        NODE, rule_key=rule_key, severity="warning", title="t", message="m",
+        cooldown_hours=4, action_text="a", priority=2,
+    )
+
+
+@pytest.mark.asyncio
+async def test_load_keys_alerts_by_node_block_or_vineyard():
+    node_alert_row = _alert()
+    milestone = _alert(rule_key="gdd_milestone_veraison", node_id=None, block_id=None)
+    expired = _alert(rule_key="moisture_dry", cooldown_until=NOW - timedelta(minutes=1))
+    conn = AsyncMock()
+    conn.execute = AsyncMock(return_value=_Result([node_alert_row, milestone, expired]))
+
+    index = ActiveAlertIndex()
+    assert index.stale
+    await index.load(conn)
+
+    assert not index.stale
+    assert len(index) == 3
+    assert index.cooling("frost_warning", NODE["node_id"], NOW) == str(node_alert_row["id"])
+    assert index.has("gdd_milestone_veraison", NODE["vineyard_id"])
+    assert index.cooling("moisture_dry", NODE["node_id"], NOW) is None  # active but cooled down
+
+
+@pytest.mark.asyncio
+async def test_create_alerts_uses_the_index_and_records_new_alerts():
+    index = ActiveAlertIndex()
+    index.add("existing", "frost_warning", NODE["node_id"], NOW + timedelta(hours=1))
+    new_id = uuid.uuid4()
+    conn = AsyncMock()
+    conn.execute = AsyncMock(return_value=_Result([(new_id,)]))
+
+    ids = await create_alerts(conn, [_candidate("frost_warning"), _candidate("moisture_dry")], index)
+
+    assert ids == ["existing", str(new_id)]
+    assert conn.execute.await_count == 1  # the INSERT only; no SELECT of active alerts
+    assert index.cooling("moisture_dry", NODE["node_id"], NOW) == str(new_id)
+
+
+@pytest.mark.asyncio
+async def test_resolve_drops_resolved_alerts_from_the_index():
+    index = ActiveAlertIndex()
+    index.add("a1", "frost_warning", NODE["node_id"], NOW + timedelta(hours=1))
+    conn = AsyncMock()
+    conn.execute = AsyncMock(return_value=_Result([("a1",)]))
+
+    await resolve_alerts_for_rule(conn, "frost_warning", [], index=index)
+
+    assert not index.has("frost_warning", NODE["node_id"])
+    assert len(index) == 0
+
+
+@pytest.mark.asyncio
+async def test_alert_events_discard_resolved_alerts_and_bad_messages_force_a_reload():
+    index = ActiveAlertIndex()
+    await index.load(AsyncMock(execute=AsyncMock(return_value=_Result([_alert(id="a1")]))))
+
+    async def messages():
+        yield {"type": "subscribe", "data": 1}
+        yield {"type": "message", "data": json.dumps({"event": "alert_resolved", "alert_id": "a1"})}
+        assert not index.has("frost_warning", NODE["node_id"])
+        assert not index.stale
+        yield {"type": "message", "data": b"not json"}
+
+    pubsub = MagicMock()
+    pubsub.subscribe = AsyncMock(side_effect=[None, asyncio.CancelledError()])  # stop on the resubscribe
+    pubsub.aclose = AsyncMock()
+    pubsub.listen = messages
+    redis = MagicMock()
+    redis.pubsub.return_value = pubsub
+
+    with pytest.raises(asyncio.CancelledError):
+        await listen_for_alert_events(index, redis, "alert-events")
+
+    assert index.stale
+    pubsub.subscribe.assert_awaited_with("alert-events")
+    assert pubsub.aclose.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_alert_events_resubscribe_after_redis_errors_and_force_a_reload():
+    index = ActiveAlertIndex()
+    await index.load(AsyncMock(execute=AsyncMock(return_value=_Result([_alert(id="a1")]))))
+    connections = 0
+
+    async def messages():
+        nonlocal connections
+        connections += 1
+        yield {"type": "subscribe", "data": 1}
+        if connections == 1:
+            assert not index.stale
+            raise RedisError("connection reset")
+        assert index.stale  # resolves may have been published while disconnected
+        raise asyncio.CancelledError
+
+    pubsub = MagicMock()
+    pubsub.subscribe = AsyncMock()
+    pubsub.aclose = AsyncMock()
+    pubsub.listen = messages
+    redis = MagicMock()
+    redis.pubsub.return_value = pubsub
+
+    with pytest.raises(asyncio.CancelledError):
+        await listen_for_alert_events(index, redis, "alert-events", retry_seconds=0)
+
+    assert connections == 2
+    assert pubsub.aclose.await_count == 2
@@ -0,0 +1,106 @@
+"""Tests for the offline rule replay and threshold sweeps."""
+from __future__ import annotations
+
+import csv
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from analytics.backtest import load_files, overridden, parse_grid, replay, summarize, sweep
+from analytics.frame import SENSOR_COLUMNS, TelemetryFrame
+from analytics.rules import moisture
+
+START = datetime(2025, 7, 1, tzinfo=timezone.utc)
+
+NODE = dict(
+    node_id=str(uuid.uuid4()),
+    device_id="dev-a",
+    tier="basic",
+    block_id=str(uuid.uuid4()),
+    block_name="Block A",
+    reference_lux_peak=None,
+    vineyard_id=str(uuid.uuid4()),
+    vineyard_name="Test Vineyard",
+)
+
+
+def _frame(soil_moisture: list[float], every: timedelta = timedelta(minutes=30)) -> TelemetryFrame:
+    """One node, one reading per ``every`` from START, shuffled to check the frame sorts them."""
+    n = len(soil_moisture)
+    stamps = np.array([(START + i * every).timestamp() for i in range(n)])
+    columns = {name: np.full(n, np.nan) for name in SENSOR_COLUMNS}
+    columns["soil_moisture"] = np.array(soil_moisture)
+    shuffle = np.random.default_rng(0).permutation(n)
+    return TelemetryFrame.from_columns(
+        [NODE], np.array([NODE["node_id"]] * n)[shuffle], stamps[shuffle],
+        {name: column[shuffle] for name, column in columns.items()},
+    )
+
+
+def test_replay_raises_and_resolves_in_simulated_time():
+    # 6 h normal, 3 h dry, then normal again.
+    frame = _frame([40.0] * 12 + [5.0] * 6 + [40.0] * 18)
+
+    alerts = replay(frame, START, START + timedelta(hours=18), {"moisture": moisture})
+
+    assert [a["rule_key"] for a in alerts] == ["moisture_dry"]
+    # At 08:00 the 3 h window still holds two normal readings (mean exactly
+    # 15%); five minutes later it holds one.  Readings after "now" are never seen.
+    assert alerts[0]["triggered_at"] == START + timedelta(hours=8, minutes=5)
+    assert alerts[0]["resolved_at"] == START + timedelta(hours=9, minutes=30)
+    assert summarize(alerts, START + timedelta(hours=18)) == {
+        "moisture_dry": {"alerts": 1, "nodes": 1, "active_hours": 1.4},
+    }
+
+
+def test_a_condition_outlasting_its_cooldown_raises_again():
+    frame = _frame([5.0] * 20)  # dry for 10 h; moisture cooldown is 4 h
+
+    alerts = replay(frame, START, START + timedelta(hours=9, minutes=30), {"moisture": moisture})
+
+    assert [a["triggered_at"] - START for a in alerts] == [timedelta(hours=h) for h in (0, 4, 8)]
+    assert all(a["resolved_at"] is None for a in alerts)
+
+
+def test_sweep_replays_each_combination_in_worker_processes():
+    frame = _frame([10.0] * 12 + [20.0] * 12 + [40.0] * 12)
+    grid = parse_grid(["moisture._THRESHOLD_DRY=5,15,30"])
+
+    results = sweep(frame, START, START + timedelta(hours=18), grid, {"moisture": moisture}, workers=2)
+
+    counts = [summary.get("moisture_dry", {}).get("alerts", 0) for _, summary in results]
+    assert [overrides for overrides, _ in results] == grid
+    assert counts[0] == 0 and counts[1] >= 1 and counts[2] >= counts[1]
+    assert moisture._THRESHOLD_DRY == 15.0
+
+
+def test_overrides_are_checked_and_restored():
+    with overridden({"moisture._THRESHOLD_DRY": 1.0}):
+        assert moisture._THRESHOLD_DRY == 1.0
+    assert moisture._THRESHOLD_DRY == 15.0
+    with pytest.raises(ValueError), overridden({"moisture._THRESHOLD_DRYY": 1.0}):
+        pass
+    assert parse_grid(["a.X=1,2", "b.Y=3"]) == [{"a.X": 1.0, "b.Y": 3.0}, {"a.X": 2.0, "b.Y": 3.0}]
+
+
+def test_load_files_reads_a_csv_export(tmp_path):
+    nodes_path, readings_path = tmp_path / "nodes.csv", tmp_path / "readings.csv"
+    with nodes_path.open("w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(NODE))
+        writer.writeheader()
+        writer.writerow({**NODE, "reference_lux_peak": ""})
+    with readings_path.open("w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=["node_id", "recorded_at", *SENSOR_COLUMNS])
+        writer.writeheader()
+        writer.writerow({"node_id": NODE["node_id"], "recorded_at": "2025-07-01T01:00:00", "soil_moisture": "12.5"})
+        writer.writerow({"node_id": NODE["node_id"], "recorded_at": "2025-07-01T00:00:00+00:00", "soil_moisture": "30"})
+        writer.writerow({"node_id": "unknown", "recorded_at": "2025-07-01T00:00:00", "soil_moisture": "1"})
+
+    frame = load_files(readings_path, nodes_path)
+
+    assert frame.nodes[0]["reference_lux_peak"] is None
+    assert frame.recorded_at.tolist() == [START.timestamp(), (START + timedelta(hours=1)).timestamp()]
+    assert frame.columns["soil_moisture"].tolist() == [30.0, 12.5]
+    assert np.isnan(frame.columns["ambient_temp_c"]).all()
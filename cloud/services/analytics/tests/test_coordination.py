@@ -0,0 +1,129 @@
+"""Tests for replica membership, leadership and vineyard ownership."""
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from analytics.coordination import Coordinator, owner_of
+
+
+class _FakeRedis:
+    """Just the sorted-set commands and the two leader scripts the coordinator uses."""
+
+    def __init__(self) -> None:
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.strings: dict[str, str] = {}
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if score <= high]:
+            del zset[member]
+
+    async def zrange(self, key, start, end):
+        return [m.encode() for m in sorted(self.zsets.get(key, {}))]
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def eval(self, script, numkeys, key, replica_id, *args):
+        holder = self.strings.get(key)
+        if "NX" in script:  # claim
+            if holder in (None, replica_id):
+                self.strings[key] = replica_id
+                return 1
+            return 0
+        if holder == replica_id:  # release
+            del self.strings[key]
+            return 1
+        return 0
+
+
+def _coordinator(redis: _FakeRedis, replica_id: str) -> Coordinator:
+    return Coordinator(redis, replica_id=replica_id, key_prefix="test", ttl_seconds=15)
+
+
+def test_rendezvous_only_moves_the_departed_members_vineyards():
+    vineyards = [str(uuid.uuid4()) for _ in range(200)]
+    before = {v: owner_of(v, ("a", "b", "c")) for v in vineyards}
+    after = {v: owner_of(v, ("a", "c")) for v in vineyards}
+
+    assert {before[v] for v in vineyards} == {"a", "b", "c"}
+    assert all(after[v] == before[v] for v in vineyards if before[v] != "b")
+
+
+@pytest.mark.asyncio
+async def test_replicas_split_vineyards_and_one_leads_until_it_leaves():
+    redis = _FakeRedis()
+    first, second = _coordinator(redis, "replica-1"), _coordinator(redis, "replica-2")
+    changes: list[str] = []
+    second.on_change(lambda: changes.append("second"))
+
+    await first.heartbeat()
+    await second.heartbeat()
+    await first.heartbeat()
+
+    assert first.is_leader and not second.is_leader
+    assert first.members == second.members == ("replica-1", "replica-2")
+    vineyards = [str(uuid.uuid4()) for _ in range(50)]
+    for vineyard_id in vineyards:
+        assert first.owns(vineyard_id) != second.owns(vineyard_id)
+
+    await first.leave()
+    await second.heartbeat()
+
+    assert second.is_leader
+    assert second.members == ("replica-2",)
+    assert all(second.owns(v) for v in vineyards)
+    assert changes == ["second", "second"]
+
+
+@pytest.mark.asyncio
+async def test_engine_runs_only_owned_vineyards_and_resets_state_it_takes_over():
+    from analytics import engine as engine_module
+    from analytics.frame import TelemetryFrame
+
+    def node(vineyard_id: str) -> dict:
+        return dict(
+            node_id=str(uuid.uuid4()), device_id="dev", tier="basic", block_id=str(uuid.uuid4()),
+            block_name="Block", reference_lux_peak=None, vineyard_id=vineyard_id, vineyard_name="V",
+        )
+
+    mine, theirs = str(uuid.uuid4()), str(uuid.uuid4())
+    frame = TelemetryFrame.from_rows([node(mine), node(theirs)], [])
+    owned = {mine}
+    rule = MagicMock(RULE_KEYS=("k",), WINDOW=timedelta(hours=1), INTERVAL=timedelta(minutes=5), SOURCE="raw")
+    del rule.apply
+    rule.evaluate.return_value = []
+
+    db = MagicMock()
+    db.connect = MagicMock(side_effect=lambda: _ctx())
+    db.begin = MagicMock(side_effect=lambda: _ctx())
+    rule_engine = engine_module.RuleEngine(db, {"r": rule}, owns=lambda v: v in owned)
+    with (
+        patch("analytics.engine.load_frame", new_callable=AsyncMock, return_value=frame),
+        patch("analytics.engine.apply_alerts", new_callable=AsyncMock) as apply,
+    ):
+        now = datetime.now(tz=timezone.utc)
+        await rule_engine.tick(now)
+        assert apply.await_count == 1
+        assert [c.args[0] for c in rule.forget.call_args_list] == [mine]
+
+        owned.add(theirs)
+        await rule_engine.tick(now + timedelta(minutes=5))
+
+    assert apply.await_count == 3
+    assert [c.args[0] for c in rule.forget.call_args_list] == [mine, theirs]
+
+
+class _ctx:
+    async def __aenter__(self):
+        return AsyncMock()
+
+    async def __aexit__(self, *args):
+        pass
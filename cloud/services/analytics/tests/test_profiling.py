@@ -0,0 +1,129 @@
+"""Tests for the rule profiler: cursor accounting, engine runs, plans and the HTTP endpoint."""
+from __future__ import annotations
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from analytics.profiling import RuleProfiler, serve
+
+NOW = datetime.now(tz=timezone.utc)
+
+
+class _ctx:
+    def __init__(self, conn=None):
+        self._conn = conn or AsyncMock()
+
+    async def __aenter__(self):
+        return self._conn
+
+    async def __aexit__(self, *args):
+        pass
+
+
+def test_statements_inside_a_run_are_counted_and_writes_summed():
+    engine = create_engine("sqlite://")
+    profiler = RuleProfiler(history=2)
+    profiler.instrument(SimpleNamespace(sync_engine=engine))
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alerts (id INTEGER)"))  # outside any run
+        with profiler.run("rule", rule="frost", vineyard_id="v1"):
+            conn.execute(text("INSERT INTO alerts VALUES (1), (2)"))
+            conn.execute(text("SELECT * FROM alerts")).all()
+        with profiler.run("rule", rule="moisture", vineyard_id="v1"):
+            conn.execute(text("UPDATE alerts SET id = 3"))
+        with pytest.raises(RuntimeError), profiler.run("rule", rule="frost", vineyard_id="v2"):
+            raise RuntimeError("boom")
+
+    runs = profiler.runs()
+    assert [(r["rule"], r["vineyard_id"], r["ok"]) for r in runs] == [("frost", "v2", False), ("moisture", "v1", True)]
+    assert runs[1]["queries"] == 1 and runs[1]["rows_written"] == 2
+    assert "_slowest" not in runs[1]  # no EXPLAIN configured: the statement is not kept
+
+    summary = profiler.summary()
+    assert summary["frost"]["runs"] == 1 and summary["frost"]["failed"] == 1
+    assert profiler.runs("moisture", limit=5) == [runs[1]]
+
+
+@pytest.mark.asyncio
+async def test_engine_records_loads_and_partitions_and_explains_slow_runs():
+    from analytics import engine as engine_module
+    from analytics.frame import TelemetryFrame
+    from analytics.rules import moisture
+
+    node = dict(
+        node_id=str(uuid.uuid4()), device_id="dev", tier="basic", block_id=str(uuid.uuid4()),
+        block_name="Block A", reference_lux_peak=None, vineyard_id=str(uuid.uuid4()), vineyard_name="V",
+    )
+    frame = TelemetryFrame.from_rows([node], [dict(
+        node_id=node["node_id"], recorded_at=NOW, soil_moisture=8.0, ambient_temp_c=None,
+        ambient_humidity=None, light_lux=None, leaf_wetness_pct=None,
+    )])
+
+    async def fake_load_frame(conn, since):
+        # What the cursor hook would note for the frame query.
+        from analytics.profiling import _current
+        _current.get()["_slowest"] = (0.5, "SELECT 1", ())
+        return frame
+
+    explain_conn = AsyncMock()
+    explain_conn.exec_driver_sql = AsyncMock(
+        return_value=MagicMock(scalar=MagicMock(return_value='[{"Plan": {"Node Type": "Index Scan"}}]'))
+    )
+    db = MagicMock()
+    db.connect = MagicMock(side_effect=[_ctx(), _ctx(explain_conn), _ctx(explain_conn)])
+    db.begin = MagicMock(side_effect=lambda: _ctx())
+    profiler = RuleProfiler(explain_slow_seconds=1e-9)
+    rule_engine = engine_module.RuleEngine(db, {"moisture": moisture}, profiler=profiler)
+    with (
+        patch("analytics.engine.load_frame", side_effect=fake_load_frame),
+        patch("analytics.engine.apply_alerts", new_callable=AsyncMock),
+    ):
+        await rule_engine.tick(NOW)
+
+    rule_run, load_run = profiler.runs()
+    assert load_run["kind"] == "load" and load_run["rows"] == 1 and load_run["rules"] == ["moisture"]
+    assert load_run["plan"][0]["Plan"]["Node Type"] == "Index Scan"
+    explain_conn.exec_driver_sql.assert_awaited_once_with("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT 1", ())
+    assert rule_run["rule"] == "moisture" and rule_run["vineyard_id"] == node["vineyard_id"]
+    assert rule_run["alerts"] == 1 and rule_run["ok"]
+    assert "transaction_s" in rule_run and "plan" not in rule_run
+    assert profiler.summary()["moisture"]["runs"] == 1
+
+
+@pytest.mark.asyncio
+async def test_http_endpoint_serves_the_summary_and_runs():
+    profiler = RuleProfiler()
+    with profiler.run("rule", rule="frost", vineyard_id="v1"):
+        pass
+    server = await serve(profiler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async def get(path: str) -> tuple[str, object]:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        return head.split(b"\r\n")[0].decode(), json.loads(body)
+
+    try:
+        status, summary = await get("/rules")
+        assert status == "HTTP/1.1 200 OK" and summary["frost"]["runs"] == 1
+        status, runs = await get("/runs?rule=frost&limit=1")
+        assert status == "HTTP/1.1 200 OK" and runs[0]["vineyard_id"] == "v1"
+        status, _ = await get("/runs?limit=x")
+        assert status == "HTTP/1.1 400 Bad Request"
+        status, _ = await get("/nope")
+        assert status == "HTTP/1.1 404 Not Found"
+    finally:
+        server.close()
+        await server.wait_closed()
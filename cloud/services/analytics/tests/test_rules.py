@@ -1,12 +1,13 @@
 """Tests for the VineGuard analytics rules engine.
 
-Each test exercises the core logic of a rule module using mock async
-database connections — no real database is required.
+Rules are pure functions over an in-memory telemetry frame; the engine and
+alert manager are exercised with mock async database connections — no real
+database is required.
 """
 from __future__ import annotations
 
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -84,155 +85,113 @@ class _async_ctx:
 
 
 # ---------------------------------------------------------------------------
-# 1. Moisture rule — critical alert when avg < 15%
+# Frame helpers — rules are pure functions over an in-memory TelemetryFrame
 # ---------------------------------------------------------------------------
 
-@pytest.mark.asyncio
-async def test_moisture_dry_alert_created():
-    """Moisture rule should create a 'critical' alert when avg_moisture < 15%."""
-    node_id = _make_uuid()
-    block_id = _make_uuid()
-    vineyard_id = _make_uuid()
+NOW = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
 
-    telemetry_row = _row(
-        node_id=uuid.UUID(node_id),
-        device_id="dev-001",
-        block_id=uuid.UUID(block_id),
-        block_name="Block A",
-        vineyard_id=uuid.UUID(vineyard_id),
-        avg_moisture=8.5,   # below 15% → dry → critical
+
+def _node(block_name: str = "Block A", tier: str = "basic", reference_lux_peak: float | None = None,
+          vineyard_id: str | None = None, vineyard_name: str = "Test Vineyard") -> dict:
+    return dict(
+        node_id=_make_uuid(),
+        device_id=f"dev-{block_name.lower().replace(' ', '-')}",
+        tier=tier,
+        block_id=_make_uuid(),
+        block_name=block_name,
+        reference_lux_peak=reference_lux_peak,
+        vineyard_id=vineyard_id or _make_uuid(),
+        vineyard_name=vineyard_name,
     )
 
-    conn = AsyncMock()
-    conn.execute = AsyncMock(return_value=_FakeResult([telemetry_row]))
-    engine = MagicMock()
-    engine.begin = MagicMock(return_value=_async_ctx(conn))
-
-    created_alerts: list[dict] = []
-    created_recs: list[dict] = []
-
-    async def fake_create_alert(conn, *, node_id, block_id, vineyard_id, rule_key,
-                                severity, title, message, cooldown_hours=4):
-        created_alerts.append(dict(
-            node_id=node_id, block_id=block_id, vineyard_id=vineyard_id,
-            rule_key=rule_key, severity=severity, title=title, message=message,
-        ))
-        return _make_uuid()
 
-    async def fake_create_recommendation(conn, *, alert_id, block_id, vineyard_id,
-                                         action_text, priority=2, due_by=None):
-        created_recs.append(dict(action_text=action_text, priority=priority))
-        return _make_uuid()
+def _reading(node: dict, minutes_ago: float, **sensors) -> dict:
+    row = dict(
+        node_id=node["node_id"],
+        recorded_at=NOW - timedelta(minutes=minutes_ago),
+        soil_moisture=None,
+        ambient_temp_c=None,
+        ambient_humidity=None,
+        light_lux=None,
+        leaf_wetness_pct=None,
+    )
+    row.update(sensors)
+    return row
 
-    async def fake_resolve(conn, rule_key, still_triggering):
-        pass
 
-    with (
-        patch("analytics.rules.moisture.create_alert", side_effect=fake_create_alert),
-        patch("analytics.rules.moisture.create_recommendation", side_effect=fake_create_recommendation),
-        patch("analytics.rules.moisture.resolve_alerts_for_rule", side_effect=fake_resolve),
-    ):
-        from analytics.rules import moisture
-        await moisture.run(engine)
+def _frame(nodes: list[dict], readings: list[dict]):
+    from analytics.frame import TelemetryFrame
 
-    assert len(created_alerts) == 1
-    alert = created_alerts[0]
-    assert alert["rule_key"] == "moisture_dry"
-    assert alert["severity"] == "critical"
-    assert "8.5%" in alert["message"]
-    assert "15%" in alert["message"]
+    return TelemetryFrame.from_rows(nodes, readings)
 
-    assert len(created_recs) == 1
-    assert "Block A" in created_recs[0]["action_text"]
-    assert created_recs[0]["priority"] == 1
 
+def _bucket(node: dict, start: datetime, **columns) -> dict:
+    """One hourly/daily rollup row for ``node`` starting at ``start``."""
+    from analytics.frame import ROLLUP_COLUMNS
 
-@pytest.mark.asyncio
-async def test_moisture_wet_alert_created():
-    """Moisture rule should create a 'warning' alert when avg_moisture > 75%."""
-    node_id = _make_uuid()
-    block_id = _make_uuid()
-    vineyard_id = _make_uuid()
+    row = dict.fromkeys(ROLLUP_COLUMNS)
+    row.update(node_id=node["node_id"], recorded_at=start, readings=1)
+    row.update(columns)
+    return row
 
-    telemetry_row = _row(
-        node_id=uuid.UUID(node_id),
-        device_id="dev-002",
-        block_id=uuid.UUID(block_id),
-        block_name="Block B",
-        vineyard_id=uuid.UUID(vineyard_id),
-        avg_moisture=82.0,  # above 75% → wet → warning
-    )
 
-    conn = AsyncMock()
-    conn.execute = AsyncMock(return_value=_FakeResult([telemetry_row]))
-    engine = MagicMock()
-    engine.begin = MagicMock(return_value=_async_ctx(conn))
+def _rollup_frame(nodes: list[dict], buckets: list[dict]):
+    from analytics.frame import ROLLUP_COLUMNS, TelemetryFrame
 
-    created_alerts: list[dict] = []
+    return TelemetryFrame.from_rows(nodes, buckets, ROLLUP_COLUMNS)
 
-    async def fake_create_alert(conn, *, node_id, block_id, vineyard_id, rule_key,
-                                severity, title, message, cooldown_hours=4):
-        created_alerts.append(dict(rule_key=rule_key, severity=severity))
-        return _make_uuid()
 
-    async def fake_noop(*args, **kwargs):
-        return _make_uuid()
+# ---------------------------------------------------------------------------
+# 1. Moisture rule — critical alert when avg < 15%
+# ---------------------------------------------------------------------------
 
-    async def fake_resolve(*args, **kwargs):
-        pass
+def test_moisture_dry_alert_created():
+    """Moisture rule should create a 'critical' alert when avg_moisture < 15%."""
+    from analytics.rules import moisture
 
-    with (
-        patch("analytics.rules.moisture.create_alert", side_effect=fake_create_alert),
-        patch("analytics.rules.moisture.create_recommendation", side_effect=fake_noop),
-        patch("analytics.rules.moisture.resolve_alerts_for_rule", side_effect=fake_resolve),
-    ):
-        from analytics.rules import moisture
-        await moisture.run(engine)
+    node = _node("Block A")
+    frame = _frame([node], [
+        _reading(node, 30, soil_moisture=8.0),
+        _reading(node, 90, soil_moisture=9.0),   # avg 8.5% → dry → critical
+        _reading(node, 600, soil_moisture=40.0),  # outside the 3h window
+    ])
 
-    assert len(created_alerts) == 1
-    assert created_alerts[0]["rule_key"] == "moisture_wet"
-    assert created_alerts[0]["severity"] == "warning"
+    alerts = moisture.evaluate(frame, NOW)
 
+    assert len(alerts) == 1
+    alert = alerts[0]
+    assert alert["node_id"] == node["node_id"]
+    assert alert["rule_key"] == "moisture_dry"
+    assert alert["severity"] == "critical"
+    assert "8.5%" in alert["message"]
+    assert "15%" in alert["message"]
+    assert "Block A" in alert["action_text"]
+    assert alert["priority"] == 1
 
-@pytest.mark.asyncio
-async def test_moisture_no_alert_in_range():
-    """Moisture rule should create no alert when avg_moisture is 35% (in normal range)."""
-    node_id = _make_uuid()
-    block_id = _make_uuid()
-    vineyard_id = _make_uuid()
 
-    telemetry_row = _row(
-        node_id=uuid.UUID(node_id),
-        device_id="dev-003",
-        block_id=uuid.UUID(block_id),
-        block_name="Block C",
-        vineyard_id=uuid.UUID(vineyard_id),
-        avg_moisture=35.0,   # normal — no alert
-    )
+def test_moisture_wet_alert_created():
+    """Moisture rule should create a 'warning' alert when avg_moisture > 75%."""
+    from analytics.rules import moisture
 
-    conn = AsyncMock()
-    conn.execute = AsyncMock(return_value=_FakeResult([telemetry_row]))
-    engine = MagicMock()
-    engine.begin = MagicMock(return_value=_async_ctx(conn))
+    node = _node("Block B")
+    frame = _frame([node], [_reading(node, 10, soil_moisture=82.0)])  # above 75% → wet → warning
 
-    created_alerts: list[dict] = []
+    alerts = moisture.evaluate(frame, NOW)
 
-    async def fake_create_alert(conn, **kwargs):
-        created_alerts.append(kwargs)
-        return _make_uuid()
+    assert len(alerts) == 1
+    assert alerts[0]["rule_key"] == "moisture_wet"
+    assert alerts[0]["severity"] == "warning"
 
-    async def fake_resolve(*args, **kwargs):
-        pass
 
-    with (
-        patch("analytics.rules.moisture.create_alert", side_effect=fake_create_alert),
-        patch("analytics.rules.moisture.create_recommendation", new_callable=AsyncMock),
-        patch("analytics.rules.moisture.resolve_alerts_for_rule", side_effect=fake_resolve),
-    ):
-        from analytics.rules import moisture
-        await moisture.run(engine)
+def test_moisture_no_alert_in_range():
+    """Moisture rule should create no alert when avg_moisture is 35% (in normal range)."""
+    from analytics.rules import moisture
 
-    assert len(created_alerts) == 0
+    node = _node("Block C")
+    silent = _node("Block D")  # no readings at all — nothing to evaluate
+    frame = _frame([node, silent], [_reading(node, 10, soil_moisture=35.0)])
+
+    assert moisture.evaluate(frame, NOW) == []
 
 
 # ---------------------------------------------------------------------------
@@ -256,239 +215,133 @@ def test_frost_dewpoint_formula():
     assert _dewpoint(20.0, 60.0) == pytest.approx(12.0)
 
 
-@pytest.mark.asyncio
-async def test_frost_critical_alert_below_zero():
-    """Frost rule should fire a 'critical' alert when temp < 0°C."""
-    node_id = _make_uuid()
-    block_id = _make_uuid()
-    vineyard_id = _make_uuid()
-
-    telemetry_row = _row(
-        node_id=uuid.UUID(node_id),
-        device_id="dev-010",
-        block_id=uuid.UUID(block_id),
-        block_name="Frost Block",
-        vineyard_id=uuid.UUID(vineyard_id),
-        ambient_temp_c=-2.5,
-        ambient_humidity=85.0,
-    )
-
-    conn = AsyncMock()
-    conn.execute = AsyncMock(return_value=_FakeResult([telemetry_row]))
-    engine = MagicMock()
-    engine.begin = MagicMock(return_value=_async_ctx(conn))
-
-    created_alerts: list[dict] = []
-
-    async def fake_create_alert(conn, *, node_id, block_id, vineyard_id, rule_key,
-                                severity, title, message, cooldown_hours=4):
-        created_alerts.append(dict(rule_key=rule_key, severity=severity, title=title))
-        return _make_uuid()
+def test_frost_critical_alert_below_zero():
+    """Frost rule should fire a 'critical' alert when the latest temp < 0°C."""
+    from analytics.rules import frost
 
-    async def fake_noop(*args, **kwargs):
-        return _make_uuid()
-
-    async def fake_resolve(*args, **kwargs):
-        pass
+    node = _node("Frost Block")
+    frame = _frame([node], [
+        _reading(node, 5, ambient_temp_c=-2.5, ambient_humidity=85.0),
+        _reading(node, 60, ambient_temp_c=4.0, ambient_humidity=70.0),  # older — ignored
+    ])
 
-    with (
-        patch("analytics.rules.frost.create_alert", side_effect=fake_create_alert),
-        patch("analytics.rules.frost.create_recommendation", side_effect=fake_noop),
-        patch("analytics.rules.frost.resolve_alerts_for_rule", side_effect=fake_resolve),
-    ):
-        from analytics.rules import frost
-        await frost.run(engine)
+    alerts = frost.evaluate(frame, NOW)
 
-    assert len(created_alerts) == 1
-    assert created_alerts[0]["rule_key"] == "frost_critical"
-    assert created_alerts[0]["severity"] == "critical"
-    assert "Frost Alert" in created_alerts[0]["title"]
+    assert len(alerts) == 1
+    assert alerts[0]["rule_key"] == "frost_critical"
+    assert alerts[0]["severity"] == "critical"
+    assert "Frost Alert" in alerts[0]["title"]
+    assert "Dewpoint: -5.5°C." in alerts[0]["message"]
 
 
-@pytest.mark.asyncio
-async def test_frost_warning_alert_between_zero_and_three():
+def test_frost_warning_alert_between_zero_and_three():
     """Frost rule should fire a 'warning' alert when 0°C <= temp < 3°C."""
-    node_id = _make_uuid()
-    block_id = _make_uuid()
-    vineyard_id = _make_uuid()
-
-    telemetry_row = _row(
-        node_id=uuid.UUID(node_id),
-        device_id="dev-011",
-        block_id=uuid.UUID(block_id),
-        block_name="Cold Block",
-        vineyard_id=uuid.UUID(vineyard_id),
-        ambient_temp_c=1.8,
-        ambient_humidity=90.0,
-    )
-
-    conn = AsyncMock()
-    conn.execute = AsyncMock(return_value=_FakeResult([telemetry_row]))
-    engine = MagicMock()
-    engine.begin = MagicMock(return_value=_async_ctx(conn))
-
-    created_alerts: list[dict] = []
+    from analytics.rules import frost
 
-    async def fake_create_alert(conn, *, node_id, block_id, vineyard_id, rule_key,
-                                severity, title, message, cooldown_hours=4):
-        created_alerts.append(dict(rule_key=rule_key, severity=severity))
-        return _make_uuid()
+    node = _node("Cold Block")
+    frame = _frame([node], [
+        _reading(node, 5, ambient_temp_c=1.8),  # no humidity → no dewpoint
+        _reading(node, 300, ambient_temp_c=-4.0),  # outside the 2h window
+    ])
 
-    async def fake_noop(*args, **kwargs):
-        return _make_uuid()
+    alerts = frost.evaluate(frame, NOW)
 
-    async def fake_resolve(*args, **kwargs):
-        pass
-
-    with (
-        patch("analytics.rules.frost.create_alert", side_effect=fake_create_alert),
-        patch("analytics.rules.frost.create_recommendation", side_effect=fake_noop),
-        patch("analytics.rules.frost.resolve_alerts_for_rule", side_effect=fake_resolve),
-    ):
-        from analytics.rules import frost
-        await frost.run(engine)
-
-    assert len(created_alerts) == 1
-    assert created_alerts[0]["rule_key"] == "frost_warning"
-    assert created_alerts[0]["severity"] == "warning"
+    assert len(alerts) == 1
+    assert alerts[0]["rule_key"] == "frost_warning"
+    assert alerts[0]["severity"] == "warning"
+    assert "Dewpoint" not in alerts[0]["message"]
 
 
 # ---------------------------------------------------------------------------
 # 3. Mildew MPI — high risk condition
 # ---------------------------------------------------------------------------
 
-@pytest.mark.asyncio
-async def test_mildew_high_mpi_alert():
-    """Mildew rule should fire 'critical' when wet_hours >= 2, temp in range, RH >= 78%."""
-    node_id = _make_uuid()
-    block_id = _make_uuid()
-    vineyard_id = _make_uuid()
-
-    # wet_reading_count=5 → 5 * 0.5 = 2.5 wet hours (>= 2)
-    telemetry_row = _row(
-        node_id=uuid.UUID(node_id),
-        device_id="dev-020",
-        tier="precision_plus",
-        block_id=uuid.UUID(block_id),
-        block_name="Mildew Block",
-        vineyard_id=uuid.UUID(vineyard_id),
-        wet_reading_count=5,     # 5 × 0.5 h = 2.5 wet hours
-        avg_temp=20.0,           # in [15, 27]
-        avg_humidity=82.0,       # >= 78
-        total_readings=12,
-    )
-
-    conn = AsyncMock()
-    conn.execute = AsyncMock(return_value=_FakeResult([telemetry_row]))
-    engine = MagicMock()
-    engine.begin = MagicMock(return_value=_async_ctx(conn))
-
-    created_alerts: list[dict] = []
+def _mildew_readings(node: dict, wet: int, dry: int, temp: float, rh: float) -> list[dict]:
+    readings = [
+        _reading(node, 10 + 20 * i, leaf_wetness_pct=60.0, ambient_temp_c=temp, ambient_humidity=rh)
+        for i in range(wet)
+    ]
+    readings += [
+        _reading(node, 10 + 20 * (wet + i), leaf_wetness_pct=0.0, ambient_temp_c=temp, ambient_humidity=rh)
+        for i in range(dry)
+    ]
+    return readings
 
-    async def fake_create_alert(conn, *, node_id, block_id, vineyard_id, rule_key,
-                                severity, title, message, cooldown_hours=6):
-        created_alerts.append(dict(rule_key=rule_key, severity=severity, message=message))
-        return _make_uuid()
 
-    async def fake_noop(*args, **kwargs):
-        return _make_uuid()
+def test_mildew_high_mpi_alert():
+    """Mildew rule should fire 'critical' when wet_hours >= 2, temp in range, RH >= 78%."""
+    from analytics.rules import mildew_mpi
 
-    async def fake_resolve(*args, **kwargs):
-        pass
+    node = _node("Mildew Block", tier="precision_plus")
+    # 5 wet readings × 0.5 h = 2.5 wet hours (>= 2)
+    frame = _frame([node], _mildew_readings(node, wet=5, dry=7, temp=20.0, rh=82.0))
 
-    with (
-        patch("analytics.rules.mildew_mpi.create_alert", side_effect=fake_create_alert),
-        patch("analytics.rules.mildew_mpi.create_recommendation", side_effect=fake_noop),
-        patch("analytics.rules.mildew_mpi.resolve_alerts_for_rule", side_effect=fake_resolve),
-    ):
-        from analytics.rules import mildew_mpi
-        await mildew_mpi.run(engine)
+    alerts = mildew_mpi.evaluate(frame, NOW)
 
-    assert len(created_alerts) == 1
-    assert created_alerts[0]["rule_key"] == "mildew_high"
-    assert created_alerts[0]["severity"] == "critical"
-    assert "2.5h+" in created_alerts[0]["message"]
+    assert len(alerts) == 1
+    assert alerts[0]["rule_key"] == "mildew_high"
+    assert alerts[0]["severity"] == "critical"
+    assert "2.5h+" in alerts[0]["message"]
 
 
-@pytest.mark.asyncio
-async def test_mildew_moderate_mpi_alert():
+def test_mildew_moderate_mpi_alert():
     """Mildew rule should fire 'warning' when wet_hours >= 1, temp in range, RH >= 70%."""
-    node_id = _make_uuid()
-    block_id = _make_uuid()
-    vineyard_id = _make_uuid()
+    from analytics.rules import mildew_mpi
 
-    # wet_reading_count=2 → 2 * 0.5 = 1.0 wet hours (>= 1 but < 2)
-    telemetry_row = _row(
-        node_id=uuid.UUID(node_id),
-        device_id="dev-021",
-        tier="precision_plus",
-        block_id=uuid.UUID(block_id),
-        block_name="Risk Block",
-        vineyard_id=uuid.UUID(vineyard_id),
-        wet_reading_count=2,     # 1 wet hour
-        avg_temp=22.0,
-        avg_humidity=73.0,       # >= 70 but < 78
-        total_readings=12,
-    )
+    node = _node("Risk Block", tier="precision_plus")
+    # 2 wet readings → 1 wet hour; RH >= 70 but < 78
+    frame = _frame([node], _mildew_readings(node, wet=2, dry=10, temp=22.0, rh=73.0))
 
-    conn = AsyncMock()
-    conn.execute = AsyncMock(return_value=_FakeResult([telemetry_row]))
-    engine = MagicMock()
-    engine.begin = MagicMock(return_value=_async_ctx(conn))
+    alerts = mildew_mpi.evaluate(frame, NOW)
 
-    created_alerts: list[dict] = []
+    assert len(alerts) == 1
+    assert alerts[0]["rule_key"] == "mildew_moderate"
+    assert alerts[0]["severity"] == "warning"
 
-    async def fake_create_alert(conn, *, node_id, block_id, vineyard_id, rule_key,
-                                severity, title, message, cooldown_hours=6):
-        created_alerts.append(dict(rule_key=rule_key, severity=severity))
-        return _make_uuid()
 
-    async def fake_noop(*args, **kwargs):
-        return _make_uuid()
+def test_mildew_no_alert_for_basic_tier():
+    """Mildew rule should ignore basic-tier nodes even when their readings look high-risk."""
+    from analytics.rules import mildew_mpi
 
-    async def fake_resolve(*args, **kwargs):
-        pass
+    node = _node("Basic Block", tier="basic")
+    frame = _frame([node], _mildew_readings(node, wet=5, dry=7, temp=20.0, rh=82.0))
 
-    with (
-        patch("analytics.rules.mildew_mpi.create_alert", side_effect=fake_create_alert),
-        patch("analytics.rules.mildew_mpi.create_recommendation", side_effect=fake_noop),
-        patch("analytics.rules.mildew_mpi.resolve_alerts_for_rule", side_effect=fake_resolve),
-    ):
-        from analytics.rules import mildew_mpi
-        await mildew_mpi.run(engine)
+    assert mildew_mpi.evaluate(frame, NOW) == []
 
-    assert len(created_alerts) == 1
-    assert created_alerts[0]["rule_key"] == "mildew_moderate"
-    assert created_alerts[0]["severity"] == "warning"
 
+def test_canopy_density_alert_uses_peak_hours_only():
+    """Canopy rule compares peak-hour (10–14 UTC) max lux with the block reference."""
+    from analytics.rules import canopy_lux
 
-@pytest.mark.asyncio
-async def test_mildew_no_alert_for_basic_tier():
-    """Mildew rule should not create any alert when the query returns no rows (basic-tier nodes filtered out)."""
-    # The tier filter is in the SQL WHERE clause; simulate empty result set.
-    conn = AsyncMock()
-    conn.execute = AsyncMock(return_value=_FakeResult([]))
-    engine = MagicMock()
-    engine.begin = MagicMock(return_value=_async_ctx(conn))
+    dim = _node("Shaded Block", reference_lux_peak=100_000.0)
+    bright = _node("Open Block", reference_lux_peak=100_000.0)
+    unreferenced = _node("New Block", reference_lux_peak=None)
+    eleven = NOW - timedelta(hours=1)
+    frame = _rollup_frame([dim, bright, unreferenced], [
+        _bucket(dim, eleven - timedelta(hours=1), light_lux_max=50_000.0),   # 10:00 UTC
+        _bucket(dim, eleven, light_lux_max=60_000.0),                        # 11:00 UTC — peak is 60% of reference
+        _bucket(dim, NOW - timedelta(hours=16), light_lux_max=95_000.0),     # 20:00 the day before — not peak hours
+        _bucket(bright, eleven, light_lux_max=95_000.0),
+        _bucket(unreferenced, eleven, light_lux_max=1_000.0),
+    ])
 
-    created_alerts: list[dict] = []
+    alerts = canopy_lux.evaluate(frame, NOW)
 
-    async def fake_create_alert(conn, **kwargs):
-        created_alerts.append(kwargs)
-        return _make_uuid()
+    assert [a["node_id"] for a in alerts] == [dim["node_id"]]
+    assert "60% of reference" in alerts[0]["message"]
 
-    async def fake_resolve(*args, **kwargs):
-        pass
 
-    with (
-        patch("analytics.rules.mildew_mpi.create_alert", side_effect=fake_create_alert),
-        patch("analytics.rules.mildew_mpi.create_recommendation", new_callable=AsyncMock),
-        patch("analytics.rules.mildew_mpi.resolve_alerts_for_rule", side_effect=fake_resolve),
-    ):
-        from analytics.rules import mildew_mpi
-        await mildew_mpi.run(engine)
+def test_canopy_density_window_includes_the_bucket_containing_its_start():
+    """A peak bucket that began just before now - 24h still counts, as its readings do."""
+    from analytics.frame import bucket_start
+    from analytics.rules import canopy_lux
+
+    node = _node("Shaded Block", reference_lux_peak=100_000.0)
+    now = NOW - timedelta(minutes=30)  # the window starts at 11:30 the day before
+    frame = _rollup_frame([node], [_bucket(node, NOW - timedelta(hours=25), light_lux_max=50_000.0)])
 
-    assert len(created_alerts) == 0
+    assert bucket_start(now - canopy_lux.WINDOW, timedelta(hours=1)) == NOW - timedelta(hours=25)
+    assert [a["node_id"] for a in canopy_lux.evaluate(frame, now)] == [node["node_id"]]
 
 
 # ---------------------------------------------------------------------------
@@ -538,33 +391,42 @@ def test_gdd_calculation_hot_day():
     assert gdd == pytest.approx(17.5)
 
 
+def test_gdd_daily_extremes_per_vineyard():
+    """Today's max/min are taken across every node of a vineyard, ignoring yesterday."""
+    from analytics.rules.gdd import daily_extremes
+
+    vineyard_id = _make_uuid()
+    a = _node("Block A", vineyard_id=vineyard_id)
+    b = _node("Block B", vineyard_id=vineyard_id)
+    today = datetime.combine(NOW.date(), datetime.min.time(), tzinfo=timezone.utc)
+    frame = _rollup_frame([a, b], [
+        _bucket(a, today, ambient_temp_c_max=28.0, ambient_temp_c_min=20.0),
+        _bucket(b, today, ambient_temp_c_max=25.0, ambient_temp_c_min=14.0),
+        _bucket(b, today - timedelta(days=1), ambient_temp_c_max=5.0, ambient_temp_c_min=-3.0),
+    ])
+
+    assert daily_extremes(frame, NOW.date()) == [
+        dict(vineyard_id=vineyard_id, vineyard_name="Test Vineyard", daily_max=28.0, daily_min=14.0)
+    ]
+
+
 @pytest.mark.asyncio
 async def test_gdd_upsert_called():
     """GDD rule should upsert a gdd_accumulation row for each vineyard."""
-    vineyard_id = _make_uuid()
-
-    temp_row = _row(
-        vineyard_id=uuid.UUID(vineyard_id),
-        vineyard_name="Test Vineyard",
-        daily_max=28.0,
-        daily_min=14.0,
-    )
+    from analytics.rules import gdd
 
-    # season total via scalar()
-    season_total_result = MagicMock()
-    season_total_result.scalar = MagicMock(return_value=0.0)
+    node = _node("Block A")
+    today = datetime.combine(NOW.date(), datetime.min.time(), tzinfo=timezone.utc)
+    frame = _rollup_frame([node], [_bucket(node, today, ambient_temp_c_max=28.0, ambient_temp_c_min=14.0)])
 
     execute_results = [
-        _FakeResult([temp_row]),   # main vineyard query
-        season_total_result,       # _get_previous_season_total scalar
+        _FakeResult([]),           # newest season total before today (none yet)
         MagicMock(),               # upsert
     ]
     execute_iter = iter(execute_results)
 
     conn = AsyncMock()
     conn.execute = AsyncMock(side_effect=lambda *a, **kw: next(execute_iter))
-    engine = MagicMock()
-    engine.begin = MagicMock(return_value=_async_ctx(conn))
 
     async def fake_create_alert(*args, **kwargs):
         return _make_uuid()
@@ -576,11 +438,317 @@ async def test_gdd_upsert_called():
         patch("analytics.rules.gdd.create_alert", side_effect=fake_create_alert),
         patch("analytics.rules.gdd.create_recommendation", side_effect=fake_create_rec),
     ):
-        from analytics.rules import gdd
-        await gdd.run(engine)
+        await gdd.apply(conn, frame, NOW, tracker=gdd.SeasonTracker())
+
+    # Verify execute was called twice (season total + upsert)
+    assert conn.execute.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_gdd_carries_the_season_total_and_recomputes_late_days():
+    """Later runs only upsert; a late reading for yesterday rewrites yesterday from the table."""
+    from analytics.rules import gdd
+
+    node = _node("Block A")
+    tracker = gdd.SeasonTracker()
+    conn = AsyncMock()
+    upserts: list[dict] = []
+
+    async def fake_upsert(conn, vineyard_id, day, gdd_daily, season_total):
+        upserts.append(dict(date=day, gdd_daily=gdd_daily, season_total=season_total))
+
+    midnight = datetime.combine(NOW.date(), datetime.min.time(), tzinfo=timezone.utc)
+    today = [_bucket(node, midnight, ambient_temp_c_max=28.0, ambient_temp_c_min=14.0)]
+    with (
+        patch("analytics.rules.gdd._upsert_day", side_effect=fake_upsert),
+        patch("analytics.rules.gdd._get_previous_season_total", new_callable=AsyncMock, return_value=100.0),
+    ):
+        conn.execute = AsyncMock(return_value=_FakeResult([_row(vineyard_id=node["vineyard_id"], gdd_season_total=100.0)]))
+        await gdd.apply(conn, _rollup_frame([node], today), NOW, tracker=tracker)
+        conn.execute = AsyncMock()
+        await gdd.apply(conn, _rollup_frame([node], today), NOW + timedelta(hours=1), tracker=tracker)
+        assert conn.execute.await_count == 0  # season total carried, no query
+
+        tomorrow = NOW + timedelta(days=1)
+        buckets = [
+            _bucket(node, midnight, ambient_temp_c_max=32.0, ambient_temp_c_min=14.0),  # late reading moved the max
+            _bucket(node, midnight + timedelta(days=1), ambient_temp_c_max=20.0, ambient_temp_c_min=20.0),
+        ]
+        await gdd.apply(conn, _rollup_frame([node], buckets), tomorrow, tracker=tracker)
+
+        # Another late reading for yesterday, after today has already been written twice.
+        buckets[0] = _bucket(node, midnight, ambient_temp_c_max=34.0, ambient_temp_c_min=14.0)
+        await gdd.apply(conn, _rollup_frame([node], buckets), tomorrow + timedelta(hours=1), tracker=tracker)
+        await gdd.apply(conn, _rollup_frame([node], buckets), tomorrow + timedelta(hours=2), tracker=tracker)
+
+    assert upserts[0] == dict(date=NOW.date(), gdd_daily=11.0, season_total=111.0)
+    assert upserts[1] == upserts[0]
+    assert upserts[2] == dict(date=NOW.date(), gdd_daily=13.0, season_total=113.0)
+    assert upserts[3] == dict(date=tomorrow.date(), gdd_daily=10.0, season_total=123.0)
+    assert upserts[4] == dict(date=NOW.date(), gdd_daily=14.0, season_total=114.0)
+    assert upserts[5] == dict(date=tomorrow.date(), gdd_daily=10.0, season_total=124.0)
+    assert upserts[6] == upserts[5]  # yesterday unchanged since: not rewritten again
+    assert len(upserts) == 7
+
+
+@pytest.mark.asyncio
+async def test_gdd_checks_yesterday_against_the_table_after_a_restart():
+    """With no carried state, yesterday's stored gdd_daily is compared with its buckets once."""
+    from analytics.rules import gdd
+
+    node, moved, missing = _node("Block A"), _node("Block B"), _node("Block C")
+    midnight = datetime.combine(NOW.date(), datetime.min.time(), tzinfo=timezone.utc)
+    yesterday = midnight - timedelta(days=1)
+    buckets = [
+        _bucket(n, yesterday, ambient_temp_c_max=32.0, ambient_temp_c_min=14.0) for n in (node, moved, missing)
+    ] + [_bucket(n, midnight, ambient_temp_c_max=20.0, ambient_temp_c_min=20.0) for n in (node, moved, missing)]
+    upserts: list[tuple] = []
+
+    async def fake_upsert(conn, vineyard_id, day, gdd_daily, season_total):
+        upserts.append((vineyard_id, day, gdd_daily, season_total))
+
+    stored = _FakeResult([
+        _row(vineyard_id=node["vineyard_id"], gdd_daily=13.0, gdd_season_total=113.0),  # matches the buckets
+        _row(vineyard_id=moved["vineyard_id"], gdd_daily=11.0, gdd_season_total=111.0),  # a late reading moved it
+    ])
+    conn = AsyncMock()
+    conn.execute = AsyncMock(side_effect=[stored, _FakeResult([])])
+    with (
+        patch("analytics.rules.gdd._upsert_day", side_effect=fake_upsert),
+        patch("analytics.rules.gdd._get_previous_season_total", new_callable=AsyncMock, return_value=100.0),
+    ):
+        await gdd.apply(conn, _rollup_frame([node, moved, missing], buckets), NOW, tracker=gdd.SeasonTracker())
+
+    assert conn.execute.await_count == 1  # every vineyard's total before today is carried
+    by_vineyard = {(v, day): (daily, total) for v, day, daily, total in upserts}
+    assert (node["vineyard_id"], yesterday.date()) not in by_vineyard
+    assert by_vineyard[(moved["vineyard_id"], yesterday.date())] == (13.0, 113.0)
+    assert by_vineyard[(missing["vineyard_id"], yesterday.date())] == (13.0, 113.0)
+    for n in (node, moved, missing):
+        assert by_vineyard[(n["vineyard_id"], NOW.date())] == (10.0, 123.0)
+
+
+# ---------------------------------------------------------------------------
+# 5. Rule engine — one frame per tick, rules on their own intervals
+# ---------------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_engine_loads_one_frame_for_all_due_rules():
+    """A tick loads each source once for the widest window and persists every rule's alerts."""
+    from analytics import engine as engine_module
+
+    node = _node("Block A")
+    frame = _frame([node], [_reading(node, 10, soil_moisture=8.0, ambient_temp_c=-1.0)])
+    loads: list[tuple[str, datetime]] = []
+    applied: list[tuple] = []
+
+    async def fake_load_frame(conn, since):
+        loads.append(("raw", since))
+        return frame
+
+    async def fake_load_latest_frame(conn, since):
+        loads.append(("latest", since))
+        return frame
+
+    async def fake_apply_alerts(conn, rule_keys, triggered, only_node_ids=None, index=None):
+        applied.append((rule_keys, [a["rule_key"] for a in triggered]))
+
+    db = MagicMock()
+    db.connect = MagicMock(side_effect=lambda: _async_ctx(AsyncMock()))
+    db.begin = MagicMock(side_effect=lambda: _async_ctx(AsyncMock()))
+    from analytics.rules import frost, moisture
+
+    rule_engine = engine_module.RuleEngine(db, {"moisture": moisture, "frost": frost})
+    with (
+        patch("analytics.engine.load_frame", side_effect=fake_load_frame),
+        patch("analytics.engine.load_latest_frame", side_effect=fake_load_latest_frame),
+        patch("analytics.engine.apply_alerts", side_effect=fake_apply_alerts),
+    ):
+        assert await rule_engine.tick(NOW) == ["moisture", "frost"]
+        assert await rule_engine.tick(NOW + timedelta(minutes=1)) == []
+        assert await rule_engine.tick(NOW + timedelta(minutes=5)) == ["moisture", "frost"]
+
+    later = NOW + timedelta(minutes=5)
+    assert loads == [
+        ("raw", NOW - timedelta(hours=3)),
+        ("latest", NOW - timedelta(hours=2)),
+        ("raw", later - timedelta(hours=3)),
+        ("latest", later - timedelta(hours=2)),
+    ]
+    assert applied[:2] == [
+        (("moisture_dry", "moisture_wet"), ["moisture_dry"]),
+        (("frost_critical", "frost_warning"), ["frost_critical"]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_load_latest_frame_reads_one_reading_per_node_through_a_lateral_limit():
+    """The newest reading per node comes from one LATERAL ... LIMIT 1 query, not a max() join."""
+    from sqlalchemy.dialects import postgresql
+
+    from analytics.frame import load_latest_frame
+    from analytics.rules import frost
+
+    node = _node("Block A")
+    conn = AsyncMock()
+    conn.execute = AsyncMock(side_effect=[_FakeResult([node]), _FakeResult([_reading(node, 5, ambient_temp_c=1.5)])])
+
+    frame = await load_latest_frame(conn, NOW - timedelta(hours=2))
+
+    sql = str(conn.execute.await_args_list[1].args[0].compile(dialect=postgresql.dialect()))
+    assert "JOIN LATERAL" in sql
+    assert "ORDER BY telemetry_readings.recorded_at DESC" in sql
+    assert "max(" not in sql
+    assert len(frame) == 1
+    assert frost.evaluate(frame, NOW)[0]["rule_key"] == "frost_warning"
+
+
+def test_frame_partition_by_vineyard():
+    """Each part keeps only its vineyard's nodes and their readings, renumbered."""
+    v1, v2 = _make_uuid(), _make_uuid()
+    a, b, c = _node("A", vineyard_id=v1), _node("B", vineyard_id=v2), _node("C", vineyard_id=v1)
+    frame = _frame([a, b, c], [
+        _reading(a, 30, soil_moisture=10.0),
+        _reading(b, 30, soil_moisture=20.0),
+        _reading(c, 30, soil_moisture=30.0),
+        _reading(c, 10, soil_moisture=40.0),
+    ])
+
+    parts = frame.partition("vineyard_id")
+
+    assert [n["block_name"] for n in parts[v1].nodes] == ["A", "C"]
+    assert parts[v1].node_index.tolist() == [0, 1, 1]
+    assert parts[v1].columns["soil_moisture"].tolist() == [10.0, 30.0, 40.0]
+    assert parts[v2].mean("soil_moisture", parts[v2].window(NOW - timedelta(hours=1))).tolist() == [20.0]
+
+
+@pytest.mark.asyncio
+async def test_engine_runs_each_vineyard_in_its_own_bounded_transaction():
+    """A failing vineyard does not stop the others, and at most ``concurrency`` run at once."""
+    import asyncio
+
+    from analytics import engine as engine_module
+    from analytics.rules import moisture
+
+    nodes = [_node(f"Block {i}") for i in range(6)]
+    frame = _frame(nodes, [_reading(n, 10, soil_moisture=8.0) for n in nodes])
+    running = peak = 0
+    written: list[list[str]] = []
+
+    async def fake_apply_alerts(conn, rule_keys, triggered, only_node_ids=None, index=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        if only_node_ids == [nodes[0]["node_id"]]:
+            raise RuntimeError("boom")
+        written.append(only_node_ids)
+
+    db = MagicMock()
+    db.connect = MagicMock(return_value=_async_ctx(AsyncMock()))
+    db.begin = MagicMock(side_effect=lambda: _async_ctx(AsyncMock()))
+    rule_engine = engine_module.RuleEngine(db, {"moisture": moisture}, concurrency=2)
+    with (
+        patch("analytics.engine.load_frame", new_callable=AsyncMock, return_value=frame),
+        patch("analytics.engine.apply_alerts", side_effect=fake_apply_alerts),
+    ):
+        assert await rule_engine.tick(NOW) == ["moisture"]
 
-    # Verify execute was called at least 3 times (main query + season total + upsert)
-    assert conn.execute.call_count >= 3
+    assert db.begin.call_count == 6
+    assert sorted(w[0] for w in written) == sorted(n["node_id"] for n in nodes[1:])
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_engine_forgets_carried_state_when_the_commit_fails():
+    """GDD's tracker must not keep totals for rows the failed transaction rolled back."""
+    from analytics import engine as engine_module
+    from analytics.rules import gdd
+
+    node = _node("Block A")
+    midnight = datetime.combine(NOW.date(), datetime.min.time(), tzinfo=timezone.utc)
+    frame = _rollup_frame([node], [_bucket(node, midnight, ambient_temp_c_max=28.0, ambient_temp_c_min=14.0)])
+
+    class _FailingCommit(_async_ctx):
+        async def __aexit__(self, *args):
+            raise ConnectionError("commit failed")
+
+    db = MagicMock()
+    db.connect = MagicMock(side_effect=lambda: _async_ctx(AsyncMock()))
+    conn = AsyncMock(execute=AsyncMock(return_value=_FakeResult([])))  # no season total stored yet
+    db.begin = MagicMock(side_effect=lambda: _FailingCommit(conn))
+    rule_engine = engine_module.RuleEngine(db, {"gdd": gdd})
+    gdd.TRACKER.clear()
+    with (
+        patch("analytics.engine.load_rollup_frame", new_callable=AsyncMock, return_value=frame),
+        patch("analytics.engine.rollups_available", new_callable=AsyncMock, return_value=True),
+        patch("analytics.rules.gdd._upsert_day", new_callable=AsyncMock),
+    ):
+        await rule_engine.tick(NOW)
+
+    assert db.begin.call_count == 1
+    assert gdd.TRACKER.get(node["vineyard_id"]) is None
+
+
+@pytest.mark.asyncio
+async def test_engine_reads_rollup_rules_from_the_rollup_frame():
+    """Rollup rules get a bucket frame; the views are probed once and raw grouping used without them."""
+    from analytics import engine as engine_module
+    from analytics.rules import canopy_lux, moisture
+
+    node = _node("Block A")
+    rollup_loads: list[tuple] = []
+
+    async def fake_load_rollup_frame(conn, source, since, *, views):
+        rollup_loads.append((source, since, views))
+        return _rollup_frame([node], [])
+
+    db = MagicMock()
+    db.connect = MagicMock(side_effect=lambda: _async_ctx(AsyncMock()))
+    db.begin = MagicMock(side_effect=lambda: _async_ctx(AsyncMock()))
+    rule_engine = engine_module.RuleEngine(db, {"moisture": moisture, "canopy_lux": canopy_lux})
+    with (
+        patch("analytics.engine.load_frame", new_callable=AsyncMock, return_value=_frame([node], [])) as load,
+        patch("analytics.engine.load_rollup_frame", side_effect=fake_load_rollup_frame),
+        patch("analytics.engine.rollups_available", new_callable=AsyncMock, return_value=False) as probe,
+        patch("analytics.engine.apply_alerts", new_callable=AsyncMock),
+    ):
+        await rule_engine.tick(NOW)
+        await rule_engine.tick(NOW + timedelta(hours=1))
+
+    assert load.await_args_list[0].args[1] == NOW - timedelta(hours=3)
+    assert rollup_loads[0] == ("hourly", NOW - timedelta(hours=24), False)
+    assert len(rollup_loads) == 2
+    assert probe.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_apply_alerts_creates_and_resolves():
+    """apply_alerts bulk-creates the alerts with their recommendations and resolves the rest."""
+    from analytics import alert_manager
+
+    node = _node("Block A")
+    triggered = [alert_manager.node_alert(
+        node, rule_key="moisture_dry", severity="critical", title="t", message="m",
+        cooldown_hours=4, action_text="Irrigate", priority=1,
+    )]
+    resolved: list[tuple] = []
+
+    async def fake_resolve(conn, rule_key, still_triggering, only_node_ids=None, index=None):
+        resolved.append((rule_key, still_triggering))
+
+    with (
+        patch("analytics.alert_manager.create_alerts", new_callable=AsyncMock, return_value=["a1"]) as create,
+        patch("analytics.alert_manager.create_recommendations", new_callable=AsyncMock) as recommend,
+        patch("analytics.alert_manager.resolve_alerts_for_rule", side_effect=fake_resolve),
+    ):
+        await alert_manager.apply_alerts(AsyncMock(), ("moisture_dry", "moisture_wet"), triggered)
+
+    assert create.await_args.args[1] == triggered
+    assert recommend.await_args.args[1][0]["alert_id"] == "a1"
+    assert recommend.await_args.args[1][0]["action_text"] == "Irrigate"
+    assert resolved == [("moisture_dry", [node["node_id"]]), ("moisture_wet", [])]
 
 
 # ---------------------------------------------------------------------------
@@ -656,3 +824,40 @@ async def test_create_alert_inserts_when_no_active():
 
     assert result_id == new_id
     assert conn.execute.call_count == 2  # get_active_alert + insert
+
+
+@pytest.mark.asyncio
+async def test_create_alerts_bulk_keeps_cooldown():
+    """create_alerts: one SELECT for existing alerts, one multi-row INSERT for the rest."""
+    from analytics.alert_manager import create_alerts, node_alert
+
+    cooling, expired, new = _node("Block A"), _node("Block B"), _node("Block C")
+    existing_id, expired_id = _make_uuid(), _make_uuid()
+    inserted_ids = [uuid.UUID(_make_uuid()), uuid.UUID(_make_uuid())]
+
+    class _InsertResult:
+        def all(self):
+            return [(i,) for i in inserted_ids]
+
+    conn = AsyncMock()
+    conn.execute = AsyncMock(side_effect=[
+        _FakeResult([
+            dict(id=uuid.UUID(existing_id), rule_key="frost_critical", node_id=uuid.UUID(cooling["node_id"]),
+                 cooldown_until=datetime(2030, 1, 1, tzinfo=timezone.utc)),
+            dict(id=uuid.UUID(expired_id), rule_key="frost_critical", node_id=uuid.UUID(expired["node_id"]),
+                 cooldown_until=datetime(2020, 1, 1)),  # naive and long past
+        ]),
+        _InsertResult(),
+    ])
+    candidates = [
+        node_alert(node, rule_key="frost_critical", severity="critical", title="t", message="m",
+                   cooldown_hours=2, action_text="a", priority=1)
+        for node in (cooling, expired, new)
+    ]
+
+    ids = await create_alerts(conn, candidates)
+
+    assert ids == [existing_id, str(inserted_ids[0]), str(inserted_ids[1])]
+    assert conn.execute.call_count == 2
+    inserted_rows = conn.execute.call_args_list[1].args[1]
+    assert [row["node_id"] for row in inserted_rows] == [expired["node_id"], new["node_id"]]
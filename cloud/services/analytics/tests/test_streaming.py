@@ -0,0 +1,185 @@
+"""Tests for per-reading rule evaluation from the telemetry channel."""
+from __future__ import annotations
+
+import json
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from analytics.alert_index import ActiveAlertIndex
+from analytics.frame import TelemetryFrame
+from analytics.streaming import STREAMED_RULES, StreamingEvaluator, reading_from_message
+
+NOW = datetime(2025, 6, 1, 4, 0, tzinfo=timezone.utc)
+
+NODE = dict(
+    node_id=str(uuid.uuid4()),
+    device_id="dev-001",
+    tier="basic",
+    block_id=str(uuid.uuid4()),
+    block_name="Frost Block",
+    reference_lux_peak=None,
+    vineyard_id=str(uuid.uuid4()),
+    vineyard_name="Test Vineyard",
+)
+
+
+class _async_ctx:
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def __aenter__(self):
+        return self._conn
+
+    async def __aexit__(self, *args):
+        pass
+
+
+def _reading(minutes_ago: float, temp: float) -> dict:
+    return dict(
+        node_id=NODE["node_id"],
+        recorded_at=NOW - timedelta(minutes=minutes_ago),
+        soil_moisture=35.0,
+        ambient_temp_c=temp,
+        ambient_humidity=None,
+        light_lux=None,
+        leaf_wetness_pct=None,
+    )
+
+
+def _evaluator(readings: list[dict]) -> StreamingEvaluator:
+    engine = MagicMock()
+    engine.begin = MagicMock(side_effect=lambda: _async_ctx(AsyncMock()))
+    evaluator = StreamingEvaluator(engine)
+    evaluator.seed(TelemetryFrame.from_rows([NODE], readings), NOW)
+    return evaluator
+
+
+def test_reading_from_message():
+    message = json.dumps({
+        "id": str(uuid.uuid4()), "device_id": "dev-001", "node_id": NODE["node_id"],
+        "soil_moisture": 31.5, "ambient_temp_c": -1.0, "recorded_at": NOW.isoformat(),
+    })
+    reading = reading_from_message(message)
+    assert reading["node_id"] == NODE["node_id"]
+    assert reading["recorded_at"] == NOW
+    assert reading["ambient_temp_c"] == -1.0
+    assert reading["leaf_wetness_pct"] is None
+
+    unregistered = json.dumps({"device_id": "dev-999", "node_id": None, "recorded_at": NOW.isoformat()})
+    assert reading_from_message(unregistered) is None
+
+
+@pytest.mark.asyncio
+async def test_only_state_changes_reach_the_database():
+    evaluator = _evaluator([_reading(30, 8.0)])
+    calls: list[tuple] = []
+
+    async def fake_apply_alerts(conn, rule_keys, triggered, only_node_ids=None, index=None):
+        calls.append((rule_keys, [a["rule_key"] for a in triggered], only_node_ids))
+
+    with patch("analytics.streaming.apply_alerts", side_effect=fake_apply_alerts):
+        await evaluator.handle(_reading(2, -1.5), NOW)   # frost starts
+        await evaluator.handle(_reading(1, -2.0), NOW)   # still frosty — nothing to write
+        await evaluator.handle(_reading(0, 6.0), NOW)    # back above 3°C
+
+    assert calls == [
+        ((), ["frost_critical"], [NODE["node_id"]]),
+        (("frost_critical",), [], [NODE["node_id"]]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_seeded_alerts_are_not_raised_again_and_old_readings_expire():
+    evaluator = _evaluator([_reading(30, 1.0)])  # frost_warning already active after warm-up
+    calls: list[tuple] = []
+
+    async def fake_apply_alerts(conn, rule_keys, triggered, only_node_ids=None, index=None):
+        calls.append((rule_keys, [a["rule_key"] for a in triggered]))
+
+    with patch("analytics.streaming.apply_alerts", side_effect=fake_apply_alerts):
+        await evaluator.handle(_reading(10, 2.0), NOW)
+        # Seven hours later the warm-up readings have left every window.
+        await evaluator.handle(_reading(-7 * 60, 10.0), NOW + timedelta(hours=7))
+
+    assert calls == [(("frost_warning",), [])]
+    assert [len(window) for window in evaluator._windows[NODE["node_id"]].values()] == [1, 1, 0]
+
+
+@pytest.mark.asyncio
+async def test_unknown_nodes_are_looked_up_once():
+    evaluator = _evaluator([])
+    conn = AsyncMock()
+    result = MagicMock()
+    result.mappings.return_value.first.return_value = None
+    conn.execute = AsyncMock(return_value=result)
+    evaluator._engine.connect = MagicMock(return_value=_async_ctx(conn))
+    stranger = dict(_reading(0, -5.0), node_id=str(uuid.uuid4()))
+
+    await evaluator.handle(stranger, NOW)
+    await evaluator.handle(stranger, NOW)
+
+    assert conn.execute.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_running_windows_agree_with_evaluating_the_whole_window():
+    node = dict(NODE, tier="precision_plus")
+    engine = MagicMock()
+    engine.begin = MagicMock(side_effect=lambda: _async_ctx(AsyncMock()))
+    evaluator = StreamingEvaluator(engine)
+    evaluator.seed(TelemetryFrame.from_rows([node], []), NOW)
+    rng = random.Random(7)
+    seen: list[dict] = []
+    raised: set[str] = set()
+
+    with patch("analytics.streaming.apply_alerts", new=AsyncMock()):
+        for step in range(120):  # 10 h at one reading per 5 minutes
+            now = NOW + timedelta(minutes=5 * step)
+            reading = dict(
+                node_id=node["node_id"],
+                recorded_at=now,
+                soil_moisture=rng.choice([None, rng.uniform(0, 30) if step < 60 else rng.uniform(60, 100)]),
+                ambient_temp_c=rng.uniform(-2, 5) if step % 40 < 10 else rng.uniform(15, 25),
+                ambient_humidity=rng.choice([None, rng.uniform(65, 95)]),
+                light_lux=None,
+                leaf_wetness_pct=rng.choice([None, 0.0, rng.uniform(1, 100)]),
+            )
+            seen.append(reading)
+            await evaluator.handle(reading, now)
+
+            frame = TelemetryFrame.from_rows([node], seen)
+            windows = evaluator._windows[node["node_id"]]
+            for name, rule in STREAMED_RULES.items():
+                expected = [(a["rule_key"], a["message"]) for a in rule.evaluate(frame, now)]
+                assert [(a["rule_key"], a["message"]) for a in rule.evaluate_window(node, windows[name])] == expected
+                raised.update(key for key, _ in expected)
+
+    assert raised >= {"frost_critical", "frost_warning", "moisture_dry", "moisture_wet", "mildew_moderate"}
+
+
+@pytest.mark.asyncio
+async def test_an_alert_resolved_elsewhere_is_raised_again_on_the_next_reading():
+    evaluator = _evaluator([_reading(30, -1.0)])  # frost_critical active after warm-up
+    index = ActiveAlertIndex()
+    result = MagicMock()
+    result.mappings.return_value.all.return_value = [dict(
+        id="a1", rule_key="frost_critical", node_id=NODE["node_id"],
+        block_id=NODE["block_id"], vineyard_id=NODE["vineyard_id"], cooldown_until=None,
+    )]
+    await index.load(AsyncMock(execute=AsyncMock(return_value=result)))
+    evaluator._index = index
+    calls: list[list[str]] = []
+
+    async def fake_apply_alerts(conn, rule_keys, triggered, only_node_ids=None, index=None):
+        calls.append([a["rule_key"] for a in triggered])
+
+    with patch("analytics.streaming.apply_alerts", side_effect=fake_apply_alerts):
+        await evaluator.handle(_reading(10, -1.5), NOW)  # still active: nothing to write
+        index.discard("a1")  # an operator resolved it through the API
+        await evaluator.handle(_reading(5, -2.0), NOW)
+
+    assert calls == [["frost_critical"]]
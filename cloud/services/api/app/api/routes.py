@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from collections.abc import AsyncIterator
 
-from fastapi import APIRouter, Depends, Response, status
+from fastapi import APIRouter, Depends, Header, Response, status
 from redis.asyncio import Redis
 from sse_starlette.sse import EventSourceResponse
 from sqlalchemy import select
@@ -15,6 +15,9 @@ from .v1 import auth, vineyards, blocks, nodes, alerts, recommendations, dashboa
 
 router = APIRouter()
 
+_STREAM_READ_COUNT = 100
+_STREAM_BLOCK_MS = 15_000
+
 
 # ---------------------------------------------------------------------------
 # System / legacy routes
@@ -43,25 +46,54 @@ async def create_reading(payload: schemas.TelemetryIn, session: AsyncSession = D
     return Response(status_code=status.HTTP_202_ACCEPTED)
 
 
-async def telemetry_event_stream(redis: Redis) -> AsyncIterator[dict[str, str]]:
-    pubsub = redis.pubsub()
+def _as_str(value: str | bytes) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+async def telemetry_event_stream(redis: Redis, last_event_id: str | None = None) -> AsyncIterator[dict[str, str]]:
     settings = await get_api_settings()
-    await pubsub.subscribe(settings.redis.telemetry_channel)
+    if settings.redis.telemetry_mode == "stream":
+        events = _telemetry_stream_events(redis, settings.redis.telemetry_stream, last_event_id or "$")
+    else:
+        events = _telemetry_pubsub_events(redis, settings.redis.telemetry_channel)
+    async for event in events:
+        yield event
+
+
+async def _telemetry_pubsub_events(redis: Redis, channel: str) -> AsyncIterator[dict[str, str]]:
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(channel)
     try:
         async for message in pubsub.listen():
             if message["type"] == "message":
-                payload = message["data"]
-                if isinstance(payload, bytes):
-                    payload = payload.decode("utf-8")
-                yield {"data": payload}
+                yield {"data": _as_str(message["data"])}
     finally:
-        await pubsub.unsubscribe(settings.redis.telemetry_channel)
+        await pubsub.unsubscribe(channel)
         await pubsub.close()
 
 
+async def _telemetry_stream_events(redis: Redis, stream: str, last_id: str) -> AsyncIterator[dict[str, str]]:
+    """Relay stream entries as SSE events whose id is the stream entry id.
+
+    Browsers send the last seen id back as ``Last-Event-ID`` on reconnect, so
+    a client picks up exactly where it left off while the entry is retained.
+    """
+    while True:
+        response = await redis.xread({stream: last_id}, count=_STREAM_READ_COUNT, block=_STREAM_BLOCK_MS)
+        for _stream, entries in response or ():
+            for entry_id, fields in entries:
+                last_id = _as_str(entry_id)
+                data = fields.get(b"data", fields.get("data"))
+                if data is not None:
+                    yield {"id": last_id, "data": _as_str(data)}
+
+
 @router.get("/streams/telemetry", dependencies=[Depends(api_key_auth)])
-async def stream_telemetry(redis: Redis = Depends(get_redis)) -> EventSourceResponse:
-    return EventSourceResponse(telemetry_event_stream(redis))
+async def stream_telemetry(
+    redis: Redis = Depends(get_redis),
+    last_event_id: str | None = Header(default=None),
+) -> EventSourceResponse:
+    return EventSourceResponse(telemetry_event_stream(redis, last_event_id))
 
 
 # ---------------------------------------------------------------------------
@@ -3,13 +3,15 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ... import models, schemas
+from ...config import ApiSettings
 from ...database import get_session
-from ...dependencies import get_current_user, require_operator
+from ...dependencies import get_api_settings, get_current_user, require_operator
+from ...events import publish_alert_resolved
 
 router = APIRouter(tags=["alerts"])
 
@@ -46,7 +48,9 @@ async def list_alerts(
 @router.post("/alerts/{alert_id}/resolve", response_model=schemas.AlertOut)
 async def resolve_alert(
     alert_id: UUID,
+    request: Request,
     session: AsyncSession = Depends(get_session),
+    settings: ApiSettings = Depends(get_api_settings),
     _current_user: schemas.UserOut = Depends(require_operator),
 ) -> schemas.AlertOut:
     """Resolve an active alert (operator+ only)."""
@@ -66,4 +70,5 @@ async def resolve_alert(
     )
     await session.commit()
     updated_row = update_result.fetchone()
+    await publish_alert_resolved(getattr(request.app.state, "redis", None), settings, str(alert_id))
     return schemas.AlertOut(**updated_row._mapping)
@@ -8,7 +8,7 @@ from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ... import models, schemas
-from ...database import get_session
+from ...database import get_session, latest_readings
 from ...dependencies import get_current_user, require_operator
 
 router = APIRouter(tags=["blocks"])
@@ -119,3 +119,23 @@ async def get_block_telemetry(
     result = await session.execute(query)
     rows = result.fetchall()
     return [schemas.TelemetryOut(**row._mapping) for row in rows]
+
+
+@router.get("/blocks/{block_id}/telemetry/latest", response_model=list[schemas.TelemetryOut])
+async def get_block_latest_telemetry(
+    block_id: UUID,
+    hours: int = Query(default=24, ge=1, le=720),
+    session: AsyncSession = Depends(get_session),
+    _current_user: schemas.UserOut = Depends(get_current_user),
+) -> list[schemas.TelemetryOut]:
+    """Return the newest reading of each node in a block (nodes silent for ``hours`` are left out)."""
+    br = await session.execute(
+        select(models.blocks).where(models.blocks.c.id == block_id)
+    )
+    if br.fetchone() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Block not found")
+
+    since = datetime.now(tz=timezone.utc) - timedelta(hours=hours)
+    result = await session.execute(latest_readings(models.nodes.c.block_id == block_id, since=since))
+    rows = result.fetchall()
+    return [schemas.TelemetryOut(**row._mapping) for row in rows]
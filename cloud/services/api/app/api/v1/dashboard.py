@@ -8,7 +8,7 @@ from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ... import models, schemas
-from ...database import get_session
+from ...database import get_session, rollups_available
 from ...dependencies import get_current_user
 
 router = APIRouter(tags=["dashboard"])
@@ -89,8 +89,21 @@ async def get_dashboard_overview(
         last_reading_at: datetime | None = None
 
         if node_ids:
-            telem_result = await session.execute(
-                select(
+            if await rollups_available(session):
+                # Hourly rollup: the three whole hours before this one, plus this one so far
+                hourly = models.telemetry_hourly.c
+                telem_query = select(
+                    (func.sum(hourly.soil_moisture_sum) / func.nullif(func.sum(hourly.soil_moisture_n), 0))
+                    .label("avg_soil_moisture"),
+                    (func.sum(hourly.ambient_temp_c_sum) / func.nullif(func.sum(hourly.ambient_temp_c_n), 0))
+                    .label("avg_temp"),
+                    func.max(hourly.last_reading_at).label("last_reading_at"),
+                ).where(
+                    hourly.device_id.in_([n._mapping["device_id"] for n in node_rows]),
+                    hourly.bucket >= three_hours_ago.replace(minute=0, second=0, microsecond=0),
+                )
+            else:
+                telem_query = select(
                     func.avg(models.telemetry_readings.c.soil_moisture).label("avg_soil_moisture"),
                     func.avg(models.telemetry_readings.c.ambient_temp_c).label("avg_temp"),
                     func.max(models.telemetry_readings.c.recorded_at).label("last_reading_at"),
@@ -98,7 +111,7 @@ async def get_dashboard_overview(
                     models.telemetry_readings.c.node_id.in_(node_ids),
                     models.telemetry_readings.c.recorded_at >= three_hours_ago,
                 )
-            )
+            telem_result = await session.execute(telem_query)
             telem_row = telem_result.fetchone()
             if telem_row is not None:
                 avg_soil_moisture = telem_row._mapping["avg_soil_moisture"]
@@ -3,13 +3,15 @@ from __future__ import annotations
 from datetime import datetime, timedelta, timezone
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ... import models, schemas
+from ...config import ApiSettings
 from ...database import get_session
-from ...dependencies import get_current_user, require_operator
+from ...dependencies import get_api_settings, get_current_user, require_operator
+from ...events import publish_node_provisioned
 
 router = APIRouter(tags=["nodes"])
 
@@ -54,7 +56,9 @@ async def list_unregistered_devices(
 @router.post("/nodes", response_model=schemas.NodeOut, status_code=status.HTTP_201_CREATED)
 async def create_node(
     payload: schemas.NodeCreate,
+    request: Request,
     session: AsyncSession = Depends(get_session),
+    settings: ApiSettings = Depends(get_api_settings),
     _current_user: schemas.UserOut = Depends(require_operator),
 ) -> schemas.NodeOut:
     """Provision a new node (operator+ only)."""
@@ -89,6 +93,12 @@ async def create_node(
     )
     await session.commit()
     row = result.fetchone()
+    await publish_node_provisioned(
+        getattr(request.app.state, "redis", None),
+        settings,
+        payload.device_id,
+        str(row._mapping["id"]),
+    )
     return schemas.NodeOut(**row._mapping)
 
 
@@ -23,6 +23,12 @@ class DatabaseSettings(BaseModel):
 class RedisSettings(BaseModel):
     url: str = Field(default="redis://redis:6379/0")
     telemetry_channel: str = Field(default="telemetry-stream")
+    node_events_channel: str = Field(default="node-events")
+    # Analytics drops resolved alerts from its in-memory cooldown index on these
+    alert_events_channel: str = Field(default="alert-events")
+    # "stream" relays the ingestor's capped Redis Stream so SSE clients resume via Last-Event-ID
+    telemetry_mode: Literal["pubsub", "stream"] = "pubsub"
+    telemetry_stream: str = Field(default="telemetry")
 
 
 class ApiSettings(BaseSettings):
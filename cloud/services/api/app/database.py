@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Any
 
+from sqlalchemy import Select, func, select, true
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
+from . import models
 from .config import ApiSettings, get_settings
 
 _engine: AsyncEngine | None = None
 _session_factory: async_sessionmaker[AsyncSession] | None = None
+_rollups_available: bool | None = None
 
 
 async def get_engine() -> AsyncEngine:
@@ -25,3 +30,29 @@ async def get_session() -> AsyncIterator[AsyncSession]:
         _session_factory = async_sessionmaker(engine, expire_on_commit=False)
     async with _session_factory() as session:
         yield session
+
+
+async def rollups_available(session: AsyncSession) -> bool:
+    """Whether the telemetry rollup views exist (TimescaleDB); checked once per process."""
+    global _rollups_available
+    if _rollups_available is None:
+        result = await session.execute(select(func.to_regclass(models.telemetry_hourly.name)))
+        _rollups_available = result.scalar() is not None
+    return _rollups_available
+
+
+def latest_readings(*node_filters: Any, since: datetime) -> Select:
+    """Newest reading recorded at or after ``since`` for each node matching ``node_filters``.
+
+    A LATERAL ``ORDER BY recorded_at DESC LIMIT 1`` per node, i.e. one probe
+    of ``idx_telemetry_device`` each; nodes without a reading get no row.
+    """
+    readings = models.telemetry_readings
+    latest = (
+        select(readings)
+        .where(readings.c.device_id == models.nodes.c.device_id, readings.c.recorded_at >= since)
+        .order_by(readings.c.recorded_at.desc())
+        .limit(1)
+        .lateral("latest")
+    )
+    return select(latest).select_from(models.nodes.join(latest, true())).where(*node_filters)
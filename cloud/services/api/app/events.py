@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import json
+
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from .config import ApiSettings
+
+logger = structlog.get_logger()
+
+
+async def publish_node_provisioned(
+    redis: Redis | None, settings: ApiSettings, device_id: str, node_id: str
+) -> None:
+    """Tell the ingestors a device now maps to a node so they drop cached lookups.
+
+    Best effort: the ingestor cache TTL bounds staleness if the publish is lost.
+    """
+    if redis is None:
+        return
+    message = json.dumps({"event": "node_provisioned", "device_id": device_id, "node_id": node_id})
+    try:
+        await redis.publish(settings.redis.node_events_channel, message)
+    except RedisError as exc:
+        logger.warning("node_event_publish_failed", device=device_id, error=str(exc))
+
+
+async def publish_alert_resolved(redis: Redis | None, settings: ApiSettings, alert_id: str) -> None:
+    """Tell the analytics workers an alert was resolved by hand.
+
+    Best effort: analytics reloads its active-alert index periodically, so a
+    lost message only delays a re-raise until then.
+    """
+    if redis is None:
+        return
+    message = json.dumps({"event": "alert_resolved", "alert_id": alert_id})
+    try:
+        await redis.publish(settings.redis.alert_events_channel, message)
+    except RedisError as exc:
+        logger.warning("alert_event_publish_failed", alert_id=alert_id, error=str(exc))
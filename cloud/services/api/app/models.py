@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     Date,
@@ -101,6 +102,24 @@ telemetry_readings = Table(
     Column("recorded_at", DateTime(timezone=True), server_default=text("now()"), nullable=False),
 )
 
+# Hourly per-device rollup of telemetry_readings: a continuous aggregate
+# (cloud/infrastructure/sql/continuous_aggregates.sql), never created here.
+telemetry_hourly = Table(
+    "telemetry_hourly",
+    metadata_obj,
+    Column("device_id", String(length=64), nullable=False),
+    Column("bucket", DateTime(timezone=True), nullable=False),
+    Column("readings", BigInteger, nullable=False),
+    Column("last_reading_at", DateTime(timezone=True), nullable=False),
+    Column("soil_moisture_sum", Float, nullable=True),
+    Column("soil_moisture_n", BigInteger, nullable=False),
+    Column("ambient_temp_c_sum", Float, nullable=True),
+    Column("ambient_temp_c_n", BigInteger, nullable=False),
+    Column("ambient_temp_c_min", Float, nullable=True),
+    Column("ambient_temp_c_max", Float, nullable=True),
+    Column("light_lux_max", Float, nullable=True),
+)
+
 alerts = Table(
     "alerts",
     metadata_obj,
@@ -25,11 +25,12 @@ For operator/admin routes that use require_operator instead of get_current_user:
 """
 from __future__ import annotations
 
+import json
 import uuid
 from collections.abc import AsyncIterator
 from datetime import datetime, timezone
 from typing import Any
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
 import os
 
@@ -487,6 +488,34 @@ class TestAlertEndpoints:
         finally:
             app.dependency_overrides.pop(get_session, None)
 
+    def test_resolve_alert_publishes_event(self):
+        """A manual resolve is announced so analytics drops the alert from its cooldown index."""
+        published: list[tuple[str, bytes]] = []
+
+        class _FakeRedis:
+            async def publish(self, channel, message):
+                published.append((channel, message))
+
+        resolved_alert = {**_FAKE_ALERT, "is_active": False, "resolved_at": _NOW}
+        responses = [
+            _make_result(rows=[_FAKE_USER_OPERATOR]),
+            _make_result(rows=[_FAKE_USER_OPERATOR]),
+            _make_result(rows=[_FAKE_ALERT]),
+            _make_result(rows=[resolved_alert]),
+        ]
+        app.dependency_overrides[get_session] = _session_override(responses)
+        app.state.redis = _FakeRedis()
+        try:
+            from fastapi.testclient import TestClient
+            resp = TestClient(app).post(f"/api/v1/alerts/{_ALERT_ID}/resolve", headers=_jwt_headers())
+            assert resp.status_code == 200
+            assert [(channel, json.loads(message)) for channel, message in published] == [
+                (SETTINGS.redis.alert_events_channel, {"event": "alert_resolved", "alert_id": str(_ALERT_ID)})
+            ]
+        finally:
+            del app.state.redis
+            app.dependency_overrides.pop(get_session, None)
+
     def test_resolve_alert_not_found(self):
         """POST /api/v1/alerts/{unknown}/resolve → 404."""
         responses = [
@@ -544,6 +573,43 @@ class TestBlockEndpoints:
         finally:
             app.dependency_overrides.pop(get_session, None)
 
+    def test_get_block_latest_telemetry(self):
+        """GET /api/v1/blocks/{id}/telemetry/latest returns one reading per node from a lateral query."""
+        reading = {
+            "id": uuid.uuid4(),
+            "device_id": _FAKE_NODE["device_id"],
+            "node_id": _NODE_ID,
+            "soil_moisture": 21.5,
+            "soil_temp_c": 14.0,
+            "ambient_temp_c": 2.5,
+            "ambient_humidity": 80.0,
+            "light_lux": 0.0,
+            "battery_voltage": 3.8,
+            "leaf_wetness_pct": None,
+            "pressure_hpa": None,
+            "recorded_at": _NOW,
+        }
+        shared = MockSession([
+            _make_result(rows=[_FAKE_BLOCK]),  # block SELECT
+            _make_result(rows=[reading]),      # latest reading per node
+        ])
+        shared.execute = AsyncMock(side_effect=shared.execute)
+
+        async def _dep() -> AsyncIterator[MockSession]:
+            yield shared
+
+        app.dependency_overrides[get_session] = _dep
+        try:
+            from fastapi.testclient import TestClient
+            resp = TestClient(app).get(
+                f"/api/v1/blocks/{_BLOCK_ID}/telemetry/latest", headers=API_KEY_HEADERS
+            )
+            assert resp.status_code == 200
+            assert [r["ambient_temp_c"] for r in resp.json()] == [2.5]
+            assert "JOIN LATERAL" in str(shared.execute.await_args_list[1].args[0])
+        finally:
+            app.dependency_overrides.pop(get_session, None)
+
     def test_create_block_operator(self):
         """POST /api/v1/blocks with operator JWT creates block."""
         new_block = {**_FAKE_BLOCK, "id": uuid.uuid4(), "name": "Block B"}
@@ -695,3 +761,54 @@ class TestRecommendationEndpoints:
             assert resp.status_code == 404
         finally:
             app.dependency_overrides.pop(get_session, None)
+
+
+# ---------------------------------------------------------------------------
+# Telemetry stream relay
+# ---------------------------------------------------------------------------
+
+class _FakeStreamRedis:
+    """Serves XREAD from an in-memory list of (entry_id, fields) entries."""
+
+    def __init__(self, entries: list[tuple[bytes, dict[bytes, bytes]]]):
+        self._entries = entries
+        self.reads: list[str] = []
+
+    async def xread(self, streams: dict[str, str], count: int, block: int):
+        ((stream, last_id),) = streams.items()
+        self.reads.append(last_id)
+        if last_id == "$":
+            last_id = "0-0"
+        newer = [e for e in self._entries if e[0].decode() > last_id][:count]
+        return [[stream.encode(), newer]] if newer else []
+
+
+class TestTelemetryStreamRelay:
+    @staticmethod
+    async def _take(events: AsyncIterator[dict[str, str]], n: int) -> list[dict[str, str]]:
+        out = []
+        async for event in events:
+            out.append(event)
+            if len(out) == n:
+                break
+        return out
+
+    def test_stream_mode_resumes_after_last_event_id(self, monkeypatch):
+        import asyncio
+
+        from app.api.routes import telemetry_event_stream
+
+        monkeypatch.setattr(SETTINGS.redis, "telemetry_mode", "stream")
+        redis = _FakeStreamRedis([
+            (b"1-0", {b"data": b'{"device_id":"vg-node-001"}'}),
+            (b"2-0", {b"data": b'{"device_id":"vg-node-002"}'}),
+            (b"3-0", {b"data": b'{"device_id":"vg-node-003"}'}),
+        ])
+
+        events = asyncio.run(self._take(telemetry_event_stream(redis, last_event_id="1-0"), 2))
+
+        assert redis.reads[0] == "1-0"
+        assert events == [
+            {"id": "2-0", "data": '{"device_id":"vg-node-002"}'},
+            {"id": "3-0", "data": '{"device_id":"vg-node-003"}'},
+        ]
@@ -0,0 +1,328 @@
+"""End-to-end ingest benchmark: handle_message → worker pool → DB → Redis.
+
+Payloads come from the demo simulator's ``NodeState`` (v1, optionally mixed
+with legacy payloads).  Each configuration gets a fresh database and a
+fakeredis publisher; latency is measured from ``handle_message`` to the end
+of the batch write (commit + publish) for every reading.
+
+    python -m benchmarks.bench_ingest [--messages 20000] [--nodes 200]
+        [--batch-sizes 1,50,500] [--workers 1,4] [--legacy-ratio 0.1] [--queue-depth 1000]
+        [--dsn postgresql+asyncpg://...] [--output bench_ingest.json]
+
+Without ``--dsn`` a temporary SQLite file stands in for TimescaleDB; compare
+results across releases only when they were taken against the same store.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import structlog
+from fakeredis import FakeAsyncRedis
+from sqlalchemy import delete, insert, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from ingestor import codec
+from ingestor.batching import TelemetryBatcher
+from ingestor.config import IngestorSettings
+from ingestor.dedup import Deduplicator, DedupWindow
+from ingestor.health import NodeHealthWriter
+from ingestor.main import TelemetryWriter, handle_message
+from ingestor.models import nodes_table, telemetry_table
+from ingestor.node_cache import NodeIdCache, warm_node_cache
+from ingestor.workers import WorkerPool
+
+_REPO_ROOT = Path(__file__).resolve().parents[4]
+sys.path.insert(0, str(_REPO_ROOT / "tools" / "simulator"))
+from simulator import NodeState, load_scenario  # noqa: E402
+
+# SQLite has neither gen_random_uuid() nor now(); give it equivalent defaults.
+_SQLITE_SCHEMA = (
+    """
+    CREATE TABLE nodes (
+        id CHAR(32) PRIMARY KEY,
+        block_id CHAR(32),
+        device_id VARCHAR(64) NOT NULL UNIQUE,
+        name VARCHAR,
+        tier VARCHAR(16),
+        last_seen_at DATETIME,
+        battery_voltage FLOAT,
+        battery_pct INTEGER,
+        rssi_last INTEGER,
+        status VARCHAR(16)
+    )
+    """,
+    """
+    CREATE TABLE telemetry_readings (
+        id CHAR(32) PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+        device_id VARCHAR(64) NOT NULL,
+        node_id CHAR(32),
+        soil_moisture FLOAT NOT NULL,
+        soil_temp_c FLOAT NOT NULL,
+        ambient_temp_c FLOAT NOT NULL,
+        ambient_humidity FLOAT NOT NULL,
+        light_lux FLOAT NOT NULL,
+        battery_voltage FLOAT NOT NULL,
+        leaf_wetness_pct FLOAT,
+        pressure_hpa FLOAT,
+        schema_version VARCHAR(8),
+        recorded_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+)
+
+
+# ---------------------------------------------------------------------------
+# Payloads
+# ---------------------------------------------------------------------------
+
+def _node_states(count: int) -> list[NodeState]:
+    """``count`` simulator nodes, cycling through the demo scenario's profiles."""
+    templates = load_scenario("demo")["nodes"]
+    states = []
+    for i in range(count):
+        cfg = dict(templates[i % len(templates)])
+        cfg["device_id"] = f"vg-bench-{i:05d}"
+        states.append(NodeState(cfg))
+    return states
+
+
+def _as_legacy(payload: dict[str, Any]) -> dict[str, Any]:
+    sensors, meta = payload["sensors"], payload["meta"]
+    return {
+        "deviceId": payload["device_id"],
+        "soilMoisture": sensors["soil_moisture_pct"],
+        "soilTempC": sensors["soil_temp_c"],
+        "ambientTempC": sensors["ambient_temp_c"],
+        "ambientHumidity": sensors["ambient_humidity_pct"],
+        "lightLux": sensors["light_lux"],
+        "batteryVoltage": meta["battery_voltage"],
+        "timestamp": payload["timestamp"],
+    }
+
+
+def build_payloads(messages: int, nodes: list[NodeState], legacy_ratio: float) -> list[bytes]:
+    rng = random.Random(42)
+    payloads = []
+    for i in range(messages):
+        payload = nodes[i % len(nodes)].build_payload()
+        if rng.random() < legacy_ratio:
+            payload = _as_legacy(payload)
+        payloads.append(json.dumps(payload).encode())
+    return payloads
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+async def _reset_store(engine: AsyncEngine, device_ids: list[str]) -> None:
+    async with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            for ddl in _SQLITE_SCHEMA:
+                await conn.execute(text(ddl))
+        else:
+            await conn.execute(delete(telemetry_table).where(telemetry_table.c.device_id.like("vg-bench-%")))
+            await conn.execute(delete(nodes_table).where(nodes_table.c.device_id.like("vg-bench-%")))
+        await conn.execute(
+            insert(nodes_table),
+            [{"id": uuid.uuid4(), "device_id": d, "status": "provisioned"} for d in device_ids],
+        )
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class _Discard:
+    """Dead-letter stand-in; the benchmark only feeds valid payloads."""
+
+    def write(self, raw: str, error: str) -> None:
+        pass
+
+
+async def _build_writer(
+    engine: AsyncEngine, redis: FakeAsyncRedis, settings: IngestorSettings
+) -> tuple[TelemetryWriter, NodeHealthWriter]:
+    """The writer as ``main.run_async`` builds it, minus admission control (never under pressure here)."""
+    node_cache = NodeIdCache(
+        max_size=settings.node_cache.max_size,
+        ttl_seconds=settings.node_cache.ttl_seconds,
+        negative_ttl_seconds=settings.node_cache.negative_ttl_seconds,
+    )
+    async with engine.connect() as conn:
+        await warm_node_cache(conn, node_cache, settings.node_cache.max_size)
+    health = NodeHealthWriter(engine, interval_seconds=settings.node_health.flush_interval_seconds)
+    dedup = Deduplicator(
+        DedupWindow(window_seconds=settings.dedup.window_seconds, max_size=settings.dedup.max_size),
+        redis=redis if settings.dedup.shared else None,
+        key_prefix=settings.dedup.key_prefix,
+        ttl_seconds=settings.dedup.window_seconds,
+        claim_ttl_seconds=settings.dedup.claim_seconds,
+    )
+    writer = TelemetryWriter(
+        engine, redis, settings, node_cache=node_cache, health=health, dedup=dedup, dead_letters=_Discard()
+    )
+    return writer, health
+
+
+async def run_case(
+    settings: IngestorSettings,
+    payloads: list[bytes],
+    device_ids: list[str],
+    *,
+    batch_size: int,
+    workers: int,
+) -> dict[str, Any]:
+    dsn = settings.database.dsn
+    if dsn.startswith("sqlite"):
+        dsn = f"sqlite+aiosqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}"
+    engine = create_async_engine(dsn, pool_size=workers + 1, connect_args=_connect_args(dsn))
+    await _reset_store(engine, device_ids)
+    redis = FakeAsyncRedis()
+    writer, health = await _build_writer(engine, redis, settings)
+
+    started: dict[int, float] = {}
+    latencies: list[float] = []
+
+    async def timed_write(batch: list[dict[str, Any]]) -> None:
+        await writer.write(batch)
+        done = time.perf_counter()
+        latencies.extend(done - started.pop(id(n)) for n in batch)
+
+    class _Stamp:
+        """Timestamps each reading with ``t_in`` as handle_message hands it on."""
+
+        t_in = 0.0
+
+        async def add(self, normalised: dict[str, Any]) -> None:
+            started[id(normalised)] = self.t_in
+            await pool.add(normalised)
+
+    pool = WorkerPool(
+        lambda: TelemetryBatcher(timed_write, max_rows=batch_size, linger_ms=settings.batch.linger_ms),
+        size=workers,
+        queue_depth=settings.workers.queue_depth,
+    )
+    pool.start()
+    health.start()
+    stamp, dead_letters = _Stamp(), _Discard()
+
+    t0 = time.perf_counter()
+    for raw in payloads:
+        stamp.t_in = time.perf_counter()
+        await handle_message(raw, stamp, dead_letters)
+    await pool.close()
+    elapsed = time.perf_counter() - t0
+    await health.close()
+    await redis.aclose()
+    await engine.dispose()
+
+    return {
+        "batch_size": batch_size,
+        "workers": workers,
+        "messages": len(latencies),
+        "seconds": round(elapsed, 3),
+        "msgs_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(40))
+    # A fresh SQLite file is created per case when no DSN is given.
+    dsn = args.dsn or "sqlite+aiosqlite://"
+    # The default linger would dominate latency at small batch sizes; keep it short.
+    settings = IngestorSettings(
+        database={"dsn": dsn},
+        batch={"linger_ms": args.linger_ms},
+        workers={"queue_depth": args.queue_depth},
+        node_health={"flush_interval_seconds": 1.0},
+    )
+
+    nodes = _node_states(args.nodes)
+    device_ids = [n.device_id for n in nodes]
+    payloads = build_payloads(args.messages, nodes, args.legacy_ratio)
+
+    results = []
+    for workers in args.workers:
+        for batch_size in args.batch_sizes:
+            result = await run_case(settings, payloads, device_ids, batch_size=batch_size, workers=workers)
+            results.append(result)
+            print(
+                f"workers={workers:<3} batch={batch_size:<5} "
+                f"{result['msgs_per_sec']:>10,.0f} msg/s  "
+                f"p50={result['p50_ms']:.2f}ms  p99={result['p99_ms']:.2f}ms"
+            )
+
+    return {
+        "benchmark": "ingest",
+        "started_at": datetime.now(tz=timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "store": dsn.split(":", 1)[0],
+            "json_codec": codec.backend,
+        },
+        "parameters": {
+            "messages": args.messages,
+            "nodes": args.nodes,
+            "legacy_ratio": args.legacy_ratio,
+            "linger_ms": args.linger_ms,
+            "queue_depth": args.queue_depth,
+        },
+        "results": results,
+        "summary": {
+            "best_msgs_per_sec": max(r["msgs_per_sec"] for r in results),
+            "median_p99_ms": statistics.median(r["p99_ms"] for r in results),
+        },
+    }
+
+
+def _connect_args(dsn: str) -> dict[str, Any]:
+    # Concurrent workers share one SQLite file; wait on its write lock instead of failing.
+    return {"timeout": 30} if dsn.startswith("sqlite") else {}
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 50, 500])
+    parser.add_argument("--workers", type=_int_list, default=[1, 4])
+    parser.add_argument("--legacy-ratio", type=float, default=0.1)
+    parser.add_argument("--linger-ms", type=int, default=5)
+    # Messages are fed as fast as possible, so latency includes time spent queued.
+    parser.add_argument("--queue-depth", type=int, default=1000)
+    parser.add_argument("--dsn", help="SQLAlchemy async DSN (default: temporary SQLite file)")
+    parser.add_argument("--output", type=Path, default=Path("bench_ingest.json"))
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
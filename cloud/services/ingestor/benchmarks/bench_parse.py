@@ -0,0 +1,79 @@
+"""Micro-benchmark: payload parsing throughput, fast path vs. Pydantic models.
+
+Runs in a single process, so the numbers are messages per second per core.
+
+    python -m benchmarks.bench_parse [--messages 50000] [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+
+from ingestor.schemas import parse_message, parse_payload
+
+
+def _payloads(count: int) -> list[bytes]:
+    rng = random.Random(42)
+    payloads = []
+    for i in range(count):
+        payloads.append(json.dumps({
+            "schema_version": "1.0",
+            "device_id": f"vg-node-{i % 500:03d}",
+            "gateway_id": "vg-gw-001",
+            "timestamp": 1700000000 + i,
+            "tier": "precision_plus",
+            "sensors": {
+                "soil_moisture_pct": round(rng.uniform(10, 60), 2),
+                "soil_temp_c": round(rng.uniform(5, 30), 2),
+                "ambient_temp_c": round(rng.uniform(-5, 35), 2),
+                "ambient_humidity_pct": round(rng.uniform(30, 95), 2),
+                "pressure_hpa": round(rng.uniform(990, 1030), 1),
+                "light_lux": round(rng.uniform(0, 90000), 1),
+                "leaf_wetness_pct": round(rng.uniform(0, 90), 1),
+            },
+            "meta": {
+                "battery_voltage": 3.87,
+                "battery_pct": 72,
+                "rssi": rng.randint(-110, -60),
+                "snr": 7.5,
+                "sensor_ok": True,
+            },
+            "_sequence": i,
+        }).encode())
+    return payloads
+
+
+def _model_path(data: bytes) -> dict:
+    # What handle_message did before the fast path existed.
+    return parse_payload(json.loads(data))
+
+
+def _best_rate(fn, payloads: list[bytes], repeat: int) -> float:
+    best = 0.0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for data in payloads:
+            fn(data)
+        best = max(best, len(payloads) / (time.perf_counter() - t0))
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = _payloads(args.messages)
+    assert parse_message(payloads[0]) == _model_path(payloads[0])
+
+    model = _best_rate(_model_path, payloads, args.repeat)
+    fast = _best_rate(parse_message, payloads, args.repeat)
+    print(f"model path : {model:>10,.0f} msg/s/core")
+    print(f"fast path  : {fast:>10,.0f} msg/s/core  ({fast / model:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any
+
+import structlog
+
+from . import codec, metrics
+from .workers import WorkerPool
+
+logger = structlog.get_logger()
+
+# Weight of the newest commit in the smoothed commit latency.
+_EWMA_ALPHA = 0.2
+# How soon to come back while a backlog drains and the DB keeps up.
+_DRAIN_POLL_SECONDS = 0.05
+
+
+def _segment_index(path: Path) -> int:
+    return int(path.stem.split("-", 1)[1])  # segment-<index>; requeued segments go below zero
+
+
+class SpillJournal:
+    """Append-only on-disk journal of validated readings, in segment files.
+
+    Readings are appended to the newest segment; replay consumes the oldest
+    segment line by line and deletes it once fully read, so disk usage
+    shrinks as the backlog drains.  ``requeue`` writes readings back as a
+    new oldest segment, so they are read again before anything else.
+    Segments left over from a previous run are picked up on start.  Appends
+    are buffered and flushed by ``flush`` (called every admission tick), so
+    a crash loses at most one tick.
+    """
+
+    def __init__(self, directory: Path, *, segment_bytes: int, max_bytes: int) -> None:
+        self._dir = directory
+        self._segment_bytes = segment_bytes
+        self._max_bytes = max_bytes
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._segments = sorted(self._dir.glob("segment-*.jsonl"), key=_segment_index)
+        self._next_index = _segment_index(self._segments[-1]) + 1 if self._segments else 0
+        self._bytes = sum(p.stat().st_size for p in self._segments)
+        self._writer: IO[str] | None = None
+        self._writer_bytes = 0
+        self._reader: IO[str] | None = None
+        # Where reading stopped in a segment set aside for a requeued one.
+        self._offsets: dict[Path, int] = {}
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __bool__(self) -> bool:
+        return self._bytes > 0 or self._writer_bytes > 0
+
+    def full(self) -> bool:
+        return self._bytes >= self._max_bytes
+
+    def append(self, normalised: dict[str, Any]) -> None:
+        if self._writer is None or self._writer_bytes >= self._segment_bytes:
+            self._roll()
+        line = codec.dumps({**normalised, "recorded_at": normalised["recorded_at"].isoformat()}) + "\n"
+        self._writer.write(line)
+        self._writer_bytes += len(line)
+        self._bytes += len(line)
+
+    def flush(self) -> None:
+        if self._writer is not None:
+            self._writer.flush()
+
+    def requeue(self, readings: list[dict[str, Any]]) -> None:
+        """Put ``readings`` back at the front of the journal, ahead of everything else."""
+        if not readings:
+            return
+        if self._reader is not None:
+            # Finish the requeued readings before the rest of this segment.
+            self._offsets[self._segments[0]] = self._reader.tell()
+            self._reader.close()
+            self._reader = None
+        first = _segment_index(self._segments[0]) if self._segments else self._next_index
+        path = self._dir / f"segment-{first - 1}.jsonl"
+        lines = "".join(
+            codec.dumps({**normalised, "recorded_at": normalised["recorded_at"].isoformat()}) + "\n"
+            for normalised in readings
+        )
+        with path.open("w", encoding="utf-8") as fh:
+            fh.write(lines)
+        self._segments.insert(0, path)
+        self._bytes += len(lines)
+
+    def read(self, limit: int) -> list[dict[str, Any]]:
+        """Take up to ``limit`` readings off the front of the journal."""
+        readings: list[dict[str, Any]] = []
+        while len(readings) < limit:
+            if self._reader is None:
+                if not self._segments:
+                    break
+                if self._segments[0] == self._writer_path():
+                    if self._writer_bytes == 0:
+                        break
+                    self._roll()  # only the live segment is left: close it so it can be consumed
+                self._reader = self._segments[0].open("r", encoding="utf-8")
+                offset = self._offsets.pop(self._segments[0], None)
+                if offset is not None:
+                    self._reader.seek(offset)
+            line = self._reader.readline()
+            if not line:
+                self._reader.close()
+                self._reader = None
+                self._segments.pop(0).unlink()
+                continue
+            self._bytes -= len(line)
+            reading = codec.loads(line)
+            reading["recorded_at"] = datetime.fromisoformat(reading["recorded_at"])
+            readings.append(reading)
+        if not self._segments:
+            self._bytes = 0
+        return readings
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._reader is not None:
+            self._offsets[self._segments[0]] = self._reader.tell()
+            self._reader.close()
+            self._reader = None
+        # Cut what was already read off partly read segments, so a restart does not replay it.
+        for path, offset in self._offsets.items():
+            with path.open("r", encoding="utf-8") as fh:
+                fh.seek(offset)
+                rest = fh.read()
+            path.write_text(rest, encoding="utf-8")
+        self._offsets.clear()
+
+    def _writer_path(self) -> Path | None:
+        return Path(self._writer.name) if self._writer is not None else None
+
+    def _roll(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        path = self._dir / f"segment-{self._next_index}.jsonl"
+        self._next_index += 1
+        self._segments.append(path)
+        self._writer = path.open("a", encoding="utf-8")
+        self._writer_bytes = 0
+
+
+class AdmissionController:
+    """Admit readings to the worker pool, or spill them to disk under pressure.
+
+    Pressure is a worker queue deeper than ``max_queue_depth``, a smoothed
+    commit latency above ``max_commit_seconds``, or a failed batch write.
+    While there is pressure, or anything is still journalled, new readings
+    are appended to the journal, so a device's readings reach the writer
+    (and node health and the live channel) in order.  The journal is fed back in ``replay_batch``
+    chunks for as long as the queues are below ``resume_queue_depth``, so
+    a backlog drains at the speed of the DB; under pressure only one chunk
+    goes per tick, as a probe.  The writer reports commit times and hands
+    back batches that failed for a transient reason, which go to the front
+    of the journal, so a DB outage costs disk space rather than data.  Only
+    a full journal makes ``add`` block on the pool again.
+    """
+
+    def __init__(
+        self,
+        pool: WorkerPool,
+        journal: SpillJournal,
+        *,
+        max_queue_depth: int,
+        resume_queue_depth: int,
+        max_commit_seconds: float,
+        replay_batch: int,
+        check_interval_seconds: float,
+    ) -> None:
+        self._pool = pool
+        self._journal = journal
+        self._max_queue_depth = max_queue_depth
+        self._resume_queue_depth = resume_queue_depth
+        self._max_commit_seconds = max_commit_seconds
+        self._replay_batch = max(1, replay_batch)
+        self._interval = check_interval_seconds
+        self._commit_seconds = 0.0
+        self._write_failed = False
+        self._task: asyncio.Task[None] | None = None
+        self._stopping = asyncio.Event()
+
+    def under_pressure(self) -> bool:
+        return (
+            self._write_failed
+            or self._commit_seconds > self._max_commit_seconds
+            or self._pool.qsize() >= self._max_queue_depth
+        )
+
+    async def add(self, normalised: dict[str, Any]) -> None:
+        if (self._journal or self.under_pressure()) and not self._journal.full():
+            self._journal.append(normalised)
+            metrics.MESSAGES_SPILLED.inc()
+            return
+        await self._pool.add(normalised)
+
+    def record_commit(self, seconds: float) -> None:
+        """Feed the DB stage time of a committed batch into the smoothed latency."""
+        self._write_failed = False
+        self._commit_seconds += _EWMA_ALPHA * (seconds - self._commit_seconds)
+
+    def spill_failed(self, batch: list[dict[str, Any]]) -> None:
+        """Journal a batch whose write failed transiently, at the front so it is replayed first."""
+        self._write_failed = True
+        self._journal.requeue(batch)
+        metrics.MESSAGES_SPILLED.inc(len(batch))
+        logger.warning("batch_spilled", rows=len(batch), journal_bytes=self._journal.size_bytes)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop replaying, close the pool, then the journal.
+
+        A replay chunk in flight is finished rather than cancelled, and
+        batches that fail while the pool flushes are still journalled;
+        whatever is left is replayed on the next start.
+        """
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self._pool.close()
+        self._journal.close()
+
+    async def tick(self) -> int:
+        """Flush the journal and replay while the pool has room; returns readings replayed."""
+        self._journal.flush()
+        metrics.JOURNAL_BYTES.set(self._journal.size_bytes)
+        metrics.ADMISSION_PRESSURE.set(1 if self.under_pressure() else 0)
+        replayed = 0
+        while self._journal and self._pool.qsize() < self._resume_queue_depth:
+            readings = self._journal.read(self._replay_batch)
+            for normalised in readings:
+                await self._pool.add(normalised)
+            replayed += len(readings)
+            if not readings or self.under_pressure() or self._stopping.is_set():
+                break
+        metrics.MESSAGES_REPLAYED.inc(replayed)
+        if replayed:
+            logger.info("journal_replayed", readings=replayed, remaining_bytes=self._journal.size_bytes)
+        return replayed
+
+    async def _run(self) -> None:
+        delay = self._interval
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.tick()
+            except Exception as exc:  # noqa: BLE001
+                logger.error("journal_replay_failed", error=str(exc))
+            # While a backlog drains and the DB keeps up, come back as soon as the workers made room.
+            delay = _DRAIN_POLL_SECONDS if self._journal and not self.under_pressure() else self._interval
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any, Protocol
+
+import structlog
+
+logger = structlog.get_logger()
+
+FlushCallback = Callable[[list[dict[str, Any]]], Awaitable[None]]
+
+
+class ReadingSink(Protocol):
+    """Anything that accepts validated readings: a batcher or a worker pool."""
+
+    async def add(self, normalised: dict[str, Any]) -> None: ...
+
+
+class TelemetryBatcher:
+    """Collect normalised readings and hand them to ``flush_cb`` in batches.
+
+    A batch is flushed as soon as it holds ``max_rows`` readings, or
+    ``linger_ms`` after its first reading arrived — whichever comes first.
+    ``add`` awaits the flush when the batch fills up, so a slow database
+    naturally applies backpressure to the caller.
+    """
+
+    def __init__(self, flush_cb: FlushCallback, *, max_rows: int, linger_ms: int) -> None:
+        self._flush_cb = flush_cb
+        self._max_rows = max(1, max_rows)
+        self._linger_s = max(0, linger_ms) / 1000.0
+        self._buffer: list[dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._linger_task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    async def add(self, normalised: dict[str, Any]) -> None:
+        self._buffer.append(normalised)
+        if len(self._buffer) >= self._max_rows:
+            await self.flush()
+        elif self._linger_task is None:
+            self._linger_task = asyncio.create_task(self._linger())
+
+    async def flush(self) -> None:
+        """Write out whatever is buffered right now."""
+        self._cancel_linger()
+        async with self._lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            await self._flush_cb(batch)
+
+    async def close(self) -> None:
+        """Flush the remaining readings; call once on shutdown."""
+        await self.flush()
+
+    async def _linger(self) -> None:
+        await asyncio.sleep(self._linger_s)
+        # Detach before flushing so flush() does not cancel the running task.
+        self._linger_task = None
+        try:
+            await self.flush()
+        except Exception as exc:  # noqa: BLE001
+            logger.error("batch_flush_failed", error=str(exc))
+
+    def _cancel_linger(self) -> None:
+        if self._linger_task is not None and self._linger_task is not asyncio.current_task():
+            self._linger_task.cancel()
+        self._linger_task = None
@@ -0,0 +1,249 @@
+"""Bulk-load telemetry from JSONL files, bypassing MQTT.
+
+Usage::
+
+    vineguard-ingestor-import backlog.jsonl.gz [more.jsonl ...]
+        [--chunk-rows 50000] [--publish none|latest] [--rejected PATH] [--skip-lines N]
+
+Each line is one raw device payload (v1 or legacy), exactly as it would
+arrive over MQTT.  Lines are validated like live traffic, written with
+``COPY`` in large chunks, and node health is bulk-updated once at the end.
+Live subscribers get nothing by default; ``--publish latest`` sends only the
+newest reading per device.  Chunks commit one by one: if the import fails,
+the ``import_failed`` log line gives the number of lines already stored,
+and passing it as ``--skip-lines`` resumes after them.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import itertools
+import time
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import structlog
+from pydantic import ValidationError
+from redis.asyncio import Redis
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from .config import get_settings
+from .dead_letter import DeadLetterSink
+from .dedup import Deduplicator, DedupWindow
+from .health import health_state, update_node_health
+from .main import _TELEMETRY_COLS, build_dead_letter_sink, published_message, serialise_message
+from .models import telemetry_table
+from .node_cache import NodeIdCache, resolve_node_ids
+from .publish import TelemetryPublisher
+from .schemas import parse_message
+
+logger = structlog.get_logger()
+
+_COPY_COLUMNS = ("id", "node_id", *_TELEMETRY_COLS)
+
+
+def iter_lines(files: list[Path]) -> Iterator[str]:
+    for file in files:
+        opener = gzip.open if file.suffix == ".gz" else open
+        with opener(file, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    yield line
+
+
+def _copy_row(normalised: dict[str, Any], node_id: str | None) -> dict[str, Any]:
+    row = {col: normalised.get(col) for col in _TELEMETRY_COLS}
+    # Ids are generated here so COPY needs no RETURNING to publish the row.
+    row["id"] = uuid.uuid4()
+    row["node_id"] = uuid.UUID(node_id) if node_id else None
+    return row
+
+
+async def copy_readings(conn, rows: list[dict[str, Any]]) -> None:
+    """Write ``rows`` with COPY on asyncpg; a multi-row INSERT elsewhere."""
+    if conn.dialect.driver != "asyncpg":
+        await conn.execute(insert(telemetry_table), rows)
+        return
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        telemetry_table.name,
+        records=[tuple(row[col] for col in _COPY_COLUMNS) for row in rows],
+        columns=_COPY_COLUMNS,
+    )
+
+
+class BulkImporter:
+    """Validate, deduplicate and COPY readings in chunks of ``chunk_rows``.
+
+    Keeps only the current chunk plus the newest reading per device in
+    memory, so file size is bounded by disk, not RAM.  ``committed_lines``
+    counts the lines fed before the last committed chunk, all of which
+    are stored or rejected.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        *,
+        chunk_rows: int,
+        rejected: DeadLetterSink,
+        node_cache: NodeIdCache,
+        dedup: Deduplicator | None = None,
+    ) -> None:
+        self._engine = engine
+        self._chunk_rows = max(1, chunk_rows)
+        self._rejected = rejected
+        self._node_cache = node_cache
+        self._dedup = dedup
+        self._chunk: list[dict[str, Any]] = []
+        # device_id -> (normalised, copied row, node_id) of its newest reading
+        self.latest: dict[str, tuple[dict[str, Any], dict[str, Any], str | None]] = {}
+        self.stats = {"lines": 0, "imported": 0, "rejected": 0, "duplicates": 0}
+        self.committed_lines = 0
+
+    async def feed(self, line: str) -> None:
+        self.stats["lines"] += 1
+        try:
+            normalised = parse_message(line)
+        except ValueError as exc:  # JSONDecodeError and ValidationError
+            self.stats["rejected"] += 1
+            error = str(exc) if isinstance(exc, ValidationError) else f"JSONDecodeError: {exc}"
+            await self._rejected.put(line.rstrip("\n"), error)
+            return
+        self._chunk.append(normalised)
+        if len(self._chunk) >= self._chunk_rows:
+            await self.flush()
+
+    async def flush(self) -> None:
+        batch, self._chunk = self._chunk, []
+        lines = self.stats["lines"]
+        claimed: list[str] = []
+        if self._dedup is not None and batch:
+            fresh, claimed = await self._dedup.claim(batch)
+            self.stats["duplicates"] += len(batch) - len(fresh)
+            batch = fresh
+        if not batch:
+            self.committed_lines = lines
+            return
+        try:
+            async with self._engine.begin() as conn:
+                node_ids = await resolve_node_ids(conn, self._node_cache, (n["device_id"] for n in batch))
+                rows = [_copy_row(n, node_ids.get(n["device_id"])) for n in batch]
+                await copy_readings(conn, rows)
+        except BaseException:
+            # Not stored: a resumed import must not take these for duplicates.
+            if self._dedup is not None:
+                await self._dedup.release(claimed)
+            raise
+        if self._dedup is not None:
+            await self._dedup.confirm(claimed)
+        for normalised, row in zip(batch, rows):
+            device_id = normalised["device_id"]
+            newest = self.latest.get(device_id)
+            if newest is None or normalised["recorded_at"] >= newest[0]["recorded_at"]:
+                self.latest[device_id] = (normalised, row, node_ids.get(device_id))
+        self.stats["imported"] += len(rows)
+        self.committed_lines = lines
+        logger.info("import_progress", **self.stats)
+
+    async def finish(self) -> None:
+        """Flush the last chunk and apply node health from each device's newest reading."""
+        await self.flush()
+        states = {
+            device_id: health_state(normalised, historical=True)
+            for device_id, (normalised, _row, node_id) in self.latest.items()
+            if node_id is not None
+        }
+        if states:
+            async with self._engine.begin() as conn:
+                await update_node_health(conn, states, only_newer=True)
+
+    def latest_messages(self) -> list[bytes]:
+        return [
+            serialise_message(published_message(row, node_id, normalised))
+            for normalised, row, node_id in self.latest.values()
+        ]
+
+
+async def import_async(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    files = [Path(f) for f in args.files]
+    rejected_path = Path(args.rejected) if args.rejected else Path(settings.dead_letter.path).with_name(
+        "vineguard-import-rejected.jsonl"
+    )
+    engine = create_async_engine(settings.database.dsn)
+    node_cache = NodeIdCache(
+        max_size=settings.node_cache.max_size,
+        ttl_seconds=settings.node_cache.ttl_seconds,
+        negative_ttl_seconds=settings.node_cache.negative_ttl_seconds,
+    )
+    dedup = None
+    if settings.dedup.enabled:
+        # Local window only: repeats inside the files are dropped without a Redis round trip per chunk.
+        dedup = Deduplicator(
+            DedupWindow(window_seconds=settings.dedup.window_seconds, max_size=settings.dedup.max_size)
+        )
+    rejected = build_dead_letter_sink(settings, rejected_path)
+    rejected.start()
+    importer = BulkImporter(
+        engine, chunk_rows=args.chunk_rows, rejected=rejected, node_cache=node_cache, dedup=dedup
+    )
+
+    started = time.perf_counter()
+    try:
+        try:
+            for line in itertools.islice(iter_lines(files), args.skip_lines, None):
+                await importer.feed(line)
+            await importer.finish()
+        except Exception as exc:
+            committed = args.skip_lines + importer.committed_lines
+            logger.error("import_failed", error=str(exc), committed_lines=committed, resume=f"--skip-lines {committed}")
+            raise SystemExit(1) from exc
+        if args.publish == "latest":
+            redis = Redis.from_url(settings.redis.url)
+            try:
+                await TelemetryPublisher(
+                    redis,
+                    channel=settings.redis.telemetry_channel,
+                    mode=settings.redis.telemetry_mode,
+                    stream=settings.redis.telemetry_stream,
+                    stream_maxlen=settings.redis.telemetry_stream_maxlen,
+                ).publish(importer.latest_messages())
+            finally:
+                await redis.aclose()
+    finally:
+        await rejected.close()
+        await engine.dispose()
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "import_complete",
+        files=len(files),
+        seconds=round(elapsed, 1),
+        rows_per_sec=round(importer.stats["imported"] / elapsed) if elapsed else None,
+        rejected_path=str(rejected_path) if importer.stats["rejected"] else None,
+        **importer.stats,
+    )
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(prog="vineguard-ingestor-import", description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="+", help="JSONL files of raw payloads (.gz is decompressed)")
+    parser.add_argument("--chunk-rows", type=int, default=50_000, help="rows per COPY transaction")
+    parser.add_argument(
+        "--publish", choices=("none", "latest"), default="none",
+        help="none: no Redis traffic; latest: publish the newest reading per device at the end",
+    )
+    parser.add_argument("--rejected", help="where invalid lines are written")
+    parser.add_argument(
+        "--skip-lines", type=int, default=0,
+        help="skip this many non-empty lines (the committed_lines of a failed import) to resume it",
+    )
+    asyncio.run(import_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,91 @@
+"""JSON codec for per-message hot paths.
+
+Uses orjson (or msgspec for decoding) when installed and falls back to the
+standard library otherwise.  Output is compact JSON that decodes (with the
+stdlib ``json.loads`` in analytics, or ``JSON.parse`` in the dashboard behind
+the API's SSE relay) to the same values as
+``json.dumps(obj, separators=(",", ":"), default=str)``: UUIDs as their
+canonical string, datetimes as ``str(dt)``.  The bytes can differ with
+orjson: floats are written in shortest form (``1e16``, not ``1e+16``) and
+non-ASCII text as UTF-8 rather than ``\\uXXXX`` escapes.  Values do differ in
+one case: NaN and infinity become ``null`` under orjson, where the stdlib
+writes ``NaN`` tokens that only Python parses.
+
+Decode errors are always raised as ``json.JSONDecodeError``.
+"""
+from __future__ import annotations
+
+import json
+from collections.abc import Callable
+from typing import Any, Literal
+
+Backend = Literal["auto", "orjson", "msgspec", "json"]
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - depends on the environment
+    msgspec = None  # type: ignore[assignment]
+
+
+def _json_dumpb(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _orjson_dumpb(obj: Any) -> bytes:
+    # Datetimes go through default=str so they keep the stdlib "YYYY-MM-DD HH:MM:SS+00:00" form.
+    return orjson.dumps(obj, default=str, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+
+def _orjson_loads(data: str | bytes) -> Any:
+    return orjson.loads(data)
+
+
+def _msgspec_loads(data: str | bytes) -> Any:
+    try:
+        return msgspec.json.decode(data)
+    except msgspec.DecodeError as exc:
+        text = data if isinstance(data, str) else bytes(data).decode("utf-8", errors="replace")
+        raise json.JSONDecodeError(str(exc), text, 0) from exc
+
+
+_dumpb: Callable[[Any], bytes] = _json_dumpb
+_loads: Callable[[str | bytes], Any] = json.loads
+backend: str = "json"
+
+
+def configure(name: Backend = "auto") -> str:
+    """Select the codec backend; returns the name of the one actually in use.
+
+    msgspec only accelerates decoding: its native datetime encoding differs
+    from the stdlib output, so encoding stays on the stdlib with that backend.
+    """
+    global _dumpb, _loads, backend
+    if name in ("auto", "orjson") and orjson is not None:
+        _dumpb, _loads, backend = _orjson_dumpb, _orjson_loads, "orjson"
+    elif name in ("auto", "msgspec") and msgspec is not None:
+        _dumpb, _loads, backend = _json_dumpb, _msgspec_loads, "msgspec"
+    else:
+        _dumpb, _loads, backend = _json_dumpb, json.loads, "json"
+    return backend
+
+
+def dumpb(obj: Any) -> bytes:
+    """Encode ``obj`` as compact JSON bytes."""
+    return _dumpb(obj)
+
+
+def dumps(obj: Any) -> str:
+    """Encode ``obj`` as a compact JSON string."""
+    return _dumpb(obj).decode("utf-8")
+
+
+def loads(data: str | bytes) -> Any:
+    return _loads(data)
+
+
+configure()
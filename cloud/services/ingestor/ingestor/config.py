@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from functools import lru_cache
+from typing import Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -19,11 +20,125 @@ class MqttSettings(BaseModel):
 
 class DatabaseSettings(BaseModel):
     dsn: str
+    pool_size: int = Field(default=10, ge=1)
 
 
 class RedisSettings(BaseModel):
     url: str = "redis://redis:6379/0"
     telemetry_channel: str = "telemetry-stream"
+    node_events_channel: str = "node-events"
+    # pubsub: live channel only; stream: resumable capped stream; both: during migration
+    telemetry_mode: Literal["pubsub", "stream", "both"] = "pubsub"
+    telemetry_stream: str = "telemetry"
+    telemetry_stream_maxlen: int = Field(default=100_000, ge=1)
+
+
+class BatchSettings(BaseModel):
+    """Micro-batching of DB writes; ``max_rows=1`` restores one commit per reading."""
+
+    max_rows: int = Field(default=500, ge=1)
+    linger_ms: int = Field(default=50, ge=0)
+
+
+class WorkerSettings(BaseModel):
+    """Concurrent write workers; readings are routed to a worker by device_id hash."""
+
+    pool_size: int = Field(default=4, ge=1)
+    queue_depth: int = Field(default=10_000, ge=1)
+
+
+class NodeCacheSettings(BaseModel):
+    """device_id → node_id resolution cache in front of the ``nodes`` table."""
+
+    max_size: int = Field(default=50_000, ge=1)
+    ttl_seconds: float = Field(default=600.0, gt=0)
+    negative_ttl_seconds: float = Field(default=60.0, gt=0)
+
+
+class NodeHealthSettings(BaseModel):
+    """Write-behind flushing of last_seen_at / battery / rssi on ``nodes``."""
+
+    flush_interval_seconds: float = Field(default=5.0, gt=0)
+
+
+class DedupSettings(BaseModel):
+    """Drop repeated gateway readings, keyed on (device_id, _sequence, timestamp).
+
+    The window should cover the gateway's retry and offline-replay horizon;
+    ``shared`` also claims keys in Redis so other shards and restarts see them.
+    A shared claim expires after ``claim_seconds`` unless its batch commits,
+    so a crash between claim and commit does not drop the device's retries.
+    """
+
+    enabled: bool = True
+    window_seconds: int = Field(default=21_600, gt=0)
+    max_size: int = Field(default=200_000, ge=1)
+    shared: bool = True
+    claim_seconds: int = Field(default=60, gt=0)
+    key_prefix: str = "vineguard:dedup:"
+
+
+class DeadLetterSettings(BaseModel):
+    """Rejected payloads, appended as JSONL off the event loop and rotated by size."""
+
+    path: str = "/tmp/vineguard-dead-letter.jsonl"
+    max_bytes: int = Field(default=10 * 1024 * 1024, gt=0)
+    backups: int = Field(default=5, ge=0)
+    compress: bool = False
+    queue_size: int = Field(default=10_000, ge=1)
+
+
+class AdmissionSettings(BaseModel):
+    """Spill readings to an on-disk journal while the database falls behind.
+
+    Spilling starts when the worker queues hold ``max_queue_depth`` readings
+    or the smoothed commit time exceeds ``max_commit_ms``; the journal is
+    replayed in ``replay_batch`` chunks once the queues drop below
+    ``resume_queue_depth``.  A journal of ``max_bytes`` falls back to blocking.
+    """
+
+    enabled: bool = True
+    journal_dir: str = "/tmp/vineguard-journal"
+    max_queue_depth: int = Field(default=8_000, ge=1)
+    resume_queue_depth: int = Field(default=2_000, ge=0)
+    max_commit_ms: float = Field(default=2_000.0, gt=0)
+    replay_batch: int = Field(default=2_000, ge=1)
+    check_interval_seconds: float = Field(default=1.0, gt=0)
+    segment_bytes: int = Field(default=64 * 1024 * 1024, gt=0)
+    max_bytes: int = Field(default=2 * 1024 * 1024 * 1024, gt=0)
+
+
+class MetricsSettings(BaseModel):
+    """Prometheus endpoint; ``log_every`` samples the per-reading ``ingested`` log."""
+
+    enabled: bool = True
+    port: int = Field(default=9108, ge=1, le=65535)
+    log_every: int = Field(default=1000, ge=1)
+
+
+class ShardingSettings(BaseModel):
+    """Run several ingestor processes as one group.
+
+    ``hash``: every process subscribes to the topic and keeps only the
+    devices with ``process_shard_for(device_id, count) == index`` (per-device
+    order holds).
+    ``shared``: MQTT v5 shared subscription; the broker spreads messages
+    over the group, so per-device order only holds with a sticky broker
+    dispatch strategy.
+    """
+
+    mode: Literal["off", "hash", "shared"] = "off"
+    index: int = Field(default=0, ge=0)
+    count: int = Field(default=1, ge=1)
+    group: str = "vineguard-ingestor"
+    # Processes started by vineguard-ingestor-supervisor; 0 = one per CPU.
+    processes: int = Field(default=0, ge=0)
+
+    @model_validator(mode="after")
+    def _index_in_range(self) -> "ShardingSettings":
+        if self.index >= self.count:
+            raise ValueError("sharding.index must be lower than sharding.count")
+        return self
 
 
 class IngestorSettings(BaseSettings):
@@ -32,6 +147,16 @@ class IngestorSettings(BaseSettings):
     mqtt: MqttSettings = Field(default_factory=MqttSettings)
     database: DatabaseSettings
     redis: RedisSettings = Field(default_factory=RedisSettings)
+    batch: BatchSettings = Field(default_factory=BatchSettings)
+    workers: WorkerSettings = Field(default_factory=WorkerSettings)
+    node_cache: NodeCacheSettings = Field(default_factory=NodeCacheSettings)
+    node_health: NodeHealthSettings = Field(default_factory=NodeHealthSettings)
+    dedup: DedupSettings = Field(default_factory=DedupSettings)
+    dead_letter: DeadLetterSettings = Field(default_factory=DeadLetterSettings)
+    admission: AdmissionSettings = Field(default_factory=AdmissionSettings)
+    metrics: MetricsSettings = Field(default_factory=MetricsSettings)
+    sharding: ShardingSettings = Field(default_factory=ShardingSettings)
+    json_codec: Literal["auto", "orjson", "msgspec", "json"] = "auto"
 
 
 @lru_cache
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import shutil
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Protocol
+
+import structlog
+
+from . import codec
+
+logger = structlog.get_logger()
+
+_STOP = object()
+# Records written per file append; bounds how long one flush holds the file.
+_MAX_RECORDS_PER_WRITE = 1000
+
+
+class DeadLetterWriter(Protocol):
+    """Anything that accepts rejected payloads."""
+
+    def write(self, raw: str, error: str) -> None: ...
+
+
+def rotated_path(path: Path, index: int, *, compressed: bool) -> Path:
+    return path.with_name(f"{path.name}.{index}{'.gz' if compressed else ''}")
+
+
+def dead_letter_files(path: Path) -> list[Path]:
+    """Return ``path`` and its rotated backups, oldest first."""
+    backups: list[tuple[int, Path]] = []
+    for candidate in path.parent.glob(f"{path.name}.*"):
+        index = candidate.name[len(path.name) + 1:].removesuffix(".gz")
+        if index.isdigit():
+            backups.append((int(index), candidate))
+    files = [p for _, p in sorted(backups, reverse=True)]
+    if path.exists():
+        files.append(path)
+    return files
+
+
+def iter_dead_letters(files: list[Path]) -> Iterator[dict[str, Any]]:
+    """Yield dead-letter records from plain or gzip-compressed JSONL files."""
+    for file in files:
+        opener = gzip.open if file.suffix == ".gz" else open
+        with opener(file, "rt", encoding="utf-8") as fh:
+            for lineno, line in enumerate(fh, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield codec.loads(line)
+                except ValueError:
+                    logger.warning("dead_letter_unreadable", path=str(file), line=lineno)
+
+
+class DeadLetterSink:
+    """Buffered JSONL dead-letter file, written off the event loop.
+
+    ``write`` only enqueues; a background task appends queued records in
+    bulk from a worker thread.  Once the file reaches ``max_bytes`` it is
+    rotated to ``<path>.1`` (gzip-compressed when ``compress`` is set),
+    keeping at most ``backups`` old files.  When the queue is full the
+    record is dropped and counted rather than stalling ingestion.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        max_bytes: int,
+        backups: int,
+        compress: bool = False,
+        queue_size: int = 10_000,
+    ) -> None:
+        self.path = path
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._compress = compress
+        self._queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=max(1, queue_size))
+        self._task: asyncio.Task[None] | None = None
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def write(self, raw: str, error: str) -> None:
+        record = {
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            "error": error,
+            "raw": raw,
+        }
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("dead_letter_dropped", dropped=self.dropped)
+
+    async def put(self, raw: str, error: str) -> None:
+        """Like ``write``, but waits for queue space instead of dropping (batch tools)."""
+        await self._queue.put(
+            {"timestamp": datetime.now(tz=timezone.utc).isoformat(), "error": error, "raw": raw}
+        )
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Write out everything queued so far and stop the background task."""
+        if self._task is None:
+            await self._drain()
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            records = [await self._queue.get()]
+            while len(records) < _MAX_RECORDS_PER_WRITE and not self._queue.empty():
+                records.append(self._queue.get_nowait())
+            if any(record is _STOP for record in records):
+                records = [record for record in records if record is not _STOP]
+                stopping = True
+            await self._append(records)
+        await self._drain()
+
+    async def _drain(self) -> None:
+        records = []
+        while not self._queue.empty():
+            records.append(self._queue.get_nowait())
+        await self._append(records)
+
+    async def _append(self, records: list[dict[str, Any]]) -> None:
+        if not records:
+            return
+        lines = "".join(codec.dumps(record) + "\n" for record in records)
+        try:
+            await asyncio.to_thread(self._append_sync, lines)
+        except OSError as exc:
+            logger.error("dead_letter_write_failed", path=str(self.path), records=len(records), error=str(exc))
+
+    def _append_sync(self, lines: str) -> None:
+        with self.path.open("a", encoding="utf-8") as fh:
+            fh.write(lines)
+            size = fh.tell()
+        if size >= self._max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        if self._backups < 1:
+            self.path.unlink(missing_ok=True)
+            return
+        for compressed in (False, True):
+            rotated_path(self.path, self._backups, compressed=compressed).unlink(missing_ok=True)
+        for index in range(self._backups - 1, 0, -1):
+            for compressed in (False, True):
+                src = rotated_path(self.path, index, compressed=compressed)
+                if src.exists():
+                    src.rename(rotated_path(self.path, index + 1, compressed=compressed))
+        if self._compress:
+            with self.path.open("rb") as src, gzip.open(rotated_path(self.path, 1, compressed=True), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            self.path.unlink()
+        else:
+            self.path.rename(rotated_path(self.path, 1, compressed=False))
+        logger.info("dead_letter_rotated", path=str(self.path))
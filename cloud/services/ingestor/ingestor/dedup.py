@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from typing import Any
+
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = structlog.get_logger()
+
+
+def dedup_key(normalised: dict[str, Any]) -> str | None:
+    """(device_id, sequence, timestamp) identity of a reading, or None.
+
+    Only gateway-sequenced readings are deduplicated; the 16-bit sequence
+    wraps, so the timestamp the gateway stamped on the frame is part of the
+    key.  Readings without a device timestamp carry no ``sequence`` (see
+    ``schemas``): their ``recorded_at`` is the arrival time, which differs
+    on every retry.
+    """
+    sequence = normalised.get("sequence")
+    if sequence is None:
+        return None
+    return f"{normalised['device_id']}:{sequence}:{normalised['recorded_at'].timestamp():.0f}"
+
+
+class DedupWindow:
+    """Keys seen in the last ``window_seconds``, bounded to ``max_size`` entries.
+
+    Every key gets the same TTL, so insertion order is expiry order and the
+    oldest entries are dropped from the front.
+    """
+
+    def __init__(
+        self,
+        *,
+        window_seconds: float,
+        max_size: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._window = window_seconds
+        self._max_size = max(1, max_size)
+        self._clock = clock
+        self._expiry: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def add(self, key: str) -> bool:
+        """Record ``key``; returns False when it was already inside the window."""
+        now = self._clock()
+        while self._expiry:
+            oldest, expires = next(iter(self._expiry.items()))
+            if expires > now and len(self._expiry) < self._max_size:
+                break
+            del self._expiry[oldest]
+        if key in self._expiry:
+            return False
+        self._expiry[key] = now + self._window
+        return True
+
+    def discard(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._expiry.pop(key, None)
+
+
+class Deduplicator:
+    """Drop repeated readings before they reach the database.
+
+    The in-process window answers most duplicates (a device always lands on
+    the same worker and shard).  When ``redis`` is given, first sightings are
+    also claimed with ``SET key NX EX`` in one pipeline per batch, so copies
+    that reach another process or a restarted one are caught too.  A claim
+    only lives ``claim_ttl_seconds`` until ``confirm`` extends it to the
+    full ``ttl_seconds`` after commit: if the process dies in between, the
+    device's retries are accepted again once the claim expires.  If Redis
+    is unavailable the local window still applies.
+    """
+
+    def __init__(
+        self,
+        window: DedupWindow,
+        *,
+        redis: Redis | None = None,
+        key_prefix: str = "vineguard:dedup:",
+        ttl_seconds: int = 21_600,
+        claim_ttl_seconds: int = 60,
+    ) -> None:
+        self._window = window
+        self._redis = redis
+        self._prefix = key_prefix
+        self._ttl = ttl_seconds
+        self._claim_ttl = min(claim_ttl_seconds, ttl_seconds)
+
+    async def claim(self, batch: list[dict[str, Any]]) -> tuple[list[dict[str, Any]], list[str]]:
+        """Return the readings seen for the first time and the keys claimed for them."""
+        fresh: list[dict[str, Any]] = []
+        keyed: list[tuple[dict[str, Any], str]] = []
+        for normalised in batch:
+            key = dedup_key(normalised)
+            if key is None:
+                fresh.append(normalised)
+            elif self._window.add(key):
+                keyed.append((normalised, key))
+        if keyed and self._redis is not None:
+            keyed = await self._claim_shared(keyed)
+        fresh.extend(normalised for normalised, _ in keyed)
+        return fresh, [key for _, key in keyed]
+
+    async def confirm(self, keys: list[str]) -> None:
+        """Hold ``keys`` for the whole window now that their readings are committed."""
+        if not keys or self._redis is None:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.expire(self._prefix + key, self._ttl)
+                await pipe.execute()
+        except RedisError as exc:
+            logger.warning("dedup_confirm_failed", keys=len(keys), error=str(exc))
+
+    async def release(self, keys: list[str]) -> None:
+        """Forget ``keys`` after a failed write so a retried copy is accepted."""
+        self._window.discard(keys)
+        if keys and self._redis is not None:
+            try:
+                await self._redis.delete(*(self._prefix + key for key in keys))
+            except RedisError as exc:
+                logger.warning("dedup_release_failed", keys=len(keys), error=str(exc))
+
+    async def _claim_shared(
+        self, keyed: list[tuple[dict[str, Any], str]]
+    ) -> list[tuple[dict[str, Any], str]]:
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for _, key in keyed:
+                    pipe.set(self._prefix + key, 1, nx=True, ex=self._claim_ttl)
+                claimed = await pipe.execute()
+        except RedisError as exc:
+            logger.warning("dedup_redis_unavailable", error=str(exc))
+            return keyed
+        return [item for item, ok in zip(keyed, claimed) if ok]
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any
+
+import structlog
+from sqlalchemy import DateTime, Float, Integer, String, bindparam, cast, column, or_, update, values
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .models import nodes_table
+
+logger = structlog.get_logger()
+
+
+def health_state(normalised: dict[str, Any], *, historical: bool = False) -> dict[str, Any]:
+    """Return the ``nodes`` health columns implied by one reading.
+
+    ``last_seen_at`` is now, or with ``historical`` (imports, replays) the
+    reading's own ``recorded_at``, for use with ``only_newer``.
+    """
+    return {
+        "last_seen_at": normalised["recorded_at"] if historical else datetime.now(tz=timezone.utc),
+        "battery_voltage": normalised.get("battery_voltage"),
+        "battery_pct": normalised.get("battery_pct"),
+        "rssi_last": normalised.get("rssi"),
+    }
+
+
+async def update_node_health(conn, states: dict[str, dict[str, Any]], *, only_newer: bool = False) -> None:
+    """Apply the latest health state of every device with one ``UPDATE ... FROM (VALUES ...)``.
+
+    With ``only_newer`` a node is left alone when its ``last_seen_at`` is
+    already later than the state's, as when importing historical readings.
+    """
+    if conn.dialect.name != "postgresql":
+        # Named VALUES lists are Postgres-only; other stores (the SQLite bench
+        # stand-in) get an executemany of the equivalent per-device UPDATE.
+        stmt = update(nodes_table).where(nodes_table.c.device_id == bindparam("b_device_id"))
+        if only_newer:
+            stmt = stmt.where(
+                or_(nodes_table.c.last_seen_at.is_(None), nodes_table.c.last_seen_at < bindparam("b_last_seen_at"))
+            )
+        await conn.execute(
+            stmt.values(status="active"),
+            [
+                {"b_device_id": device_id, "b_last_seen_at": s["last_seen_at"], **s}
+                for device_id, s in states.items()
+            ],
+        )
+        return
+    health = values(
+        column("device_id", String),
+        column("last_seen_at", DateTime(timezone=True)),
+        column("battery_voltage", Float),
+        column("battery_pct", Integer),
+        column("rssi_last", Integer),
+        name="health",
+    ).data([
+        (device_id, s["last_seen_at"], s["battery_voltage"], s["battery_pct"], s["rssi_last"])
+        for device_id, s in states.items()
+    ])
+    stmt = update(nodes_table).where(nodes_table.c.device_id == health.c.device_id)
+    if only_newer:
+        seen_at = cast(health.c.last_seen_at, DateTime(timezone=True))
+        stmt = stmt.where(or_(nodes_table.c.last_seen_at.is_(None), nodes_table.c.last_seen_at < seen_at))
+    await conn.execute(
+        stmt.values(
+            # Casts keep all-NULL VALUES columns (typed text by Postgres) assignable.
+            last_seen_at=cast(health.c.last_seen_at, DateTime(timezone=True)),
+            battery_voltage=cast(health.c.battery_voltage, Float),
+            battery_pct=cast(health.c.battery_pct, Integer),
+            rssi_last=cast(health.c.rssi_last, Integer),
+            status="active",
+        )
+    )
+
+
+class NodeHealthWriter:
+    """Write-behind aggregator for the health columns of ``nodes``.
+
+    Keeps only the latest state per device in memory and writes it out every
+    ``interval_seconds`` in a single statement, instead of one UPDATE per
+    reading.  The state comes from the reading with the newest
+    ``recorded_at`` seen for the device, so a replayed backlog or a late
+    retry never sets battery and RSSI back.  ``close`` forces a final flush
+    on shutdown.
+    """
+
+    def __init__(self, engine: AsyncEngine, *, interval_seconds: float) -> None:
+        self._engine = engine
+        self._interval = interval_seconds
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._newest: dict[str, datetime] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, normalised: dict[str, Any]) -> None:
+        """Remember a device's health from a reading that was just persisted."""
+        device_id = normalised["device_id"]
+        newest = self._newest.get(device_id)
+        if newest is not None and normalised["recorded_at"] < newest:
+            return
+        self._newest[device_id] = normalised["recorded_at"]
+        self._pending[device_id] = health_state(normalised)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+            states, self._pending = self._pending, {}
+            try:
+                async with self._engine.begin() as conn:
+                    await update_node_health(conn, states)
+            except BaseException:
+                # Put back whatever has not been superseded meanwhile and retry next
+                # tick, or in the final flush when ``close`` cancelled this one.
+                self._pending = {**states, **self._pending}
+                raise
+        logger.debug("node_health_flushed", devices=len(states))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.flush()
+            except Exception as exc:  # noqa: BLE001
+                logger.error("node_health_flush_failed", error=str(exc), devices=len(self._pending))
@@ -2,33 +2,73 @@ from __future__ import annotations
 
 import asyncio
 import json
+import signal
 import ssl
-from datetime import datetime, timezone
+import time
+import uuid
+from collections.abc import Iterable
 from pathlib import Path
 from typing import Any
 
 import structlog
-from aiomqtt import Client
+from aiomqtt import Client, ProtocolVersion
 from pydantic import ValidationError
 from redis.asyncio import Redis
-from sqlalchemy import insert, select, update
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
+from . import codec, metrics
+from .admission import AdmissionController, SpillJournal
+from .batching import ReadingSink, TelemetryBatcher
 from .config import IngestorSettings, get_settings
+from .dead_letter import DeadLetterSink, DeadLetterWriter
+from .dedup import Deduplicator, DedupWindow, dedup_key
+from .health import NodeHealthWriter, health_state, update_node_health
 from .models import nodes_table, telemetry_table
-from .schemas import parse_payload
+from .node_cache import NodeIdCache, listen_for_node_events, resolve_node_ids, warm_node_cache
+from .publish import TelemetryPublisher
+from .schemas import parse_message, to_payload
+from .sharding import owns, subscription_topic
+from .workers import WorkerPool
 
 logger = structlog.get_logger()
 
-DEAD_LETTER_PATH = Path("/tmp/vineguard-dead-letter.jsonl")
+_TELEMETRY_COLS = (
+    "device_id", "soil_moisture", "soil_temp_c", "ambient_temp_c",
+    "ambient_humidity", "light_lux", "battery_voltage", "leaf_wetness_pct",
+    "pressure_hpa", "schema_version", "recorded_at",
+)
 
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def serialise_message(message: dict[str, Any]) -> str:
-    return json.dumps(message, separators=(",", ":"), default=str)
+def serialise_message(message: dict[str, Any]) -> bytes:
+    return codec.dumpb(message)
+
+
+def _as_text(raw_payload: str | bytes) -> str:
+    if isinstance(raw_payload, (bytes, bytearray)):
+        return raw_payload.decode("utf-8", errors="replace")
+    return raw_payload
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether a failed write may succeed unchanged later (connection lost, DB down, timeout).
+
+    Anything else, such as a constraint violation or a value the column
+    cannot hold, is a property of the rows and would fail again.
+    """
+    if isinstance(exc, sa_exc.DBAPIError):
+        return exc.connection_invalidated or isinstance(exc, (sa_exc.OperationalError, sa_exc.InterfaceError))
+    return isinstance(exc, (OSError, asyncio.TimeoutError, sa_exc.TimeoutError, sa_exc.DisconnectionError))
+
+
+def _db_error(exc: BaseException) -> str:
+    # The driver's message, without the statement and parameters SQLAlchemy appends.
+    return str(getattr(exc, "orig", None) or exc)
 
 
 def build_tls_context(settings: IngestorSettings) -> ssl.SSLContext:
@@ -39,95 +79,52 @@ def build_tls_context(settings: IngestorSettings) -> ssl.SSLContext:
     return context
 
 
-def write_dead_letter(raw: str, error: str) -> None:
-    """Append a rejected payload to the dead-letter file as a JSONL record."""
-    record = {
-        "timestamp": datetime.now(tz=timezone.utc).isoformat(),
-        "error": error,
-        "raw": raw,
-    }
-    try:
-        with DEAD_LETTER_PATH.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(record, separators=(",", ":")) + "\n")
-    except OSError as exc:
-        logger.error("dead_letter_write_failed", path=str(DEAD_LETTER_PATH), error=str(exc))
+def build_dead_letter_sink(settings: IngestorSettings, path: Path | None = None) -> DeadLetterSink:
+    return DeadLetterSink(
+        path or Path(settings.dead_letter.path),
+        max_bytes=settings.dead_letter.max_bytes,
+        backups=settings.dead_letter.backups,
+        compress=settings.dead_letter.compress,
+        queue_size=settings.dead_letter.queue_size,
+    )
 
 
 # ---------------------------------------------------------------------------
 # DB helpers
 # ---------------------------------------------------------------------------
 
-async def get_node_id(conn, device_id: str) -> str | None:
-    """Return the UUID string for a device_id, or None if not registered."""
+async def get_node_ids(conn, device_ids: Iterable[str]) -> dict[str, str]:
+    """Return a device_id → node UUID string map for the registered devices."""
+    wanted = set(device_ids)
+    if not wanted:
+        return {}
     result = await conn.execute(
-        select(nodes_table.c.id).where(nodes_table.c.device_id == device_id)
+        select(nodes_table.c.device_id, nodes_table.c.id).where(nodes_table.c.device_id.in_(wanted))
     )
-    row = result.first()
-    return str(row[0]) if row else None
-
-
-async def update_node_health(conn, normalised: dict[str, Any]) -> None:
-    """Update last_seen_at, battery fields, rssi, and status on the nodes row."""
-    await conn.execute(
-        update(nodes_table)
-        .where(nodes_table.c.device_id == normalised["device_id"])
-        .values(
-            last_seen_at=datetime.now(tz=timezone.utc),
-            battery_voltage=normalised.get("battery_voltage"),
-            battery_pct=normalised.get("battery_pct"),
-            rssi_last=normalised.get("rssi"),
-            status="active",
-        )
+    return {device_id: str(node_id) for device_id, node_id in result.all()}
+
+
+async def insert_readings(
+    conn, batch: list[dict[str, Any]], node_ids: dict[str, str]
+) -> list[dict[str, Any]]:
+    """Insert the batch with one multi-row INSERT and return the rows in batch order."""
+    rows = []
+    for normalised in batch:
+        row = {col: normalised.get(col) for col in _TELEMETRY_COLS}
+        node_id = node_ids.get(normalised["device_id"])
+        # A UUID binds on every driver; a str only on asyncpg.
+        row["node_id"] = uuid.UUID(node_id) if node_id else None
+        rows.append(row)
+    result = await conn.execute(
+        insert(telemetry_table).returning(telemetry_table, sort_by_parameter_order=True),
+        rows,
     )
+    return [dict(row) for row in result.mappings().all()]
 
 
-# ---------------------------------------------------------------------------
-# Core message handler
-# ---------------------------------------------------------------------------
-
-async def handle_message(
-    raw_payload: str,
-    redis: Redis,
-    engine: AsyncEngine,
-    settings: IngestorSettings,
-) -> None:
-    # 1. Parse JSON
-    try:
-        raw = json.loads(raw_payload)
-    except json.JSONDecodeError as exc:
-        logger.warning("invalid_json", error=str(exc))
-        write_dead_letter(raw_payload, f"JSONDecodeError: {exc}")
-        return
-
-    # 2. Validate and normalise with Pydantic
-    try:
-        normalised = parse_payload(raw)
-    except ValidationError as exc:
-        logger.warning("payload_validation_failed", error=exc.json())
-        write_dead_letter(raw_payload, str(exc))
-        return
-
-    _TELEMETRY_COLS = {
-        "device_id", "node_id", "soil_moisture", "soil_temp_c", "ambient_temp_c",
-        "ambient_humidity", "light_lux", "battery_voltage", "leaf_wetness_pct",
-        "pressure_hpa", "schema_version", "recorded_at",
-    }
-
-    # 3. Persist to DB and update node health
-    async with engine.begin() as conn:
-        node_id = await get_node_id(conn, normalised["device_id"])
-
-        insert_values = {k: v for k, v in normalised.items() if k in _TELEMETRY_COLS}
-        insert_values["node_id"] = node_id
-        result = await conn.execute(
-            insert(telemetry_table).values(**insert_values).returning(telemetry_table)
-        )
-        row = result.mappings().one()
-
-        await update_node_health(conn, normalised)
-
-    # 4. Publish to Redis
-    published: dict[str, Any] = {
+def published_message(row: dict[str, Any], node_id: str | None, normalised: dict[str, Any]) -> dict[str, Any]:
+    """The Redis message for a stored telemetry row."""
+    return {
         "id": str(row["id"]),
         "device_id": row["device_id"],
         "node_id": node_id,
@@ -143,8 +140,219 @@ async def handle_message(
         "schema_version": row["schema_version"],
         "recorded_at": row["recorded_at"].isoformat(),
     }
-    await redis.publish(settings.redis.telemetry_channel, serialise_message(published))
-    logger.info("ingested", device=published["device_id"], node_id=node_id)
+
+
+# ---------------------------------------------------------------------------
+# Batch writer
+# ---------------------------------------------------------------------------
+
+class TelemetryWriter:
+    """Persist batches of normalised readings, then publish them to Redis.
+
+    Publishing happens after commit, one pipelined round trip per batch.
+
+    Node health goes through the write-behind ``health`` writer when one is
+    given; otherwise it is updated inside the batch transaction.  With a
+    ``dedup`` index, repeated gateway readings are dropped before the insert.
+    An ``admission`` controller is told how long each commit took and gets
+    back the readings whose write failed for a transient reason.  When the
+    DB rejects the batch itself (a constraint or data error), it is retried
+    one row per transaction and only the rows still rejected go to
+    ``dead_letters``.  ``historical`` readings (dead-letter replay) only
+    move node health forward, from their own ``recorded_at``, and with
+    ``publish`` off nothing reaches live subscribers.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        redis: Redis,
+        settings: IngestorSettings,
+        *,
+        node_cache: NodeIdCache | None = None,
+        health: NodeHealthWriter | None = None,
+        dedup: Deduplicator | None = None,
+        admission: AdmissionController | None = None,
+        dead_letters: DeadLetterWriter | None = None,
+        historical: bool = False,
+        publish: bool = True,
+    ) -> None:
+        self._engine = engine
+        self._publisher = TelemetryPublisher(
+            redis,
+            channel=settings.redis.telemetry_channel,
+            mode=settings.redis.telemetry_mode,
+            stream=settings.redis.telemetry_stream,
+            stream_maxlen=settings.redis.telemetry_stream_maxlen,
+        )
+        self._node_cache = node_cache
+        self._health = health
+        self._dedup = dedup
+        self._admission = admission
+        self._dead_letters = dead_letters
+        self._historical = historical
+        self._publishes = publish
+        self._log_sampler = metrics.LogSampler(settings.metrics.log_every)
+
+    async def write(self, batch: list[dict[str, Any]]) -> None:
+        try:
+            await self._write(batch)
+        except Exception:
+            metrics.BATCHES_FAILED.inc()
+            raise
+
+    async def _write(self, batch: list[dict[str, Any]]) -> None:
+        if self._dedup is not None:
+            fresh, _claimed = await self._dedup.claim(batch)
+            metrics.MESSAGES_DUPLICATE.inc(len(batch) - len(fresh))
+            if not fresh:
+                return
+            batch = fresh
+
+        metrics.BATCH_ROWS.observe(len(batch))
+        started = time.perf_counter()
+        try:
+            with metrics.DB_SECONDS.time():
+                rows, node_ids = await self._store(batch)
+        except Exception as exc:
+            if is_transient(exc):
+                await self._requeue(batch)
+                raise
+            logger.warning("batch_rejected", rows=len(batch), error=_db_error(exc))
+            stored, rows, node_ids, failure = await self._store_each(batch)
+            await self._confirm(stored)
+            await self._publish(stored, rows, node_ids)
+            if failure is not None:
+                raise failure
+            return
+        if self._admission is not None:
+            self._admission.record_commit(time.perf_counter() - started)
+        await self._confirm(batch)
+        await self._publish(batch, rows, node_ids)
+
+    async def _store(self, batch: list[dict[str, Any]]) -> tuple[list[dict[str, Any]], dict[str, str]]:
+        """Insert ``batch`` in one transaction; returns the stored rows and the node ids."""
+        async with self._engine.begin() as conn:
+            device_ids = (n["device_id"] for n in batch)
+            if self._node_cache is None:
+                node_ids = await get_node_ids(conn, device_ids)
+            else:
+                node_ids = await resolve_node_ids(conn, self._node_cache, device_ids)
+            rows = await insert_readings(conn, batch, node_ids)
+            if self._health is None:
+                # Oldest first, so each device keeps the state of its newest reading.
+                ordered = sorted(batch, key=lambda n: n["recorded_at"]) if self._historical else batch
+                states = {n["device_id"]: health_state(n, historical=self._historical) for n in ordered}
+                await update_node_health(conn, states, only_newer=self._historical)
+        return rows, node_ids
+
+    async def _store_each(
+        self, batch: list[dict[str, Any]]
+    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]], dict[str, str], Exception | None]:
+        """Insert a rejected batch one row per transaction, dead-lettering the rows still rejected.
+
+        Returns the stored readings, their rows and node ids, and the
+        transient error that stopped the retry (the rest was requeued), if any.
+        """
+        stored: list[dict[str, Any]] = []
+        rows: list[dict[str, Any]] = []
+        node_ids: dict[str, str] = {}
+        for i, normalised in enumerate(batch):
+            try:
+                row, ids = await self._store([normalised])
+            except Exception as exc:
+                if is_transient(exc):
+                    await self._requeue(batch[i:])
+                    return stored, rows, node_ids, exc
+                await self._reject(normalised, exc)
+                continue
+            stored.append(normalised)
+            rows.extend(row)
+            node_ids.update(ids)
+        return stored, rows, node_ids, None
+
+    async def _requeue(self, readings: list[dict[str, Any]]) -> None:
+        """Nothing was stored for ``readings``: hand them back for a later retry."""
+        await self._forget(readings)
+        if self._admission is not None:
+            self._admission.spill_failed(readings)
+
+    async def _reject(self, normalised: dict[str, Any], exc: Exception) -> None:
+        await self._forget([normalised])
+        metrics.MESSAGES_DEAD_LETTERED.labels(reason="db_rejected").inc()
+        error = f"{type(exc).__name__}: {_db_error(exc)}"
+        if self._dead_letters is None:
+            logger.error("reading_rejected", device=normalised["device_id"], error=error)
+            return
+        self._dead_letters.write(codec.dumps(to_payload(normalised)), error)
+
+    async def _confirm(self, readings: list[dict[str, Any]]) -> None:
+        # Stored: hold the dedup keys for the whole window.
+        if self._dedup is not None:
+            keys = [key for key in map(dedup_key, readings) if key is not None]
+            if keys:
+                await self._dedup.confirm(keys)
+
+    async def _forget(self, readings: list[dict[str, Any]]) -> None:
+        # A later copy of a reading that was not stored must not count as a duplicate.
+        if self._dedup is not None:
+            keys = [key for key in map(dedup_key, readings) if key is not None]
+            if keys:
+                await self._dedup.release(keys)
+
+    async def _publish(
+        self, batch: list[dict[str, Any]], rows: list[dict[str, Any]], node_ids: dict[str, str]
+    ) -> None:
+        if not batch:
+            return
+        if self._health is not None:
+            for normalised in batch:
+                self._health.record(normalised)
+        if not self._publishes:
+            return
+
+        messages = [
+            serialise_message(published_message(row, node_ids.get(row["device_id"]), normalised))
+            for normalised, row in zip(batch, rows)
+        ]
+        with metrics.PUBLISH_SECONDS.time():
+            await self._publisher.publish(messages)
+        metrics.MESSAGES_PUBLISHED.inc(len(messages))
+
+        sampled = self._log_sampler.hit(len(messages))
+        if sampled:
+            last = rows[-1]["device_id"]
+            logger.info("ingested", readings=sampled, device=last, node_id=node_ids.get(last))
+
+
+# ---------------------------------------------------------------------------
+# Core message handler
+# ---------------------------------------------------------------------------
+
+async def handle_message(raw_payload: str | bytes, sink: ReadingSink, dead_letters: DeadLetterWriter) -> None:
+    """Validate one MQTT payload and hand it to ``sink`` for persistence.
+
+    Rejected payloads are queued on ``dead_letters`` for later replay.
+    """
+    metrics.MESSAGES_RECEIVED.inc()
+    # 1. Parse and validate (fast path for canonical v1, Pydantic otherwise)
+    try:
+        with metrics.PARSE_SECONDS.time():
+            normalised = parse_message(raw_payload)
+    except json.JSONDecodeError as exc:
+        logger.warning("invalid_json", error=str(exc))
+        metrics.MESSAGES_DEAD_LETTERED.labels(reason="invalid_json").inc()
+        dead_letters.write(_as_text(raw_payload), f"JSONDecodeError: {exc}")
+        return
+    except ValidationError as exc:
+        logger.warning("payload_validation_failed", error=exc.json())
+        metrics.MESSAGES_DEAD_LETTERED.labels(reason="validation").inc()
+        dead_letters.write(_as_text(raw_payload), str(exc))
+        return
+    metrics.MESSAGES_VALIDATED.inc()
+
+    # 2. Persist to DB, update node health and publish to Redis
+    await sink.add(normalised)
 
 
 # ---------------------------------------------------------------------------
@@ -152,6 +360,9 @@ async def handle_message(
 # ---------------------------------------------------------------------------
 
 async def run_async() -> None:
+    # Docker and the supervisor stop us with SIGTERM: cancel so the finally
+    # block below flushes batches, health and dead letters before exiting.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
     settings = get_settings()
     structlog.configure(
         processors=[
@@ -160,8 +371,87 @@ async def run_async() -> None:
             structlog.processors.JSONRenderer(),
         ]
     )
+    logger.info("json_codec", backend=codec.configure(settings.json_codec))
     redis = Redis.from_url(settings.redis.url)
-    engine = create_async_engine(settings.database.dsn)
+    # One connection per write worker, plus headroom for the health writer.
+    engine = create_async_engine(settings.database.dsn, pool_size=settings.database.pool_size)
+
+    node_cache = NodeIdCache(
+        max_size=settings.node_cache.max_size,
+        ttl_seconds=settings.node_cache.ttl_seconds,
+        negative_ttl_seconds=settings.node_cache.negative_ttl_seconds,
+    )
+    async with engine.connect() as conn:
+        warmed = await warm_node_cache(conn, node_cache, settings.node_cache.max_size)
+    logger.info("node_cache_warmed", nodes=warmed)
+    node_events = asyncio.create_task(
+        listen_for_node_events(redis, settings.redis.node_events_channel, node_cache)
+    )
+
+    dead_letters = build_dead_letter_sink(settings)
+    dead_letters.start()
+    health = NodeHealthWriter(engine, interval_seconds=settings.node_health.flush_interval_seconds)
+    health.start()
+    dedup = None
+    if settings.dedup.enabled:
+        dedup = Deduplicator(
+            DedupWindow(window_seconds=settings.dedup.window_seconds, max_size=settings.dedup.max_size),
+            redis=redis if settings.dedup.shared else None,
+            key_prefix=settings.dedup.key_prefix,
+            ttl_seconds=settings.dedup.window_seconds,
+            claim_ttl_seconds=settings.dedup.claim_seconds,
+        )
+
+    async def flush(batch: list[dict[str, Any]]) -> None:
+        # The writer needs the admission controller, which needs the pool: bind it late.
+        await writer.write(batch)
+
+    pool = WorkerPool(
+        lambda: TelemetryBatcher(
+            flush,
+            max_rows=settings.batch.max_rows,
+            linger_ms=settings.batch.linger_ms,
+        ),
+        size=settings.workers.pool_size,
+        queue_depth=settings.workers.queue_depth,
+    )
+    sink: ReadingSink = pool
+    admission = None
+    if settings.admission.enabled:
+        admission = AdmissionController(
+            pool,
+            SpillJournal(
+                Path(settings.admission.journal_dir),
+                segment_bytes=settings.admission.segment_bytes,
+                max_bytes=settings.admission.max_bytes,
+            ),
+            max_queue_depth=settings.admission.max_queue_depth,
+            resume_queue_depth=settings.admission.resume_queue_depth,
+            max_commit_seconds=settings.admission.max_commit_ms / 1000.0,
+            replay_batch=settings.admission.replay_batch,
+            check_interval_seconds=settings.admission.check_interval_seconds,
+        )
+        sink = admission
+    writer = TelemetryWriter(
+        engine,
+        redis,
+        settings,
+        node_cache=node_cache,
+        health=health,
+        dedup=dedup,
+        admission=admission,
+        dead_letters=dead_letters,
+    )
+    pool.start()
+    if admission is not None:
+        admission.start()
+
+    if settings.metrics.enabled:
+        metrics.DB_POOL_SIZE.set(settings.database.pool_size)
+        metrics.track(metrics.DB_POOL_IN_USE, engine.sync_engine.pool.checkedout)
+        metrics.track(metrics.QUEUE_DEPTH, pool.qsize)
+        metrics.track(metrics.DEAD_LETTER_QUEUE_DEPTH, dead_letters.__len__)
+        metrics.start_metrics_server(settings.metrics.port)
 
     # Build TLS context only when a CA path is configured
     if settings.mqtt.tls_ca_path:
@@ -169,21 +459,43 @@ async def run_async() -> None:
     else:
         tls_context = None
 
-    async with Client(
-        settings.mqtt.host,
-        port=settings.mqtt.port,
-        username=settings.mqtt.username or None,
-        password=settings.mqtt.password or None,
-        tls_context=tls_context,
-    ) as client:
-        await client.subscribe(settings.mqtt.topic)
-        async for message in client.messages:
-            raw_payload = message.payload.decode()
-            try:
-                await handle_message(raw_payload, redis, engine, settings)
-            except Exception as exc:  # noqa: BLE001
-                logger.error("failed_to_process", error=str(exc))
+    sharding = settings.sharding
+    topic = subscription_topic(settings.mqtt.topic, sharding)
+    logger.info("subscribing", topic=topic, shard=sharding.index, shards=sharding.count, mode=sharding.mode)
+
+    try:
+        async with Client(
+            settings.mqtt.host,
+            port=settings.mqtt.port,
+            username=settings.mqtt.username or None,
+            password=settings.mqtt.password or None,
+            tls_context=tls_context,
+            # Shared subscriptions need MQTT v5.
+            protocol=ProtocolVersion.V5 if sharding.mode == "shared" else None,
+        ) as client:
+            await client.subscribe(topic)
+            async for message in client.messages:
+                if not owns(message.payload, sharding):
+                    metrics.MESSAGES_NOT_OWNED.inc()
+                    continue
+                try:
+                    await handle_message(message.payload, sink, dead_letters)
+                except Exception as exc:  # noqa: BLE001
+                    logger.error("failed_to_process", error=str(exc))
+    finally:
+        node_events.cancel()
+        await asyncio.gather(node_events, return_exceptions=True)
+        if admission is not None:
+            await admission.close()  # also closes the pool, after the last replay chunk
+        else:
+            await pool.close()
+        await health.close()
+        await dead_letters.close()
+        await engine.dispose()
 
 
 def run() -> None:
-    asyncio.run(run_async())
+    try:
+        asyncio.run(run_async())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("ingestor_stopped")
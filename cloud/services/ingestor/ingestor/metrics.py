@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+
+import structlog
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = structlog.get_logger()
+
+MESSAGES_RECEIVED = Counter(
+    "vineguard_ingestor_messages_received_total", "MQTT payloads handed to handle_message."
+)
+MESSAGES_NOT_OWNED = Counter(
+    "vineguard_ingestor_messages_not_owned_total", "Payloads skipped because another shard owns the device."
+)
+MESSAGES_VALIDATED = Counter(
+    "vineguard_ingestor_messages_validated_total", "Payloads that parsed and validated."
+)
+MESSAGES_DEAD_LETTERED = Counter(
+    "vineguard_ingestor_messages_dead_lettered_total",
+    "Payloads rejected to the dead-letter file.",
+    ["reason"],
+)
+MESSAGES_DUPLICATE = Counter(
+    "vineguard_ingestor_messages_duplicate_total", "Repeated gateway readings dropped before insert."
+)
+MESSAGES_PUBLISHED = Counter(
+    "vineguard_ingestor_messages_published_total", "Readings published to Redis after commit."
+)
+MESSAGES_SPILLED = Counter(
+    "vineguard_ingestor_messages_spilled_total", "Readings written to the admission journal."
+)
+MESSAGES_REPLAYED = Counter(
+    "vineguard_ingestor_messages_replayed_total", "Journalled readings fed back to the workers."
+)
+BATCHES_FAILED = Counter(
+    "vineguard_ingestor_batches_failed_total", "Batch writes that raised (DB or Redis)."
+)
+
+# Per-message parse is microseconds; batch DB / publish stages are milliseconds.
+_PARSE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01)
+_BATCH_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+PARSE_SECONDS = Histogram(
+    "vineguard_ingestor_parse_seconds", "Decode + validate time per payload.", buckets=_PARSE_BUCKETS
+)
+DB_SECONDS = Histogram(
+    "vineguard_ingestor_db_seconds", "Node lookup + insert + commit time per batch.", buckets=_BATCH_BUCKETS
+)
+PUBLISH_SECONDS = Histogram(
+    "vineguard_ingestor_publish_seconds", "Redis publish time per batch.", buckets=_BATCH_BUCKETS
+)
+BATCH_ROWS = Histogram(
+    "vineguard_ingestor_batch_rows",
+    "Readings per batch write.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+QUEUE_DEPTH = Gauge("vineguard_ingestor_queue_depth", "Readings waiting in the worker queues.")
+DEAD_LETTER_QUEUE_DEPTH = Gauge(
+    "vineguard_ingestor_dead_letter_queue_depth", "Rejected payloads waiting to be written."
+)
+JOURNAL_BYTES = Gauge("vineguard_ingestor_journal_bytes", "Readings waiting in the admission journal, in bytes.")
+ADMISSION_PRESSURE = Gauge(
+    "vineguard_ingestor_admission_pressure", "1 while new readings are being spilled to the journal."
+)
+DB_POOL_IN_USE = Gauge("vineguard_ingestor_db_pool_in_use", "DB connections currently checked out.")
+DB_POOL_SIZE = Gauge("vineguard_ingestor_db_pool_size", "Configured DB connection pool size.")
+
+
+def track(gauge: Gauge, fn: Callable[[], float]) -> None:
+    """Evaluate ``fn`` whenever the gauge is scraped."""
+    gauge.set_function(fn)
+
+
+def start_metrics_server(port: int) -> None:
+    start_http_server(port)
+    logger.info("metrics_listening", port=port)
+
+
+class LogSampler:
+    """Let one event through every ``every`` calls; the rest are only counted.
+
+    Replaces per-message info logging on the hot path: the sampled line
+    carries how many events it stands for.
+    """
+
+    def __init__(self, every: int) -> None:
+        self._every = max(1, every)
+        self._count = 0
+
+    def hit(self, n: int = 1) -> int:
+        """Record ``n`` events; returns how many to report now (0 = stay quiet)."""
+        self._count += n
+        if self._count < self._every:
+            return 0
+        count, self._count = self._count, 0
+        return count
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from . import codec
+from .models import nodes_table
+
+logger = structlog.get_logger()
+
+# Marks a device that is known NOT to be registered (negative entry).
+_UNREGISTERED = ""
+
+_RETRY_SECONDS = 5.0
+
+
+class NodeIdCache:
+    """Bounded device_id → node_id cache with TTL and LRU eviction.
+
+    Unregistered devices are cached too (with a shorter TTL) so a chatty
+    unprovisioned node does not cost a SELECT per message.  Entries are
+    dropped early when the API announces a newly provisioned node.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int,
+        ttl_seconds: float,
+        negative_ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_size = max(1, max_size)
+        self._ttl = ttl_seconds
+        self._negative_ttl = negative_ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, device_ids: Iterable[str]) -> tuple[dict[str, str | None], set[str]]:
+        """Split ``device_ids`` into cached results and misses.
+
+        Cached results map to the node id, or ``None`` for a cached
+        unregistered device.
+        """
+        now = self._clock()
+        found: dict[str, str | None] = {}
+        misses: set[str] = set()
+        for device_id in device_ids:
+            entry = self._entries.get(device_id)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[device_id]
+                misses.add(device_id)
+                continue
+            self._entries.move_to_end(device_id)
+            found[device_id] = entry[0] or None
+        return found, misses
+
+    def store(self, device_id: str, node_id: str | None) -> None:
+        ttl = self._ttl if node_id else self._negative_ttl
+        self._entries[device_id] = (node_id or _UNREGISTERED, self._clock() + ttl)
+        self._entries.move_to_end(device_id)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, device_id: str | None = None) -> None:
+        """Forget one device, or every device when ``device_id`` is None."""
+        if device_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(device_id, None)
+
+
+async def resolve_node_ids(conn, cache: NodeIdCache, device_ids: Iterable[str]) -> dict[str, str]:
+    """Return device_id → node_id for registered devices, querying only cache misses."""
+    found, misses = cache.lookup(set(device_ids))
+    if misses:
+        result = await conn.execute(
+            select(nodes_table.c.device_id, nodes_table.c.id).where(nodes_table.c.device_id.in_(misses))
+        )
+        fetched = {device_id: str(node_id) for device_id, node_id in result.all()}
+        for device_id in misses:
+            node_id = fetched.get(device_id)
+            cache.store(device_id, node_id)
+            found[device_id] = node_id
+    return {device_id: node_id for device_id, node_id in found.items() if node_id is not None}
+
+
+async def warm_node_cache(conn, cache: NodeIdCache, limit: int) -> int:
+    """Bulk-load up to ``limit`` registered nodes into the cache; returns the count."""
+    result = await conn.execute(select(nodes_table.c.device_id, nodes_table.c.id).limit(limit))
+    rows = result.all()
+    for device_id, node_id in rows:
+        cache.store(device_id, str(node_id))
+    return len(rows)
+
+
+async def listen_for_node_events(
+    redis: Redis, channel: str, cache: NodeIdCache, *, retry_seconds: float = _RETRY_SECONDS
+) -> None:
+    """Invalidate cache entries as the API announces provisioned nodes, forever.
+
+    Messages are JSON objects carrying a ``device_id``; anything else drops
+    the whole cache so a malformed event can never leave stale mappings.
+    After a Redis error it resubscribes every ``retry_seconds``; events may
+    have been missed meanwhile, so each resubscription drops the cache too.
+    """
+    reconnecting = False
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            if reconnecting:
+                cache.invalidate()
+                logger.info("node_cache_invalidated", device=None, reason="resubscribed")
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    device_id = codec.loads(message["data"])["device_id"]
+                except (ValueError, KeyError, TypeError):
+                    device_id = None
+                cache.invalidate(device_id)
+                logger.info("node_cache_invalidated", device=device_id)
+        except RedisError as exc:
+            logger.warning("node_events_redis_error", error=str(exc), retry_in=retry_seconds)
+            reconnecting = True
+            await asyncio.sleep(retry_seconds)
+        finally:
+            await pubsub.aclose()
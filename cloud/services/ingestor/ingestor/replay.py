@@ -0,0 +1,209 @@
+"""Re-feed dead-lettered payloads through ``handle_message``.
+
+Usage::
+
+    vineguard-ingestor-replay                 # configured dead-letter file + backups
+    vineguard-ingestor-replay a.jsonl b.jsonl.1.gz
+    vineguard-ingestor-replay --dry-run       # validate only, write nothing
+    vineguard-ingestor-replay --publish all   # also send the readings to live subscribers
+
+Payloads that are still rejected go to ``<dead-letter path>.rejected``
+(or ``--rejected``), never back into the files being replayed.  The live
+dead-letter file is first renamed to ``<name>.replaying-<UTC time>``, so
+a running ingestor starts a new one rather than appending to a file being
+replayed.  Each file is renamed to ``<name>.replayed-<UTC time>`` once all
+of its readings are stored, so running the command again does not insert
+them twice.  Replayed readings only move node health forward and, unless
+``--publish all`` is given, are not published.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import structlog
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from .batching import ReadingSink, TelemetryBatcher
+from .config import get_settings
+from .dead_letter import DeadLetterWriter, dead_letter_files, iter_dead_letters
+from .main import TelemetryWriter, build_dead_letter_sink, handle_message
+from .node_cache import NodeIdCache
+
+logger = structlog.get_logger()
+
+
+class _CountingSink:
+    """Counts accepted readings and forwards them to ``inner`` (if any)."""
+
+    def __init__(self, inner: ReadingSink | None) -> None:
+        self._inner = inner
+        self.accepted = 0
+
+    async def add(self, normalised: dict[str, Any]) -> None:
+        self.accepted += 1
+        if self._inner is not None:
+            await self._inner.add(normalised)
+
+
+class _DiscardRejects:
+    """Dry runs only report what would still be rejected."""
+
+    def write(self, raw: str, error: str) -> None:
+        pass
+
+
+def _stamp() -> str:
+    return datetime.now(tz=timezone.utc).strftime("%Y%m%dT%H%M%S")
+
+
+def mark_replayed(file: Path) -> Path:
+    """Rename a replayed dead-letter file out of the way of ``dead_letter_files``."""
+    target = file.with_name(f"{file.name}.replayed-{_stamp()}")
+    file.rename(target)
+    return target
+
+
+def take_live_file(path: Path) -> Path | None:
+    """Rename the live dead-letter file aside before it is replayed; None if there is none.
+
+    The ingestor opens the file for every append, so whatever it
+    dead-letters from now on goes to a new live file instead of being
+    renamed away unread by ``mark_replayed``.
+    """
+    if not path.exists():
+        return None
+    target = path.with_name(f"{path.name}.replaying-{_stamp()}")
+    path.rename(target)
+    return target
+
+
+def _replay_files(dead_letter_path: Path, files: list[Path], *, take_live: bool) -> list[Path]:
+    """The files to replay: ``files``, or the dead-letter file, its backups and earlier takes."""
+    if not files:
+        # Backups oldest first, then live files taken by earlier runs that failed, then the live file.
+        files = [f for f in dead_letter_files(dead_letter_path) if f != dead_letter_path]
+        files += sorted(dead_letter_path.parent.glob(f"{dead_letter_path.name}.replaying-*"))
+        if dead_letter_path.exists():
+            files.append(dead_letter_path)
+    # A shell glob such as dead-letter-*.jsonl* also matches files already replayed.
+    files = [f for f in files if ".replayed-" not in f.name]
+    if not take_live:
+        return files
+    live = dead_letter_path.resolve()
+    taken = [take_live_file(f) if f.resolve() == live else f for f in files]
+    return [f for f in taken if f is not None]
+
+
+async def replay(
+    files: list[Path],
+    sink: ReadingSink | None,
+    rejected: DeadLetterWriter,
+    *,
+    commit: Callable[[], Awaitable[None]] | None = None,
+) -> tuple[int, int]:
+    """Replay every record in ``files`` into ``sink``; returns (replayed, accepted).
+
+    With ``commit``, it is awaited after each file to store what the file
+    fed to ``sink``, and the file is then renamed by ``mark_replayed``.  If
+    ``commit`` raises, that file and the ones after it are left in place.
+    """
+    counter = _CountingSink(sink)
+    replayed = 0
+    for file in files:
+        for record in iter_dead_letters([file]):
+            raw = record.get("raw")
+            if not isinstance(raw, str):
+                continue
+            replayed += 1
+            await handle_message(raw, counter, rejected)
+        if commit is not None:
+            await commit()
+            logger.info("replay_file_done", path=str(file), moved_to=str(mark_replayed(file)))
+    return replayed, counter.accepted
+
+
+async def replay_async(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    dead_letter_path = Path(settings.dead_letter.path)
+    files = _replay_files(dead_letter_path, [Path(f) for f in args.files], take_live=not args.dry_run)
+    rejected_path = Path(args.rejected) if args.rejected else dead_letter_path.with_name(
+        f"{dead_letter_path.name}.rejected"
+    )
+    if not files:
+        logger.info("replay_nothing_to_do", path=str(dead_letter_path))
+        return
+
+    if args.dry_run:
+        replayed, accepted = await replay(files, None, _DiscardRejects())
+        logger.info("replay_dry_run", files=len(files), replayed=replayed, accepted=accepted)
+        return
+
+    redis = Redis.from_url(settings.redis.url)
+    engine = create_async_engine(settings.database.dsn)
+    node_cache = NodeIdCache(
+        max_size=settings.node_cache.max_size,
+        ttl_seconds=settings.node_cache.ttl_seconds,
+        negative_ttl_seconds=settings.node_cache.negative_ttl_seconds,
+    )
+    rejected = build_dead_letter_sink(settings, rejected_path)
+    rejected.start()
+    writer = TelemetryWriter(
+        engine,
+        redis,
+        settings,
+        node_cache=node_cache,
+        dead_letters=rejected,
+        historical=True,
+        publish=args.publish == "all",
+    )
+    failures: list[Exception] = []
+
+    async def write(batch: list[dict[str, Any]]) -> None:
+        try:
+            await writer.write(batch)
+        except Exception as exc:
+            failures.append(exc)  # a lingering flush only logs it
+            raise
+
+    batcher = TelemetryBatcher(
+        write, max_rows=args.batch_size or settings.batch.max_rows, linger_ms=settings.batch.linger_ms
+    )
+
+    async def commit() -> None:
+        await batcher.flush()
+        if failures:
+            raise failures[0]
+
+    try:
+        replayed, accepted = await replay(files, batcher, rejected, commit=commit)
+    except Exception as exc:
+        logger.error("replay_failed", error=str(exc))
+        raise SystemExit(1) from exc
+    finally:
+        await rejected.close()
+        await engine.dispose()
+        await redis.aclose()
+    logger.info("replay_complete", files=len(files), replayed=replayed, accepted=accepted)
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(prog="vineguard-ingestor-replay", description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="*", help="dead-letter files (default: configured path and its backups)")
+    parser.add_argument("--rejected", help="where still-rejected payloads are written")
+    parser.add_argument("--batch-size", type=int, help="readings per DB write (default: batch.max_rows)")
+    parser.add_argument(
+        "--publish", choices=("none", "all"), default="none",
+        help="none: no Redis traffic; all: publish every replayed reading to live subscribers",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="validate only; do not write to the DB or Redis")
+    asyncio.run(replay_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    run()
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import Any
+from typing import Annotated, Any
 
-from pydantic import BaseModel, Field, ValidationError  # noqa: F401 – re-exported for callers
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError  # noqa: F401 – re-exported for callers
+from typing_extensions import NotRequired, TypedDict
+
+from . import codec
 
 
 # ---------------------------------------------------------------------------
@@ -40,6 +43,8 @@ class TelemetryPayloadV1(BaseModel):
     tier: str = "basic"
     sensors: SensorsV1
     meta: MetaV1
+    # Gateway frame counter; retried and replayed publishes repeat it.
+    sequence: int | None = Field(default=None, alias="_sequence")
 
 
 class TelemetryPayloadLegacy(BaseModel):
@@ -53,6 +58,45 @@ class TelemetryPayloadLegacy(BaseModel):
     timestamp: int | float | str | None = None
 
 
+# ---------------------------------------------------------------------------
+# V1 fast path
+# ---------------------------------------------------------------------------
+# Same fields and bounds as the v1 models above, expressed as TypedDicts so a
+# single compiled validator can check raw JSON bytes without building model
+# instances.  Keep the two in sync; the model path is the reference.
+
+class _SensorsV1Fast(TypedDict):
+    soil_moisture_pct: Annotated[float, Field(ge=0, le=100)]
+    soil_temp_c: Annotated[float, Field(ge=-40, le=80)]
+    ambient_temp_c: Annotated[float, Field(ge=-40, le=60)]
+    ambient_humidity_pct: Annotated[float, Field(ge=0, le=100)]
+    pressure_hpa: NotRequired[Annotated[float | None, Field(ge=850, le=1100)]]
+    light_lux: Annotated[float, Field(ge=0, le=200000)]
+    leaf_wetness_pct: NotRequired[Annotated[float | None, Field(ge=0, le=100)]]
+
+
+class _MetaV1Fast(TypedDict):
+    battery_voltage: Annotated[float, Field(ge=0, le=5)]
+    battery_pct: NotRequired[Annotated[int | None, Field(ge=0, le=100)]]
+    rssi: NotRequired[int | None]
+    snr: NotRequired[float | None]
+    sensor_ok: NotRequired[bool]
+
+
+class _TelemetryV1Fast(TypedDict):
+    schema_version: str
+    device_id: Annotated[str, Field(pattern=r"^[a-zA-Z0-9_-]{4,64}$")]
+    gateway_id: NotRequired[str | None]
+    timestamp: NotRequired[int | float | str | None]
+    tier: NotRequired[str]
+    sensors: _SensorsV1Fast
+    meta: _MetaV1Fast
+    _sequence: NotRequired[int | None]
+
+
+_V1_FAST = TypeAdapter(_TelemetryV1Fast)
+
+
 # ---------------------------------------------------------------------------
 # Timestamp helper
 # ---------------------------------------------------------------------------
@@ -77,11 +121,89 @@ def _parse_timestamp(value: Any) -> datetime | None:
     return None
 
 
+def _normalise_v1(payload: dict[str, Any]) -> dict:
+    """Flatten a validated v1 payload (model dump by alias or fast-path dict).
+
+    ``sequence`` is only present when the gateway sent ``_sequence`` and a
+    timestamp: without one, ``recorded_at`` is the arrival time and a retry
+    could not be recognised by its (sequence, timestamp) key anyway.
+    """
+    sensors = payload["sensors"]
+    meta = payload["meta"]
+    stamped = _parse_timestamp(payload.get("timestamp"))
+    recorded_at = stamped or datetime.now(tz=timezone.utc)
+    normalised = {
+        "device_id": payload["device_id"],
+        "soil_moisture": sensors["soil_moisture_pct"],
+        "soil_temp_c": sensors["soil_temp_c"],
+        "ambient_temp_c": sensors["ambient_temp_c"],
+        "ambient_humidity": sensors["ambient_humidity_pct"],
+        "light_lux": sensors["light_lux"],
+        "battery_voltage": meta["battery_voltage"],
+        "battery_pct": meta.get("battery_pct"),
+        "leaf_wetness_pct": sensors.get("leaf_wetness_pct"),
+        "pressure_hpa": sensors.get("pressure_hpa"),
+        "rssi": meta.get("rssi"),
+        "schema_version": payload["schema_version"],
+        "recorded_at": recorded_at,
+    }
+    if payload.get("_sequence") is not None and stamped is not None:
+        normalised["sequence"] = payload["_sequence"]
+    return normalised
+
+
+def to_payload(normalised: dict[str, Any]) -> dict[str, Any]:
+    """The v1 payload of a normalised reading, for dead-lettering readings the DB rejected.
+
+    Replaying it through :func:`parse_message` yields the same reading.
+    """
+    payload = {
+        "schema_version": normalised["schema_version"],
+        "device_id": normalised["device_id"],
+        "timestamp": normalised["recorded_at"].isoformat(),
+        "sensors": {
+            "soil_moisture_pct": normalised["soil_moisture"],
+            "soil_temp_c": normalised["soil_temp_c"],
+            "ambient_temp_c": normalised["ambient_temp_c"],
+            "ambient_humidity_pct": normalised["ambient_humidity"],
+            "pressure_hpa": normalised.get("pressure_hpa"),
+            "light_lux": normalised["light_lux"],
+            "leaf_wetness_pct": normalised.get("leaf_wetness_pct"),
+        },
+        "meta": {
+            "battery_voltage": normalised["battery_voltage"],
+            "battery_pct": normalised.get("battery_pct"),
+            "rssi": normalised.get("rssi"),
+        },
+    }
+    if normalised.get("sequence") is not None:
+        payload["_sequence"] = normalised["sequence"]
+    return payload
+
+
 # ---------------------------------------------------------------------------
-# Public parsing entry point
+# Public parsing entry points
 # ---------------------------------------------------------------------------
 
-def parse_payload(raw: dict) -> dict:
+def parse_message(data: str | bytes) -> dict:
+    """Decode, validate and normalise a raw MQTT payload.
+
+    Well-formed v1 payloads are validated straight from the bytes by a
+    compiled TypedDict validator.  Anything that misses the fast path
+    (legacy payloads, invalid data) is decoded with :mod:`.codec` and
+    :func:`parse_payload`, so callers still get the usual errors.
+
+    Returns the same normalised dict as :func:`parse_payload`.  Raises
+    ``json.JSONDecodeError`` or ``pydantic.ValidationError``.
+    """
+    try:
+        return _normalise_v1(_V1_FAST.validate_json(data))
+    except ValidationError:
+        pass
+    return parse_payload(codec.loads(data))
+
+
+def parse_payload(raw: Any) -> dict:
     """Detect format (v1 if has 'schema_version', legacy otherwise).
 
     Validate with the appropriate Pydantic model and return a normalised dict
@@ -93,27 +215,12 @@ def parse_payload(raw: dict) -> dict:
             leaf_wetness_pct, pressure_hpa, rssi, schema_version, recorded_at
         }
 
-    Raises ``pydantic.ValidationError`` if the payload is invalid.
+    Raises ``pydantic.ValidationError`` if the payload is invalid, including
+    JSON that is not an object (a number, ``null``, a list).
     """
-    if "schema_version" in raw:
+    if isinstance(raw, dict) and "schema_version" in raw:
         # ---- canonical v1 ----
-        validated = TelemetryPayloadV1.model_validate(raw)
-        recorded_at = _parse_timestamp(validated.timestamp) or datetime.now(tz=timezone.utc)
-        return {
-            "device_id": validated.device_id,
-            "soil_moisture": validated.sensors.soil_moisture_pct,
-            "soil_temp_c": validated.sensors.soil_temp_c,
-            "ambient_temp_c": validated.sensors.ambient_temp_c,
-            "ambient_humidity": validated.sensors.ambient_humidity_pct,
-            "light_lux": validated.sensors.light_lux,
-            "battery_voltage": validated.meta.battery_voltage,
-            "battery_pct": validated.meta.battery_pct,
-            "leaf_wetness_pct": validated.sensors.leaf_wetness_pct,
-            "pressure_hpa": validated.sensors.pressure_hpa,
-            "rssi": validated.meta.rssi,
-            "schema_version": validated.schema_version,
-            "recorded_at": recorded_at,
-        }
+        return _normalise_v1(TelemetryPayloadV1.model_validate(raw).model_dump(by_alias=True))
     else:
         # ---- legacy camelCase ----
         validated = TelemetryPayloadLegacy.model_validate(raw)
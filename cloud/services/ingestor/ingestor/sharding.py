@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import re
+import zlib
+
+from . import codec
+from .config import ShardingSettings
+
+# The top-level id of a v1 or legacy payload.  Device ids are [A-Za-z0-9_-],
+# so a value with escapes (or no match at all) falls back to a full decode.
+_DEVICE_ID = re.compile(rb'"(?:device_id|deviceId)"\s*:\s*"([^"\\]*)"')
+
+
+def subscription_topic(topic: str, sharding: ShardingSettings) -> str:
+    """The topic filter this process subscribes to.
+
+    In ``shared`` mode the broker load-balances ``$share/<group>/<topic>``
+    across the group (MQTT v5); otherwise every process sees every message.
+    """
+    if sharding.mode == "shared":
+        return f"$share/{sharding.group}/{topic}"
+    return topic
+
+
+def process_shard_for(device_id: str, shards: int) -> int:
+    """Stable device_id → process index: the high half of crc32(device_id), modulo ``shards``.
+
+    The worker pool reduces the same crc by its low bits (``workers.shard_for``).
+    Taking both modulo their counts would correlate the levels: with 4 shards
+    and 4 workers each process would only ever feed one of its workers.
+    """
+    return (zlib.crc32(device_id.encode("utf-8")) >> 16) % shards
+
+
+def device_id_of(raw_payload: str | bytes) -> str | None:
+    """Best-effort device id of a raw payload (v1 or legacy), without validation.
+
+    Read with a regex rather than a full JSON decode, since every process
+    sees every message in ``hash`` mode.
+    """
+    data = raw_payload.encode("utf-8") if isinstance(raw_payload, str) else raw_payload
+    match = _DEVICE_ID.search(data)
+    if match is not None:
+        return match.group(1).decode("utf-8", errors="replace")
+    try:
+        payload = codec.loads(raw_payload)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+    device_id = payload.get("device_id") or payload.get("deviceId")
+    return device_id if isinstance(device_id, str) else None
+
+
+def owns(raw_payload: str | bytes, sharding: ShardingSettings) -> bool:
+    """Whether this process is responsible for ``raw_payload``.
+
+    ``hash`` mode routes on ``process_shard_for(device_id)``, so a device
+    always lands on one process and its readings stay in order.  Payloads
+    without a readable device id go to shard 0, which dead-letters them
+    exactly once.
+    """
+    if sharding.mode != "hash" or sharding.count == 1:
+        return True
+    device_id = device_id_of(raw_payload)
+    if device_id is None:
+        return sharding.index == 0
+    return process_shard_for(device_id, sharding.count) == sharding.index
@@ -0,0 +1,121 @@
+"""Run a group of ingestor processes and keep them alive.
+
+Each child is an ordinary ``ingestor.main.run`` with its shard index, metrics
+port and dead-letter file set through the environment, so a supervised
+child behaves exactly like a single ingestor started by hand with the same
+``INGESTOR_SHARDING__*`` variables.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+
+import structlog
+
+from .config import IngestorSettings, get_settings
+
+logger = structlog.get_logger()
+
+# Restart delay grows while a shard keeps crashing, capped at this many seconds,
+# and resets once a shard has stayed up for _STABLE_SECONDS.
+_MAX_BACKOFF_SECONDS = 30.0
+_STABLE_SECONDS = 60.0
+_POLL_SECONDS = 0.5
+
+
+def shard_environment(settings: IngestorSettings, index: int, count: int) -> dict[str, str]:
+    """Environment overrides for shard ``index`` of ``count``."""
+    mode = settings.sharding.mode if settings.sharding.mode != "off" else "hash"
+    dead_letter = Path(settings.dead_letter.path)
+    return {
+        "INGESTOR_SHARDING__MODE": mode,
+        "INGESTOR_SHARDING__INDEX": str(index),
+        "INGESTOR_SHARDING__COUNT": str(count),
+        "INGESTOR_METRICS__PORT": str(settings.metrics.port + index),
+        # Rotation is per file, so every shard gets its own dead-letter file.
+        "INGESTOR_DEAD_LETTER__PATH": str(dead_letter.with_name(f"{dead_letter.stem}-{index}{dead_letter.suffix}")),
+        "INGESTOR_ADMISSION__JOURNAL_DIR": str(Path(settings.admission.journal_dir) / f"shard-{index}"),
+    }
+
+
+def _run_shard(env: dict[str, str]) -> None:
+    os.environ.update(env)
+    from .main import run
+
+    run()
+
+
+class Supervisor:
+    """Start ``count`` shard processes and restart any that exit."""
+
+    def __init__(self, settings: IngestorSettings, count: int) -> None:
+        self._settings = settings
+        self._count = count
+        self._ctx = multiprocessing.get_context("spawn")
+        self._children: dict[int, BaseProcess] = {}
+        self._backoff = [0.0] * count
+        self._restart_at = [0.0] * count
+        self._started_at = [0.0] * count
+        self._stopping = False
+
+    def _start(self, index: int) -> None:
+        env = shard_environment(self._settings, index, self._count)
+        child = self._ctx.Process(target=_run_shard, args=(env,), name=f"ingestor-shard-{index}")
+        child.start()
+        self._children[index] = child
+        self._started_at[index] = time.monotonic()
+        logger.info("shard_started", shard=index, shards=self._count, pid=child.pid)
+
+    def stop(self, *_args: object) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self._count):
+            self._start(index)
+        while not self._stopping:
+            time.sleep(_POLL_SECONDS)
+            self._reap()
+        self._shutdown()
+
+    def _reap(self) -> None:
+        now = time.monotonic()
+        for index in range(self._count):
+            child = self._children.get(index)
+            if child is not None and child.is_alive():
+                continue
+            if child is not None:
+                self._children.pop(index)
+                if now - self._started_at[index] >= _STABLE_SECONDS:
+                    self._backoff[index] = 0.0
+                self._backoff[index] = min(_MAX_BACKOFF_SECONDS, self._backoff[index] * 2 or 1.0)
+                self._restart_at[index] = now + self._backoff[index]
+                logger.error("shard_exited", shard=index, exitcode=child.exitcode, restart_in=self._backoff[index])
+            elif now >= self._restart_at[index]:
+                self._start(index)
+
+    def _shutdown(self) -> None:
+        for child in self._children.values():
+            if child.is_alive():
+                child.terminate()  # SIGTERM: the child flushes its batches on the way out
+        for index, child in self._children.items():
+            child.join(timeout=30)
+            if child.is_alive():
+                logger.error("shard_kill", shard=index)
+                child.kill()
+        logger.info("supervisor_stopped")
+
+
+def run() -> None:
+    settings = get_settings()
+    count = settings.sharding.processes or os.cpu_count() or 1
+    Supervisor(settings, count).run()
+
+
+if __name__ == "__main__":
+    run()
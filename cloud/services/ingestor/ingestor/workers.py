@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+import zlib
+from collections.abc import Callable
+from typing import Any
+
+import structlog
+
+from .batching import TelemetryBatcher
+
+logger = structlog.get_logger()
+
+_STOP = object()
+
+
+def shard_for(device_id: str, shards: int) -> int:
+    """Stable device_id → shard index (same answer in every process)."""
+    return zlib.crc32(device_id.encode("utf-8")) % shards
+
+
+class WorkerPool:
+    """Fan validated readings out to ``size`` workers, each with its own batcher.
+
+    A device always hashes to the same worker, so its readings are written
+    in arrival order, while different devices commit concurrently on
+    separate DB connections.  Each worker has a bounded queue; ``add``
+    blocks when the target queue is full, pushing backpressure up to the
+    MQTT loop instead of buffering without limit.
+    """
+
+    def __init__(
+        self,
+        make_batcher: Callable[[], TelemetryBatcher],
+        *,
+        size: int,
+        queue_depth: int,
+    ) -> None:
+        self._size = max(1, size)
+        per_worker = max(1, queue_depth // self._size)
+        self._queues: list[asyncio.Queue[Any]] = [asyncio.Queue(maxsize=per_worker) for _ in range(self._size)]
+        self._batchers = [make_batcher() for _ in range(self._size)]
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def qsize(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._work(queue, batcher))
+            for queue, batcher in zip(self._queues, self._batchers)
+        ]
+
+    async def add(self, normalised: dict[str, Any]) -> None:
+        await self._queues[shard_for(normalised["device_id"], self._size)].put(normalised)
+
+    async def close(self) -> None:
+        """Drain every queue, flush every batcher and stop the workers."""
+        for queue in self._queues:
+            await queue.put(_STOP)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for batcher in self._batchers:
+            try:
+                await batcher.close()
+            except Exception as exc:  # noqa: BLE001
+                logger.error("batch_flush_failed", error=str(exc))
+
+    @staticmethod
+    async def _work(queue: asyncio.Queue[Any], batcher: TelemetryBatcher) -> None:
+        while True:
+            item = await queue.get()
+            if item is _STOP:
+                return
+            try:
+                await batcher.add(item)
+            except Exception as exc:  # noqa: BLE001
+                logger.error("failed_to_process", error=str(exc))
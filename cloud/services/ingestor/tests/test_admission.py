@@ -0,0 +1,227 @@
+"""Tests for admission control and the on-disk spill journal."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from ingestor.admission import AdmissionController, SpillJournal
+from ingestor.health import NodeHealthWriter
+
+T0 = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _reading(seq: int, device: str = "vg-node-001") -> dict:
+    return {"device_id": device, "soil_moisture": 30.0 + seq, "recorded_at": T0, "sequence": seq}
+
+
+class _FakePool:
+    def __init__(self) -> None:
+        self.added: list[dict] = []
+        self.depth = 0
+        self.closed = False
+
+    def qsize(self) -> int:
+        return self.depth
+
+    async def add(self, normalised: dict) -> None:
+        self.added.append(normalised)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def _controller(pool: _FakePool, journal: SpillJournal, **overrides) -> AdmissionController:
+    options = dict(
+        max_queue_depth=10,
+        resume_queue_depth=5,
+        max_commit_seconds=1.0,
+        replay_batch=100,
+        check_interval_seconds=0.01,
+    )
+    options.update(overrides)
+    return AdmissionController(pool, journal, **options)
+
+
+def _journal(tmp_path: Path, **overrides) -> SpillJournal:
+    options = dict(segment_bytes=1024 * 1024, max_bytes=1024 * 1024)
+    options.update(overrides)
+    return SpillJournal(tmp_path / "journal", **options)
+
+
+def test_journal_round_trips_readings_in_order_across_segments(tmp_path):
+    journal = _journal(tmp_path, segment_bytes=200)
+    for seq in range(10):
+        journal.append(_reading(seq))
+    journal.flush()
+    assert len(list((tmp_path / "journal").glob("segment-*.jsonl"))) > 1
+
+    first = journal.read(4)
+    rest = journal.read(100)
+
+    assert [r["sequence"] for r in first + rest] == list(range(10))
+    assert rest[0]["recorded_at"] == T0
+    assert not journal
+    assert journal.size_bytes == 0
+
+
+def test_requeued_readings_are_read_before_the_rest_of_the_journal(tmp_path):
+    journal = _journal(tmp_path)
+    for seq in range(6):
+        journal.append(_reading(seq))
+
+    chunk = journal.read(2)
+    journal.requeue(chunk)
+    assert [r["sequence"] for r in journal.read(3)] == [0, 1, 2]
+    journal.requeue([_reading(9)])
+    journal.close()
+
+    reopened = _journal(tmp_path)
+    assert [r["sequence"] for r in reopened.read(10)] == [9, 3, 4, 5]
+    assert not reopened
+
+
+def test_journal_picks_up_segments_left_by_a_previous_run(tmp_path):
+    journal = _journal(tmp_path)
+    journal.append(_reading(1))
+    journal.append(_reading(2))
+    journal.close()
+
+    reopened = _journal(tmp_path)
+    assert reopened
+    reopened.append(_reading(3))
+    assert [r["sequence"] for r in reopened.read(10)] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_add_goes_to_the_pool_without_pressure(tmp_path):
+    pool = _FakePool()
+    controller = _controller(pool, _journal(tmp_path))
+
+    await controller.add(_reading(1))
+
+    assert [r["sequence"] for r in pool.added] == [1]
+
+
+@pytest.mark.asyncio
+async def test_deep_queue_spills_and_later_readings_queue_behind_the_journal(tmp_path):
+    pool = _FakePool()
+    controller = _controller(pool, _journal(tmp_path))
+
+    pool.depth = 10
+    await controller.add(_reading(1))
+    pool.depth = 0
+    await controller.add(_reading(2))  # journal not drained yet: must not overtake reading 1
+    assert pool.added == []
+
+    assert await controller.tick() == 2
+    assert [r["sequence"] for r in pool.added] == [1, 2]
+    await controller.add(_reading(3))
+    assert [r["sequence"] for r in pool.added] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_node_health_does_not_go_backwards_when_the_journal_drains(tmp_path):
+    health = NodeHealthWriter(MagicMock(), interval_seconds=60)
+    pool = _FakePool()
+    pool.add = AsyncMock(side_effect=health.record)  # the writer records health once stored
+    controller = _controller(pool, _journal(tmp_path))
+
+    pool.depth = 10
+    await controller.add(dict(_reading(1), battery_voltage=3.5, recorded_at=T0))
+    pool.depth = 0  # pressure clears while the backlog is still journalled
+    await controller.add(dict(_reading(2), battery_voltage=3.9, recorded_at=T0 + timedelta(minutes=1)))
+    await controller.tick()
+
+    assert health._pending["vg-node-001"]["battery_voltage"] == 3.9
+
+
+@pytest.mark.asyncio
+async def test_replay_waits_until_the_queue_drops_below_resume_depth(tmp_path):
+    pool = _FakePool()
+    controller = _controller(pool, _journal(tmp_path), replay_batch=2)
+    pool.depth = 10
+    for seq in range(3):
+        await controller.add(_reading(seq))
+
+    pool.depth = 7
+    assert await controller.tick() == 0
+    pool.depth = 0
+    assert await controller.tick() == 3  # keeps going chunk after chunk while there is room
+    assert await controller.tick() == 0
+
+
+@pytest.mark.asyncio
+async def test_replay_stops_once_the_queue_reaches_resume_depth(tmp_path):
+    pool = _FakePool()
+    controller = _controller(pool, _journal(tmp_path), replay_batch=2)
+    pool.depth = 10
+    for seq in range(10):
+        await controller.add(_reading(seq))
+
+    pool.qsize = lambda: len(pool.added)  # replayed readings stay queued
+    assert await controller.tick() == 6
+    assert [r["sequence"] for r in pool.added] == list(range(6))
+
+
+@pytest.mark.asyncio
+async def test_replay_under_pressure_sends_one_chunk_per_tick(tmp_path):
+    pool = _FakePool()
+    controller = _controller(pool, _journal(tmp_path), replay_batch=2)
+    controller.spill_failed([_reading(seq) for seq in range(5)])
+
+    assert await controller.tick() == 2
+    controller.record_commit(0.01)
+    assert await controller.tick() == 3
+
+
+@pytest.mark.asyncio
+async def test_slow_commits_spill_until_latency_recovers(tmp_path):
+    pool = _FakePool()
+    controller = _controller(pool, _journal(tmp_path))
+
+    for _ in range(20):
+        controller.record_commit(5.0)
+    assert controller.under_pressure()
+    for _ in range(20):
+        controller.record_commit(0.01)
+    assert not controller.under_pressure()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_journalled_and_replayed(tmp_path):
+    pool = _FakePool()
+    controller = _controller(pool, _journal(tmp_path))
+
+    controller.spill_failed([_reading(1), _reading(2)])
+    assert controller.under_pressure()
+    await controller.add(_reading(3))
+    assert pool.added == []
+
+    await controller.tick()
+    assert [r["sequence"] for r in pool.added] == [1, 2, 3]
+    controller.record_commit(0.01)
+    assert not controller.under_pressure()
+
+
+@pytest.mark.asyncio
+async def test_full_journal_falls_back_to_blocking_on_the_pool(tmp_path):
+    pool = _FakePool()
+    controller = _controller(pool, _journal(tmp_path, max_bytes=1))
+    pool.depth = 10
+
+    await controller.add(_reading(1))
+    await controller.add(_reading(2))
+
+    assert [r["sequence"] for r in pool.added] == [2]
+
+
+@pytest.mark.asyncio
+async def test_close_stops_replay_and_closes_the_pool(tmp_path):
+    pool = _FakePool()
+    controller = _controller(pool, _journal(tmp_path))
+    controller.start()
+    await controller.close()
+    assert pool.closed
@@ -0,0 +1,216 @@
+"""Tests for the ingestor micro-batching stage."""
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from ingestor import codec
+from ingestor.batching import TelemetryBatcher
+from ingestor.config import IngestorSettings
+from ingestor.dedup import DedupWindow, Deduplicator
+from ingestor.main import TelemetryWriter
+from ingestor.models import telemetry_table
+from ingestor.node_cache import NodeIdCache
+from ingestor.schemas import parse_message, to_payload
+
+
+def _reading(device_id: str = "vg-node-001") -> dict:
+    return {"device_id": device_id, "soil_moisture": 23.5}
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.batches: list[list[dict]] = []
+
+    async def __call__(self, batch: list[dict]) -> None:
+        self.batches.append(batch)
+
+
+@pytest.mark.asyncio
+async def test_flushes_when_batch_is_full():
+    recorder = _Recorder()
+    batcher = TelemetryBatcher(recorder, max_rows=3, linger_ms=10_000)
+
+    for _ in range(7):
+        await batcher.add(_reading())
+
+    assert [len(b) for b in recorder.batches] == [3, 3]
+    assert len(batcher) == 1
+
+
+@pytest.mark.asyncio
+async def test_flushes_partial_batch_after_linger():
+    recorder = _Recorder()
+    batcher = TelemetryBatcher(recorder, max_rows=100, linger_ms=10)
+
+    await batcher.add(_reading("vg-node-001"))
+    await batcher.add(_reading("vg-node-002"))
+    assert recorder.batches == []
+
+    await asyncio.sleep(0.05)
+
+    assert len(recorder.batches) == 1
+    assert [r["device_id"] for r in recorder.batches[0]] == ["vg-node-001", "vg-node-002"]
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_remaining_rows():
+    recorder = _Recorder()
+    batcher = TelemetryBatcher(recorder, max_rows=100, linger_ms=10_000)
+
+    await batcher.add(_reading())
+    await batcher.close()
+
+    assert len(recorder.batches) == 1
+    assert len(batcher) == 0
+
+
+@pytest.mark.asyncio
+async def test_close_on_empty_batcher_is_noop():
+    recorder = _Recorder()
+    batcher = TelemetryBatcher(recorder, max_rows=10, linger_ms=10)
+
+    await batcher.close()
+
+    assert recorder.batches == []
+
+
+# ---------------------------------------------------------------------------
+# Batch writer (SQLite stands in for TimescaleDB)
+# ---------------------------------------------------------------------------
+
+_SCHEMA = (
+    """
+    CREATE TABLE nodes (
+        id CHAR(32) PRIMARY KEY, block_id CHAR(32), device_id VARCHAR(64) NOT NULL UNIQUE,
+        name VARCHAR, tier VARCHAR(16), last_seen_at DATETIME, battery_voltage FLOAT,
+        battery_pct INTEGER, rssi_last INTEGER, status VARCHAR(16)
+    )
+    """,
+    """
+    CREATE TABLE telemetry_readings (
+        id CHAR(32) PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))), device_id VARCHAR(64) NOT NULL,
+        node_id CHAR(32), soil_moisture FLOAT NOT NULL, soil_temp_c FLOAT NOT NULL,
+        ambient_temp_c FLOAT NOT NULL, ambient_humidity FLOAT NOT NULL, light_lux FLOAT NOT NULL,
+        battery_voltage FLOAT NOT NULL, leaf_wetness_pct FLOAT, pressure_hpa FLOAT,
+        schema_version VARCHAR(8), recorded_at DATETIME NOT NULL
+    )
+    """,
+)
+
+
+class _FakePipeline:
+    def __init__(self, redis: "_FakeRedis"):
+        self._redis = redis
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def publish(self, channel, message):
+        self._redis.published.append(json.loads(message))
+
+    async def execute(self):
+        pass
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.published: list[dict] = []
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _DeadLetters:
+    def __init__(self) -> None:
+        self.records: list[tuple[str, str]] = []
+
+    def write(self, raw: str, error: str) -> None:
+        self.records.append((raw, error))
+
+
+def _full_reading(seq: int, soil_moisture: float | None = 23.5) -> dict:
+    return {
+        "device_id": "vg-node-001", "soil_moisture": soil_moisture, "soil_temp_c": 18.2,
+        "ambient_temp_c": 21.3, "ambient_humidity": 65.4, "light_lux": 245.0, "battery_voltage": 3.87,
+        "battery_pct": 72, "leaf_wetness_pct": None, "pressure_hpa": None, "rssi": -85,
+        "schema_version": "1.0", "recorded_at": datetime(2025, 6, 1, 12, seq, tzinfo=timezone.utc),
+        "sequence": seq,
+    }
+
+
+@pytest.mark.asyncio
+async def test_a_rejected_row_is_dead_lettered_and_the_rest_of_its_batch_stored(tmp_path):
+    pytest.importorskip("aiosqlite")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'writer.db'}")
+    async with engine.begin() as conn:
+        for ddl in _SCHEMA:
+            await conn.execute(text(ddl))
+    redis, dead_letters = _FakeRedis(), _DeadLetters()
+    dedup = Deduplicator(DedupWindow(window_seconds=60, max_size=100))
+    writer = TelemetryWriter(
+        engine,
+        redis,
+        IngestorSettings(database={"dsn": "sqlite+aiosqlite://"}),
+        node_cache=NodeIdCache(max_size=10, ttl_seconds=60, negative_ttl_seconds=60),
+        dedup=dedup,
+        dead_letters=dead_letters,
+    )
+
+    try:
+        await writer.write([_full_reading(1), _full_reading(2, soil_moisture=None), _full_reading(3)])
+        async with engine.connect() as conn:
+            stored = (await conn.execute(select(telemetry_table.c.recorded_at))).scalars().all()
+    finally:
+        await engine.dispose()
+
+    assert [ts.minute for ts in stored] == [1, 3]
+    assert [m["recorded_at"][14:16] for m in redis.published] == ["01", "03"]
+    [(raw, error)] = dead_letters.records
+    assert error.startswith("IntegrityError") and "soil_moisture" in error
+    assert json.loads(raw)["_sequence"] == 2
+    assert parse_message(codec.dumps(to_payload(_full_reading(2)))) == _full_reading(2)
+    # Only the stored readings stay claimed: a corrected copy of the rejected one is accepted.
+    assert len((await dedup.claim([_full_reading(2)]))[0]) == 1
+    assert (await dedup.claim([_full_reading(1)]))[0] == []
+
+
+@pytest.mark.asyncio
+async def test_historical_readings_do_not_move_node_health_back_or_reach_live_subscribers(tmp_path):
+    pytest.importorskip("aiosqlite")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'writer.db'}")
+    async with engine.begin() as conn:
+        for ddl in _SCHEMA:
+            await conn.execute(text(ddl))
+        await conn.execute(text(
+            "INSERT INTO nodes (id, device_id, last_seen_at, battery_voltage, status) "
+            "VALUES ('00000000000000000000000000000001', 'vg-node-001', '2025-06-01 13:00:00.000000', 4.1, 'active')"
+        ))
+    redis = _FakeRedis()
+    writer = TelemetryWriter(
+        engine,
+        redis,
+        IngestorSettings(database={"dsn": "sqlite+aiosqlite://"}),
+        historical=True,
+        publish=False,
+    )
+
+    try:
+        await writer.write([_full_reading(2), _full_reading(1)])
+        async with engine.connect() as conn:
+            health = (await conn.execute(text("SELECT last_seen_at, battery_voltage FROM nodes"))).one()
+            stored = (await conn.execute(select(telemetry_table.c.recorded_at))).scalars().all()
+    finally:
+        await engine.dispose()
+
+    assert len(stored) == 2
+    assert tuple(health) == ("2025-06-01 13:00:00.000000", 4.1)
+    assert redis.published == []
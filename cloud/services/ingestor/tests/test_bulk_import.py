@@ -0,0 +1,142 @@
+"""Tests for the JSONL bulk importer (SQLite stands in for TimescaleDB)."""
+from __future__ import annotations
+
+import gzip
+import itertools
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from ingestor import bulk_import
+from ingestor.bulk_import import BulkImporter, iter_lines
+from ingestor.dead_letter import DeadLetterSink, iter_dead_letters
+from ingestor.dedup import DedupWindow, Deduplicator
+from ingestor.models import nodes_table, telemetry_table
+from ingestor.node_cache import NodeIdCache
+
+pytest.importorskip("aiosqlite")
+
+_SCHEMA = (
+    """
+    CREATE TABLE nodes (
+        id CHAR(32) PRIMARY KEY, block_id CHAR(32), device_id VARCHAR(64) NOT NULL UNIQUE,
+        name VARCHAR, tier VARCHAR(16), last_seen_at DATETIME, battery_voltage FLOAT,
+        battery_pct INTEGER, rssi_last INTEGER, status VARCHAR(16)
+    )
+    """,
+    """
+    CREATE TABLE telemetry_readings (
+        id CHAR(32) PRIMARY KEY, device_id VARCHAR(64) NOT NULL, node_id CHAR(32),
+        soil_moisture FLOAT NOT NULL, soil_temp_c FLOAT NOT NULL, ambient_temp_c FLOAT NOT NULL,
+        ambient_humidity FLOAT NOT NULL, light_lux FLOAT NOT NULL, battery_voltage FLOAT NOT NULL,
+        leaf_wetness_pct FLOAT, pressure_hpa FLOAT, schema_version VARCHAR(8), recorded_at DATETIME NOT NULL
+    )
+    """,
+)
+
+
+def _v1(device_id: str, timestamp: int, sequence: int) -> str:
+    return json.dumps({
+        "schema_version": "1.0",
+        "device_id": device_id,
+        "timestamp": timestamp,
+        "sensors": {
+            "soil_moisture_pct": 23.5, "soil_temp_c": 18.2, "ambient_temp_c": 21.3,
+            "ambient_humidity_pct": 65.4, "light_lux": 245.0,
+        },
+        "meta": {"battery_voltage": 3.87, "battery_pct": 72, "rssi": -85},
+        "_sequence": sequence,
+    })
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'import.db'}")
+    async with engine.begin() as conn:
+        for ddl in _SCHEMA:
+            await conn.execute(text(ddl))
+        await conn.execute(insert(nodes_table), [{"id": uuid.uuid4(), "device_id": "vg-node-001"}])
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_import_chunks_dedups_rejects_and_updates_health(engine, tmp_path):
+    source = tmp_path / "backlog.jsonl.gz"
+    with gzip.open(source, "wt") as fh:
+        fh.write(_v1("vg-node-001", 1700000000, 1) + "\n")
+        fh.write(_v1("vg-node-001", 1700000000, 1) + "\n")  # gateway retry
+        fh.write(_v1("vg-node-001", 1700000300, 2) + "\n")
+        fh.write(_v1("vg-node-002", 1700000000, 1) + "\n")  # unregistered device
+        fh.write("{not json\n")
+        fh.write("null\n")
+    rejected = DeadLetterSink(tmp_path / "rejected.jsonl", max_bytes=1 << 20, backups=1)
+    rejected.start()
+    importer = BulkImporter(
+        engine,
+        chunk_rows=2,
+        rejected=rejected,
+        node_cache=NodeIdCache(max_size=10, ttl_seconds=60, negative_ttl_seconds=60),
+        dedup=Deduplicator(DedupWindow(window_seconds=60, max_size=100)),
+    )
+
+    for line in iter_lines([source]):
+        await importer.feed(line)
+    await importer.finish()
+    await rejected.close()
+
+    assert importer.stats == {"lines": 6, "imported": 3, "rejected": 2, "duplicates": 1}
+    async with engine.connect() as conn:
+        count = await conn.scalar(select(func.count()).select_from(telemetry_table))
+        node = (await conn.execute(select(nodes_table))).mappings().one()
+    assert count == 3
+    assert node["status"] == "active"
+    assert node["last_seen_at"] == datetime.fromtimestamp(1700000300, tz=timezone.utc).replace(tzinfo=None)
+    assert [r["raw"] for r in iter_dead_letters([tmp_path / "rejected.jsonl"])] == ["{not json", "null"]
+    assert len(importer.latest_messages()) == 2
+
+
+@pytest.mark.asyncio
+async def test_a_failed_import_reports_the_lines_to_skip_when_resuming(engine, tmp_path, monkeypatch):
+    source = tmp_path / "backlog.jsonl"
+    source.write_text("".join(_v1("vg-node-001", 1700000000 + 300 * i, i) + "\n" for i in range(5)))
+    calls = 0
+    real_copy = bulk_import.copy_readings
+
+    async def flaky_copy(conn, rows):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise ConnectionError("connection lost")
+        await real_copy(conn, rows)
+
+    def importer() -> BulkImporter:
+        return BulkImporter(
+            engine,
+            chunk_rows=2,
+            rejected=DeadLetterSink(tmp_path / "rejected.jsonl", max_bytes=1 << 20, backups=1),
+            node_cache=NodeIdCache(max_size=10, ttl_seconds=60, negative_ttl_seconds=60),
+            dedup=dedup,
+        )
+
+    dedup = Deduplicator(DedupWindow(window_seconds=60, max_size=100))
+    first = importer()
+    monkeypatch.setattr(bulk_import, "copy_readings", flaky_copy)
+    with pytest.raises(ConnectionError):
+        for line in iter_lines([source]):
+            await first.feed(line)
+    assert first.committed_lines == 2
+
+    resumed = importer()
+    for line in itertools.islice(iter_lines([source]), first.committed_lines, None):
+        await resumed.feed(line)
+    await resumed.finish()
+
+    async with engine.connect() as conn:
+        stored = (await conn.execute(select(telemetry_table.c.recorded_at))).scalars().all()
+    assert len(stored) == len(set(stored)) == 5
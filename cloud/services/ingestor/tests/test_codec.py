@@ -0,0 +1,58 @@
+"""Tests for the pluggable JSON codec."""
+from __future__ import annotations
+
+import json
+import math
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from ingestor import codec
+
+_MESSAGE = {
+    "id": uuid.UUID("6f1c1e0e-8a7c-4d55-9a6e-0a4b8f3f2a11"),
+    "device_id": "vg-node-001",
+    "node_id": None,
+    "soil_moisture": 23.5,
+    "battery_pct": 72,
+    "recorded_at": datetime(2023, 11, 14, 22, 13, 20, 123456, tzinfo=timezone.utc),
+}
+
+
+@pytest.fixture(params=["orjson", "msgspec", "json"])
+def backend(request):
+    active = codec.configure(request.param)
+    if active != request.param:
+        codec.configure()
+        pytest.skip(f"{request.param} not installed")
+    yield active
+    codec.configure()
+
+
+def test_encoding_matches_stdlib_default_str(backend):
+    expected = json.dumps(_MESSAGE, separators=(",", ":"), default=str)
+    assert codec.dumps(_MESSAGE) == expected
+    assert codec.dumpb(_MESSAGE) == expected.encode()
+
+
+def test_decode_round_trip(backend):
+    assert codec.loads(b'{"a":1,"b":[1.5,null,"x"]}') == {"a": 1, "b": [1.5, None, "x"]}
+
+
+def test_decode_errors_are_json_decode_errors(backend):
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads(b"{not json")
+
+
+def test_floats_decode_to_the_same_values(backend):
+    values = [1e16, 1e-7, 0.1, 23.5, -40.0]
+    assert json.loads(codec.dumps(values)) == values
+
+
+def test_non_finite_floats(backend):
+    decoded = json.loads(codec.dumps({"snr": math.nan}))["snr"]
+    if backend == "orjson":
+        assert decoded is None  # valid JSON for browsers too
+    else:
+        assert math.isnan(decoded)
@@ -0,0 +1,153 @@
+"""Tests for the buffered dead-letter sink and replay."""
+from __future__ import annotations
+
+import gzip
+import json
+
+import pytest
+
+from ingestor.dead_letter import DeadLetterSink, dead_letter_files, iter_dead_letters
+from ingestor.replay import _replay_files, replay, run
+
+_V1 = {
+    "schema_version": "1.0",
+    "device_id": "vg-node-001",
+    "timestamp": 1700000000,
+    "sensors": {
+        "soil_moisture_pct": 23.5,
+        "soil_temp_c": 18.2,
+        "ambient_temp_c": 21.3,
+        "ambient_humidity_pct": 65.4,
+        "light_lux": 245.0,
+    },
+    "meta": {"battery_voltage": 3.87, "battery_pct": 72, "rssi": -85},
+}
+
+
+class _ListSink:
+    def __init__(self) -> None:
+        self.readings: list[dict] = []
+
+    async def add(self, normalised: dict) -> None:
+        self.readings.append(normalised)
+
+
+@pytest.mark.asyncio
+async def test_close_writes_queued_records(tmp_path):
+    path = tmp_path / "dead.jsonl"
+    sink = DeadLetterSink(path, max_bytes=1 << 20, backups=2)
+    sink.start()
+    sink.write("{bad", "JSONDecodeError: boom")
+    sink.write("{}", "validation")
+
+    await sink.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["raw"] for r in records] == ["{bad", "{}"]
+    assert records[0]["error"] == "JSONDecodeError: boom"
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_instead_of_blocking(tmp_path):
+    sink = DeadLetterSink(tmp_path / "dead.jsonl", max_bytes=1 << 20, backups=2, queue_size=2)
+
+    for _ in range(5):
+        sink.write("x", "err")
+
+    assert len(sink) == 2
+    assert sink.dropped == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compress", [False, True])
+async def test_rotation_keeps_bounded_backups(tmp_path, compress):
+    path = tmp_path / "dead.jsonl"
+    sink = DeadLetterSink(path, max_bytes=1, backups=2, compress=compress)
+
+    for i in range(4):
+        sink.write(f"payload-{i}", "err")
+        await sink.close()
+
+    files = dead_letter_files(path)
+    assert [f.name for f in files] == [
+        f"dead.jsonl.2{'.gz' if compress else ''}",
+        f"dead.jsonl.1{'.gz' if compress else ''}",
+    ]
+    if compress:
+        with gzip.open(files[-1], "rt") as fh:
+            assert json.loads(fh.read())["raw"] == "payload-3"
+    assert [r["raw"] for r in iter_dead_letters(files)] == ["payload-2", "payload-3"]
+
+
+@pytest.mark.asyncio
+async def test_replay_refeeds_through_handle_message(tmp_path):
+    path = tmp_path / "dead.jsonl"
+    sink = DeadLetterSink(path, max_bytes=1 << 20, backups=2)
+    sink.write(json.dumps(_V1), "schema was too strict")
+    sink.write("{still bad", "JSONDecodeError")
+    await sink.close()
+
+    readings = _ListSink()
+    rejected = DeadLetterSink(tmp_path / "rejected.jsonl", max_bytes=1 << 20, backups=2)
+    replayed, accepted = await replay(dead_letter_files(path), readings, rejected)
+    await rejected.close()
+
+    assert (replayed, accepted) == (2, 1)
+    assert readings.readings[0]["device_id"] == "vg-node-001"
+    assert [r["raw"] for r in iter_dead_letters([tmp_path / "rejected.jsonl"])] == ["{still bad"]
+
+
+@pytest.mark.asyncio
+async def test_replayed_files_are_moved_aside_once_committed(tmp_path):
+    path = tmp_path / "dead.jsonl"
+    path.write_text(json.dumps({"raw": json.dumps(_V1), "error": "x"}) + "\n")
+    backup = tmp_path / "dead.jsonl.1"
+    backup.write_text(json.dumps({"raw": json.dumps(_V1), "error": "x"}) + "\n")
+    readings = _ListSink()
+    commits: list[int] = []
+
+    async def commit() -> None:
+        commits.append(len(readings.readings))
+        if len(commits) == 2:
+            raise ConnectionError("database went away")
+
+    rejected = DeadLetterSink(tmp_path / "rejected.jsonl", max_bytes=1 << 20, backups=2)
+    with pytest.raises(ConnectionError):
+        await replay(dead_letter_files(path), readings, rejected, commit=commit)
+
+    assert commits == [1, 2]
+    assert dead_letter_files(path) == [path]  # the backup was stored and moved aside; the live file stays
+    assert [p.name.split(".replayed-")[0] for p in tmp_path.glob("*.replayed-*")] == ["dead.jsonl.1"]
+
+
+@pytest.mark.asyncio
+async def test_the_live_file_is_taken_aside_so_dead_letters_written_meanwhile_are_kept(tmp_path):
+    path = tmp_path / "dead.jsonl"
+    record = json.dumps({"raw": json.dumps(_V1), "error": "x"}) + "\n"
+    path.write_text(record)
+    earlier_take = tmp_path / "dead.jsonl.replaying-20250101T000000"  # left by a run that failed
+    earlier_take.write_text(record)
+
+    files = _replay_files(path, [], take_live=True)
+    assert not path.exists()
+    assert files[0] == earlier_take and files[1].name.startswith("dead.jsonl.replaying-")
+    with path.open("a") as fh:  # the running ingestor dead-letters another payload
+        fh.write(record)
+
+    async def commit() -> None:
+        pass
+
+    rejected = DeadLetterSink(tmp_path / "rejected.jsonl", max_bytes=1 << 20, backups=2)
+    await replay(files, _ListSink(), rejected, commit=commit)
+
+    assert path.read_text() == record
+    assert _replay_files(path, [], take_live=False) == [path]
+
+
+def test_help_does_not_need_settings(monkeypatch, capsys):
+    monkeypatch.delenv("INGESTOR_DATABASE__DSN", raising=False)
+    monkeypatch.setattr("sys.argv", ["vineguard-ingestor-replay", "--help"])
+    with pytest.raises(SystemExit) as exit_info:
+        run()
+    assert exit_info.value.code == 0
+    assert "--batch-size" in capsys.readouterr().out
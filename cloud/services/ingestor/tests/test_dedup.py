@@ -0,0 +1,153 @@
+"""Tests for the duplicate-reading index."""
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from ingestor.dedup import DedupWindow, Deduplicator, dedup_key
+from ingestor.schemas import parse_message
+
+_TS = datetime(2023, 11, 14, 22, 13, 20, tzinfo=timezone.utc)
+
+
+def _reading(device_id: str = "vg-node-001", sequence: int | None = 7, recorded_at: datetime = _TS) -> dict:
+    reading = {"device_id": device_id, "recorded_at": recorded_at}
+    if sequence is not None:
+        reading["sequence"] = sequence
+    return reading
+
+
+class _FakePipeline:
+    def __init__(self, redis: "_FakeRedis"):
+        self._redis = redis
+        self._keys: list[tuple[str, int]] = []
+        self._expires: list[tuple[str, int]] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def set(self, key, value, nx=False, ex=None):
+        assert nx and ex
+        self._keys.append((key, ex))
+
+    def expire(self, key, seconds):
+        self._expires.append((key, seconds))
+
+    async def execute(self):
+        results = []
+        for key, ex in self._keys:
+            results.append(None if key in self._redis.keys else True)
+            self._redis.keys.setdefault(key, ex)
+        for key, seconds in self._expires:
+            self._redis.keys[key] = seconds
+        return results
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.keys: dict[str, int] = {}  # key -> TTL in seconds
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.keys.pop(key, None)
+
+
+def _window(**kwargs) -> DedupWindow:
+    return DedupWindow(window_seconds=kwargs.pop("window_seconds", 60), max_size=kwargs.pop("max_size", 100), **kwargs)
+
+
+def test_sequence_is_carried_through_both_parse_paths():
+    payload = {
+        "schema_version": "1.0",
+        "device_id": "vg-node-001",
+        "timestamp": 1700000000,
+        "sensors": {
+            "soil_moisture_pct": 23.5, "soil_temp_c": 18.2, "ambient_temp_c": 21.3,
+            "ambient_humidity_pct": 65.4, "light_lux": 245.0,
+        },
+        "meta": {"battery_voltage": 3.87},
+        "_sequence": 41,
+    }
+    assert parse_message(json.dumps(payload))["sequence"] == 41
+    assert dedup_key(parse_message(json.dumps(payload))) == "vg-node-001:41:1700000000"
+
+
+def test_readings_without_sequence_are_never_deduplicated():
+    assert dedup_key(_reading(sequence=None)) is None
+
+
+def test_readings_without_a_device_timestamp_are_not_keyed():
+    # recorded_at falls back to the arrival time, so every retry would get a new key.
+    payload = {
+        "schema_version": "1.0",
+        "device_id": "vg-node-001",
+        "sensors": {
+            "soil_moisture_pct": 23.5, "soil_temp_c": 18.2, "ambient_temp_c": 21.3,
+            "ambient_humidity_pct": 65.4, "light_lux": 245.0,
+        },
+        "meta": {"battery_voltage": 3.87},
+        "_sequence": 41,
+    }
+    assert dedup_key(parse_message(json.dumps(payload))) is None
+
+
+def test_window_expires_and_bounds_entries():
+    now = [0.0]
+    window = _window(window_seconds=10, max_size=2, clock=lambda: now[0])
+    assert window.add("a") and not window.add("a")
+    now[0] = 11
+    assert window.add("a")
+    assert window.add("b") and window.add("c")
+    assert len(window) == 2
+
+
+@pytest.mark.asyncio
+async def test_claim_drops_repeats_within_and_across_batches():
+    dedup = Deduplicator(_window())
+    fresh, keys = await dedup.claim([_reading(), _reading(), _reading(sequence=None), _reading(sequence=None)])
+    assert len(fresh) == 3
+    assert keys == ["vg-node-001:7:1700000000"]
+
+    fresh, _ = await dedup.claim([_reading(), _reading(sequence=8)])
+    assert [r["sequence"] for r in fresh] == [8]
+
+
+@pytest.mark.asyncio
+async def test_redis_catches_copies_seen_by_another_process():
+    redis = _FakeRedis()
+    first = Deduplicator(_window(), redis=redis)
+    second = Deduplicator(_window(), redis=redis)
+
+    assert len((await first.claim([_reading()]))[0]) == 1
+    assert (await second.claim([_reading()]))[0] == []
+
+
+@pytest.mark.asyncio
+async def test_release_lets_a_retried_copy_through():
+    redis = _FakeRedis()
+    dedup = Deduplicator(_window(), redis=redis)
+    _, keys = await dedup.claim([_reading()])
+
+    await dedup.release(keys)
+
+    assert len((await dedup.claim([_reading()]))[0]) == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_claims_are_short_until_confirmed_after_commit():
+    redis = _FakeRedis()
+    dedup = Deduplicator(_window(), redis=redis, ttl_seconds=21_600, claim_ttl_seconds=60)
+    _, keys = await dedup.claim([_reading()])
+    assert redis.keys == {"vineguard:dedup:vg-node-001:7:1700000000": 60}
+
+    await dedup.confirm(keys)
+
+    assert redis.keys == {"vineguard:dedup:vg-node-001:7:1700000000": 21_600}
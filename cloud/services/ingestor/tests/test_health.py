@@ -0,0 +1,143 @@
+"""Tests for the write-behind node health writer."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from ingestor.health import NodeHealthWriter
+
+
+class _FakeConn:
+    dialect = SimpleNamespace(name="postgresql")
+
+    def __init__(self, engine: "_FakeEngine"):
+        self._engine = engine
+
+    async def execute(self, stmt):
+        if self._engine.slow is not None:
+            await self._engine.slow.wait()
+        if self._engine.fail:
+            raise ConnectionError("db down")
+        self._engine.statements.append(stmt)
+
+
+class _Begin:
+    def __init__(self, engine: "_FakeEngine"):
+        self._engine = engine
+
+    async def __aenter__(self):
+        return _FakeConn(self._engine)
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class _FakeEngine:
+    def __init__(self) -> None:
+        self.statements: list = []
+        self.fail = False
+        self.slow: asyncio.Event | None = None
+
+    def begin(self) -> _Begin:
+        return _Begin(self)
+
+
+T0 = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _reading(device_id: str, battery_voltage: float, recorded_at: datetime = T0) -> dict:
+    return {
+        "device_id": device_id,
+        "battery_voltage": battery_voltage,
+        "battery_pct": 70,
+        "rssi": -80,
+        "recorded_at": recorded_at,
+    }
+
+
+@pytest.mark.asyncio
+async def test_readings_for_same_device_are_coalesced():
+    engine = _FakeEngine()
+    writer = NodeHealthWriter(engine, interval_seconds=60)
+
+    writer.record(_reading("vg-node-001", 3.9))
+    writer.record(_reading("vg-node-001", 3.7))
+    writer.record(_reading("vg-node-002", 4.0))
+    assert len(writer) == 2
+
+    await writer.flush()
+
+    assert len(engine.statements) == 1
+    assert len(writer) == 0
+
+
+@pytest.mark.asyncio
+async def test_older_readings_do_not_set_health_back():
+    engine = _FakeEngine()
+    writer = NodeHealthWriter(engine, interval_seconds=60)
+
+    writer.record(_reading("vg-node-001", 3.9, T0 + timedelta(minutes=5)))
+    await writer.flush()
+    writer.record(_reading("vg-node-001", 3.5, T0))  # replayed from the journal after a newer one
+
+    assert len(writer) == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_without_pending_state_skips_the_db():
+    engine = _FakeEngine()
+    writer = NodeHealthWriter(engine, interval_seconds=60)
+
+    await writer.flush()
+
+    assert engine.statements == []
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_state_for_next_attempt():
+    engine = _FakeEngine()
+    writer = NodeHealthWriter(engine, interval_seconds=60)
+    writer.record(_reading("vg-node-001", 3.9))
+
+    engine.fail = True
+    with pytest.raises(ConnectionError):
+        await writer.flush()
+    assert len(writer) == 1
+
+    engine.fail = False
+    await writer.flush()
+    assert len(engine.statements) == 1
+    assert len(writer) == 0
+
+
+@pytest.mark.asyncio
+async def test_close_forces_a_final_flush():
+    engine = _FakeEngine()
+    writer = NodeHealthWriter(engine, interval_seconds=60)
+    writer.start()
+    writer.record(_reading("vg-node-001", 3.9))
+
+    await writer.close()
+
+    assert len(engine.statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_close_during_a_slow_flush_still_writes_the_state():
+    engine = _FakeEngine()
+    engine.slow = asyncio.Event()
+    writer = NodeHealthWriter(engine, interval_seconds=0.01)
+    writer.start()
+    writer.record(_reading("vg-node-001", 3.9))
+    while len(writer):  # the periodic flush has taken the state and is stuck in the DB
+        await asyncio.sleep(0.01)
+
+    closing = asyncio.create_task(writer.close())
+    await asyncio.sleep(0.01)
+    engine.slow.set()
+    await closing
+
+    assert len(engine.statements) == 1
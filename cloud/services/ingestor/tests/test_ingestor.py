@@ -1,6 +1,7 @@
 """Tests for ingestor payload parsing and validation."""
 from __future__ import annotations
 
+import json
 from datetime import datetime, timezone
 
 import pytest
@@ -9,6 +10,7 @@ from pydantic import ValidationError
 from ingestor.schemas import (
     TelemetryPayloadLegacy,
     TelemetryPayloadV1,
+    parse_message,
     parse_payload,
 )
 
@@ -264,3 +266,40 @@ class TestLegacyValidationErrors:
         payload = {**VALID_LEGACY, "deviceId": "bad id!"}
         with pytest.raises(ValidationError):
             parse_payload(payload)
+
+
+# ---------------------------------------------------------------------------
+# Raw message parsing (fast path + fallback)
+# ---------------------------------------------------------------------------
+
+class TestParseMessage:
+    def test_v1_bytes_match_parse_payload(self):
+        assert parse_message(json.dumps(VALID_V1).encode()) == parse_payload(VALID_V1)
+
+    def test_v1_with_optional_fields_omitted_matches_parse_payload(self):
+        payload = {
+            **VALID_V1,
+            "sensors": {k: v for k, v in VALID_V1["sensors"].items() if k not in ("pressure_hpa", "leaf_wetness_pct")},
+            "meta": {"battery_voltage": 4},
+        }
+        result = parse_message(json.dumps(payload))
+        assert result == parse_payload(payload)
+        assert isinstance(result["battery_voltage"], float)
+
+    def test_legacy_falls_back_to_parse_payload(self):
+        assert parse_message(json.dumps(VALID_LEGACY)) == parse_payload(VALID_LEGACY)
+
+    def test_invalid_v1_raises_validation_error(self):
+        payload = dict(VALID_V1)
+        payload["sensors"] = {**VALID_V1["sensors"], "soil_moisture_pct": 101.0}
+        with pytest.raises(ValidationError):
+            parse_message(json.dumps(payload))
+
+    @pytest.mark.parametrize("data", [b"123", b"null", b'"vg-node-001"', b"[]"])
+    def test_json_that_is_not_an_object_raises_validation_error(self, data):
+        with pytest.raises(ValidationError):
+            parse_message(data)
+
+    def test_malformed_json_raises_decode_error(self):
+        with pytest.raises(json.JSONDecodeError):
+            parse_message(b"{not json")
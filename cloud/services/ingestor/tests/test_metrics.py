@@ -0,0 +1,76 @@
+"""Tests for ingestor metrics and sampled logging."""
+from __future__ import annotations
+
+import json
+
+import pytest
+from prometheus_client import REGISTRY
+
+from ingestor.main import handle_message
+from ingestor.metrics import LogSampler
+
+
+class _ListSink:
+    def __init__(self) -> None:
+        self.readings: list[dict] = []
+
+    async def add(self, normalised: dict) -> None:
+        self.readings.append(normalised)
+
+
+class _ListDeadLetters:
+    def __init__(self) -> None:
+        self.records: list[tuple[str, str]] = []
+
+    def write(self, raw: str, error: str) -> None:
+        self.records.append((raw, error))
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+_LEGACY = {
+    "deviceId": "vineguard-node-001",
+    "soilMoisture": 57.2,
+    "soilTempC": 18.5,
+    "ambientTempC": 21.3,
+    "ambientHumidity": 63.2,
+    "lightLux": 245.0,
+    "batteryVoltage": 3.97,
+    "timestamp": 1700000000,
+}
+
+
+def test_log_sampler_reports_accumulated_count():
+    sampler = LogSampler(every=3)
+    assert [sampler.hit() for _ in range(7)] == [0, 0, 3, 0, 0, 3, 0]
+    assert sampler.hit(5) == 6
+
+
+@pytest.mark.asyncio
+async def test_handle_message_counts_each_outcome():
+    before = {
+        "received": _sample("vineguard_ingestor_messages_received_total"),
+        "validated": _sample("vineguard_ingestor_messages_validated_total"),
+        "invalid_json": _sample("vineguard_ingestor_messages_dead_lettered_total", reason="invalid_json"),
+        "validation": _sample("vineguard_ingestor_messages_dead_lettered_total", reason="validation"),
+        "parsed": _sample("vineguard_ingestor_parse_seconds_count"),
+    }
+    sink, dead_letters = _ListSink(), _ListDeadLetters()
+
+    await handle_message(json.dumps(_LEGACY), sink, dead_letters)
+    await handle_message(b"{not json", sink, dead_letters)
+    await handle_message(json.dumps({**_LEGACY, "soilMoisture": 150}), sink, dead_letters)
+
+    assert _sample("vineguard_ingestor_messages_received_total") - before["received"] == 3
+    assert _sample("vineguard_ingestor_messages_validated_total") - before["validated"] == 1
+    assert _sample(
+        "vineguard_ingestor_messages_dead_lettered_total", reason="invalid_json"
+    ) - before["invalid_json"] == 1
+    assert _sample(
+        "vineguard_ingestor_messages_dead_lettered_total", reason="validation"
+    ) - before["validation"] == 1
+    assert _sample("vineguard_ingestor_parse_seconds_count") - before["parsed"] == 3
+    assert len(sink.readings) == 1
+    assert len(dead_letters.records) == 2
@@ -0,0 +1,164 @@
+"""Tests for the device_id → node_id resolution cache."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from ingestor.node_cache import NodeIdCache, listen_for_node_events, resolve_node_ids
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _FakeResult:
+    def __init__(self, rows: list[tuple[str, str]]):
+        self._rows = rows
+
+    def all(self) -> list[tuple[str, str]]:
+        return self._rows
+
+
+class _FakeConn:
+    """Answers node lookups from a fixed registry and counts queries."""
+
+    def __init__(self, registry: dict[str, str]):
+        self.registry = registry
+        self.queries = 0
+
+    async def execute(self, stmt):
+        self.queries += 1
+        wanted = stmt.compile().params["device_id_1"]
+        return _FakeResult([(d, self.registry[d]) for d in wanted if d in self.registry])
+
+
+def _cache(clock: _Clock, max_size: int = 10) -> NodeIdCache:
+    return NodeIdCache(max_size=max_size, ttl_seconds=60, negative_ttl_seconds=5, clock=clock)
+
+
+def test_positive_and_negative_entries_are_served_from_cache():
+    cache = _cache(_Clock())
+    cache.store("vg-node-001", "node-1")
+    cache.store("vg-node-404", None)
+
+    found, misses = cache.lookup(["vg-node-001", "vg-node-404", "vg-node-002"])
+
+    assert found == {"vg-node-001": "node-1", "vg-node-404": None}
+    assert misses == {"vg-node-002"}
+
+
+def test_negative_entries_expire_before_positive_ones():
+    clock = _Clock()
+    cache = _cache(clock)
+    cache.store("vg-node-001", "node-1")
+    cache.store("vg-node-404", None)
+
+    clock.now = 10
+    found, misses = cache.lookup(["vg-node-001", "vg-node-404"])
+
+    assert found == {"vg-node-001": "node-1"}
+    assert misses == {"vg-node-404"}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = _cache(_Clock(), max_size=2)
+    cache.store("vg-node-001", "node-1")
+    cache.store("vg-node-002", "node-2")
+    cache.lookup(["vg-node-001"])  # touch → vg-node-002 is now the oldest
+    cache.store("vg-node-003", "node-3")
+
+    _, misses = cache.lookup(["vg-node-001", "vg-node-002", "vg-node-003"])
+
+    assert misses == {"vg-node-002"}
+    assert len(cache) == 2
+
+
+def test_invalidate_drops_single_device_or_everything():
+    cache = _cache(_Clock())
+    cache.store("vg-node-001", "node-1")
+    cache.store("vg-node-002", "node-2")
+
+    cache.invalidate("vg-node-001")
+    assert cache.lookup(["vg-node-001"])[1] == {"vg-node-001"}
+
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_resolve_queries_only_misses_and_caches_the_answer():
+    conn = _FakeConn({"vg-node-001": "node-1"})
+    cache = _cache(_Clock())
+
+    first = await resolve_node_ids(conn, cache, ["vg-node-001", "vg-node-404"])
+    second = await resolve_node_ids(conn, cache, ["vg-node-001", "vg-node-404"])
+
+    assert first == second == {"vg-node-001": "node-1"}
+    assert conn.queries == 1
+
+
+class _FakePubSub:
+    def __init__(self, messages: list, fail: bool, deliver: asyncio.Event) -> None:
+        self._messages = messages
+        self._fail = fail
+        self._deliver = deliver
+
+    async def subscribe(self, channel: str) -> None:
+        pass
+
+    async def listen(self):
+        if self._fail:
+            raise RedisConnectionError("connection reset")
+        await self._deliver.wait()
+        for message in self._messages:
+            yield message
+        await asyncio.Event().wait()  # stay subscribed until cancelled
+
+    async def aclose(self) -> None:
+        pass
+
+
+class _FakeRedis:
+    """The first subscription drops its connection; the next delivers ``messages`` once told to."""
+
+    def __init__(self, messages: list) -> None:
+        self._messages = messages
+        self.deliver = asyncio.Event()
+        self.subscriptions = 0
+
+    def pubsub(self) -> _FakePubSub:
+        self.subscriptions += 1
+        return _FakePubSub(self._messages, self.subscriptions == 1, self.deliver)
+
+
+@pytest.mark.asyncio
+async def test_node_events_resubscribe_after_a_redis_error_and_drop_the_cache():
+    cache = _cache(_Clock())
+    cache.store("vg-node-001", "node-1")
+    cache.store("vg-node-002", "node-2")
+    redis = _FakeRedis([
+        {"type": "subscribe", "data": 1},
+        {"type": "message", "data": b'{"device_id": "vg-node-003"}'},
+    ])
+
+    task = asyncio.create_task(listen_for_node_events(redis, "node-events", cache, retry_seconds=0))
+    for _ in range(10):
+        await asyncio.sleep(0)
+    assert redis.subscriptions == 2
+    assert len(cache) == 0  # events may have been missed while disconnected
+
+    cache.store("vg-node-002", "node-2")
+    cache.store("vg-node-003", "node-3")
+    redis.deliver.set()
+    for _ in range(10):
+        await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert cache.lookup(["vg-node-002", "vg-node-003"])[1] == {"vg-node-003"}
@@ -0,0 +1,71 @@
+"""Tests for pipelined telemetry publishing."""
+from __future__ import annotations
+
+import pytest
+
+from ingestor.publish import TelemetryPublisher
+
+
+class _FakePipeline:
+    def __init__(self, redis: "_FakeRedis"):
+        self._redis = redis
+        self._commands: list[tuple] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def publish(self, channel, message):
+        self._commands.append(("publish", channel, message))
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self._commands.append(("xadd", stream, fields["data"], maxlen))
+
+    async def execute(self):
+        self._redis.round_trips += 1
+        self._redis.commands.extend(self._commands)
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.commands: list[tuple] = []
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        assert transaction is False
+        return _FakePipeline(self)
+
+
+@pytest.mark.asyncio
+async def test_pubsub_mode_pipelines_the_whole_batch():
+    redis = _FakeRedis()
+    publisher = TelemetryPublisher(redis, channel="telemetry-stream")
+
+    await publisher.publish([b"a", b"b", b"c"])
+
+    assert redis.round_trips == 1
+    assert redis.commands == [("publish", "telemetry-stream", m) for m in (b"a", b"b", b"c")]
+
+
+@pytest.mark.asyncio
+async def test_stream_mode_appends_with_maxlen():
+    redis = _FakeRedis()
+    publisher = TelemetryPublisher(redis, channel="telemetry-stream", mode="stream", stream_maxlen=1000)
+
+    await publisher.publish([b"a", b"b"])
+
+    assert redis.commands == [("xadd", "telemetry", b"a", 1000), ("xadd", "telemetry", b"b", 1000)]
+
+
+@pytest.mark.asyncio
+async def test_both_mode_and_empty_batch():
+    redis = _FakeRedis()
+    publisher = TelemetryPublisher(redis, channel="telemetry-stream", mode="both")
+
+    await publisher.publish([])
+    assert redis.round_trips == 0
+
+    await publisher.publish([b"a"])
+    assert [c[0] for c in redis.commands] == ["publish", "xadd"]
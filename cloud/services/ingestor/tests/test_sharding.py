@@ -0,0 +1,75 @@
+"""Tests for multi-process sharding helpers."""
+from __future__ import annotations
+
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from ingestor.config import IngestorSettings, ShardingSettings
+from ingestor.sharding import device_id_of, owns, subscription_topic
+from ingestor.supervisor import shard_environment
+from ingestor.workers import shard_for
+
+
+def _payloads() -> list[bytes]:
+    v1 = [json.dumps({"schema_version": "1.0", "device_id": f"vg-node-{i:03d}"}).encode() for i in range(50)]
+    legacy = [json.dumps({"deviceId": f"vineguard-node-{i:03d}"}).encode() for i in range(50)]
+    return v1 + legacy + [b"{not json", b"[]"]
+
+
+def test_hash_mode_assigns_every_payload_to_exactly_one_shard():
+    shards = [ShardingSettings(mode="hash", index=i, count=3) for i in range(3)]
+    for raw in _payloads():
+        assert sum(owns(raw, s) for s in shards) == 1
+
+
+def test_hash_mode_keeps_a_device_on_one_shard():
+    shards = [ShardingSettings(mode="hash", index=i, count=3) for i in range(3)]
+    first = json.dumps({"deviceId": "vg-node-007", "soilMoisture": 1}).encode()
+    second = json.dumps({"schema_version": "1.0", "device_id": "vg-node-007"}).encode()
+    assert [owns(first, s) for s in shards] == [owns(second, s) for s in shards]
+
+
+@pytest.mark.parametrize("count", [2, 4, 8])
+def test_every_worker_of_every_shard_gets_devices(count):
+    workers = 4  # WorkerSettings.pool_size default
+    devices = [f"vg-node-{i:04d}" for i in range(2000)]
+    for index in range(count):
+        sharding = ShardingSettings(mode="hash", index=index, count=count)
+        owned = [d for d in devices if owns(json.dumps({"device_id": d}).encode(), sharding)]
+        assert {shard_for(d, workers) for d in owned} == set(range(workers))
+
+
+def test_device_id_is_read_without_a_full_decode_when_possible():
+    assert device_id_of(b'{"schema_version": "1.0", "device_id" : "vg-node-001", "sensors": {}}') == "vg-node-001"
+    assert device_id_of('{"deviceId":"vineguard-7"}') == "vineguard-7"
+    assert device_id_of(b'{"device_id": "vg-\\u006eode"}') == "vg-node"  # escaped: decoded properly
+    assert device_id_of(b"[]") is None
+
+
+def test_unroutable_payloads_go_to_shard_zero():
+    assert owns(b"{not json", ShardingSettings(mode="hash", index=0, count=2))
+    assert not owns(b"{not json", ShardingSettings(mode="hash", index=1, count=2))
+
+
+def test_shared_mode_subscribes_to_shared_topic_and_owns_everything():
+    sharding = ShardingSettings(mode="shared", group="ingest", index=1, count=2)
+    assert subscription_topic("vineguard/telemetry", sharding) == "$share/ingest/vineguard/telemetry"
+    assert owns(b"{not json", sharding)
+    assert subscription_topic("vineguard/telemetry", ShardingSettings()) == "vineguard/telemetry"
+
+
+def test_index_must_be_below_count():
+    with pytest.raises(ValidationError):
+        ShardingSettings(mode="hash", index=2, count=2)
+
+
+def test_shard_environment_separates_ports_and_dead_letter_files():
+    settings = IngestorSettings(database={"dsn": "postgresql+asyncpg://x"})
+    env = shard_environment(settings, 2, 4)
+    assert env["INGESTOR_SHARDING__MODE"] == "hash"
+    assert (env["INGESTOR_SHARDING__INDEX"], env["INGESTOR_SHARDING__COUNT"]) == ("2", "4")
+    assert env["INGESTOR_METRICS__PORT"] == str(settings.metrics.port + 2)
+    assert env["INGESTOR_DEAD_LETTER__PATH"].endswith("vineguard-dead-letter-2.jsonl")
+    assert env["INGESTOR_ADMISSION__JOURNAL_DIR"].endswith("vineguard-journal/shard-2")
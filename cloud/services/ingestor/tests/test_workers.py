@@ -0,0 +1,66 @@
+"""Tests for the ingestor write worker pool."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from ingestor.batching import TelemetryBatcher
+from ingestor.workers import WorkerPool, shard_for
+
+
+def test_shard_for_is_stable_and_in_range():
+    assert shard_for("vg-node-001", 4) == shard_for("vg-node-001", 4)
+    assert all(0 <= shard_for(f"vg-node-{i:03d}", 4) < 4 for i in range(100))
+
+
+@pytest.mark.asyncio
+async def test_per_device_order_is_preserved_across_workers():
+    written: list[dict] = []
+
+    async def write(batch: list[dict]) -> None:
+        await asyncio.sleep(0)  # let other workers interleave
+        written.extend(batch)
+
+    pool = WorkerPool(
+        lambda: TelemetryBatcher(write, max_rows=3, linger_ms=1),
+        size=4,
+        queue_depth=100,
+    )
+    pool.start()
+    for seq in range(20):
+        for device in ("vg-node-001", "vg-node-002", "vg-node-003"):
+            await pool.add({"device_id": device, "seq": seq})
+    await pool.close()
+
+    assert len(written) == 60
+    for device in ("vg-node-001", "vg-node-002", "vg-node-003"):
+        assert [r["seq"] for r in written if r["device_id"] == device] == list(range(20))
+
+
+@pytest.mark.asyncio
+async def test_add_blocks_when_worker_queue_is_full():
+    release = asyncio.Event()
+
+    async def write(batch: list[dict]) -> None:
+        await release.wait()
+
+    pool = WorkerPool(
+        lambda: TelemetryBatcher(write, max_rows=1, linger_ms=0),
+        size=1,
+        queue_depth=2,
+    )
+    pool.start()
+    await pool.add({"device_id": "vg-node-001"})  # picked up, stuck in write()
+    await asyncio.sleep(0)
+    await pool.add({"device_id": "vg-node-001"})
+    await pool.add({"device_id": "vg-node-001"})
+
+    blocked = asyncio.create_task(pool.add({"device_id": "vg-node-001"}))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    release.set()
+    await blocked
+    await pool.close()
+    assert pool.qsize() == 0